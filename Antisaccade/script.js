@@ -90,6 +90,29 @@
     }
   }
 
+  // Send the finished main block to the experiment server (if this page is
+  // served by it). localStorage stays the offline fallback.
+  function uploadParticipant(participant) {
+    if (!window.fetch || !participant || !participant.trials.length) return;
+    const trials = participant.trials.map((t) => ({
+      trial_number: t.index,
+      trial_type: 'test',
+      stimulus_data: { side: t.side, color: t.color },
+      correct_response: getCorrectKey(t),
+      response_value: t.timeout ? '' : responseKey(t),
+      response_time_ms: t.rt,
+      correct: t.correct,
+      metadata: { condition: t.color === 'green' ? 'pro' : 'anti', timeout: t.timeout },
+    }));
+    fetch('/api/antisaccade/ingest', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ subject_id: 'antisaccade-P' + participant.id, trials }),
+    }).catch(() => {
+      // offline / standalone use – data is still in localStorage
+    });
+  }
+
   function showScreen(name) {
     Object.values(screens).forEach((el) => el.classList.remove('is-active'));
     screens[name].classList.add('is-active');
@@ -120,6 +143,15 @@
     return trial.color === 'green' ? sameSideKey : oppositeKey;
   }
 
+  // Key pressed on a (non-timeout) trial. Trials saved before the key was
+  // stored are reconstructed from correctness: there are only two keys.
+  function responseKey(trial) {
+    if (trial.key) return trial.key;
+    const correctKey = getCorrectKey(trial);
+    if (trial.correct) return correctKey;
+    return correctKey === 'ArrowLeft' ? 'ArrowRight' : 'ArrowLeft';
+  }
+
   function updateTrialHeader() {
     trialCounter.textContent = `${trialIndex}/${totalTrials}`;
     if (phase === 'practice') {
@@ -189,6 +221,7 @@
         feedbackText.textContent = '';
         bottomHint.style.visibility = 'hidden';
         saveParticipants();
+        uploadParticipant(currentParticipant);
         renderParticipantsDetail();
         showScreen('thanks');
         return;
@@ -225,7 +258,7 @@
     }, RESPONSE_TIMEOUT_MS);
   }
 
-  function finishTrial(isCorrect, rt, fromTimeout) {
+  function finishTrial(isCorrect, rt, fromTimeout, key) {
     trialState = 'feedback';
     clearTimeout(responseTimeoutId);
     responseTimeoutId = null;
@@ -246,6 +279,7 @@
         correct: isCorrect,
         rt: rtRounded,
         timeout: !!fromTimeout,
+        key: fromTimeout ? '' : key,
       };
       currentParticipant.trials.push(trialData);
       saveParticipants();
@@ -288,7 +322,7 @@
     const rt = performance.now() - trialStartTime;
     const correctKey = getCorrectKey(currentTrial);
     const isCorrect = event.key === correctKey;
-    finishTrial(isCorrect, rt, false);
+    finishTrial(isCorrect, rt, false, event.key);
   }
 
   // Experimenter view helpers
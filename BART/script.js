@@ -37,6 +37,36 @@
   let totalBanked = 0;
   let roundOver = false;
   let gameOver = false;
+  let balloonLog = []; // one record per balloon, uploaded at the end
+  let balloonStartTime = 0;
+
+  function logBalloon(exploded) {
+    balloonLog.push({
+      trial_number: currentBalloonIndex + 1,
+      trial_type: isPractice() ? "practice" : "test",
+      stimulus_data: { explosion_point: explosionPump, max_pumps: MAX_PUMPS_PER_BALLOON },
+      response_value: String(currentPumps),
+      response_time_ms: Math.round(performance.now() - balloonStartTime),
+      correct: !exploded,
+      metadata: {
+        phase: isPractice() ? "practice" : "test",
+        pumps: currentPumps,
+        exploded: exploded,
+      },
+    });
+  }
+
+  // Send the whole session to the experiment server when served by it
+  function uploadSession() {
+    if (!window.fetch || !balloonLog.length) return;
+    fetch("/api/bart/ingest", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ trials: balloonLog }),
+    }).catch(() => {
+      // standalone use without the experiment server
+    });
+  }
 
   function formatMoney(amount) {
     return "$" + amount.toFixed(2);
@@ -61,6 +91,7 @@
     screenExperimenter.classList.add("hidden");
     currentBalloonIndex = 0;
     totalBanked = 0;
+    balloonLog = [];
     updateTotals();
     startNewBalloon();
   }
@@ -72,6 +103,7 @@
     screenResult.classList.remove("hidden");
     screenExperimenter.classList.add("hidden");
     finalTotalEl.textContent = formatMoney(totalBanked);
+    uploadSession();
   }
 
   function goToExperimenter() {
@@ -113,6 +145,7 @@
     roundValue = 0;
     explosionPump =
       1 + Math.floor(Math.random() * MAX_PUMPS_PER_BALLOON); // 1..max
+    balloonStartTime = performance.now();
     balloonEl.classList.remove("balloon--popped");
     balloonEl.style.transform = "scale(1)";
     gameMessageEl.textContent = isPractice()
@@ -130,6 +163,7 @@
     if (currentPumps >= explosionPump) {
       roundValue = 0;
       roundOver = true;
+      logBalloon(true);
       balloonEl.classList.add("balloon--popped");
       gameMessageEl.textContent = isPractice()
         ? "The balloon popped, but this was just practice. The real balloons start next."
@@ -152,6 +186,7 @@
   function handleBank() {
     if (roundOver || gameOver) return;
     roundOver = true;
+    logBalloon(false);
 
     if (isPractice()) {
       gameMessageEl.textContent =
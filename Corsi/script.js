@@ -99,6 +99,23 @@
     });
   }
 
+  // ================================
+  // SERVER UPLOAD
+  // ================================
+  const SESSION_TRIALS = []; // every trial, kept regardless of experimenter lock
+  let responseStartTime = 0;
+
+  function uploadSession() {
+    if (!window.fetch || !SESSION_TRIALS.length) return;
+    fetch("/api/corsi/ingest", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ subject_id: PARTICIPANT_ID, trials: SESSION_TRIALS }),
+    }).catch(() => {
+      // standalone use without the experiment server
+    });
+  }
+
   function logTrial(phase, trialNum, seq, resp, correct) {
     if (!experimenterUnlocked) return;
     // store copies
@@ -318,6 +335,7 @@
     isAwaitingResponse = true;
     setBlocksDisabled(false);
     clearResponseBtn.disabled = true; // enable after first tap
+    responseStartTime = performance.now();
     feedback("Now tap the same blocks in the same order.");
   }
 
@@ -361,6 +379,16 @@
     const trialNum =
       phaseName === "practice" ? practiceTrialIndex + 1 : experimentTrialIndex + 1;
     logTrial(phaseName, trialNum, currentSequence, currentResponse, correct);
+    SESSION_TRIALS.push({
+      trial_number: SESSION_TRIALS.length + 1,
+      trial_type: phaseName === "practice" ? "practice" : "test",
+      stimulus_data: { sequence: currentSequence.slice(), n_blocks: N_BLOCKS },
+      correct_response: currentSequence.join(","),
+      response_value: currentResponse.join(","),
+      response_time_ms: Math.round(performance.now() - responseStartTime),
+      correct: correct,
+      metadata: { phase: phaseName, sequence_length: currentSequence.length },
+    });
 
     // Participant feedback
     if (correct) {
@@ -391,6 +419,7 @@
       experimentTrialIndex++;
       if (experimentTrialIndex >= EXPERIMENT_TRIALS) {
         setMode("done");
+        uploadSession();
       } else {
         updateExperimentTrialLabel();
         playSequenceBtn.disabled = false;
@@ -4,38 +4,69 @@ Experiment Maker - Fixed Version
 Addresses critical security, reliability, and usability issues
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory, session, flash
+from flask import Blueprint, Flask, Response, g, render_template, request, jsonify, redirect, url_for, send_file, send_from_directory, session, flash
 from flask_wtf.csrf import CSRFProtect
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from pathlib import Path
+from io import StringIO
 import sqlite3
+import csv
 import json
 import time
 import uuid
 import datetime
 import logging
+import math
 import os
+import atexit
+import threading
 from functools import wraps
-from contextlib import contextmanager
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
+from contextlib import contextmanager, nullcontext
+from dataclasses import is_dataclass
+
+from backend import archive, battery, blob_store, counterbalance, event_log, presets, rate_limit, structured_logging, trial_channel, wire
+from backend.commit_coordinator import CommitCoordinator
+from backend.engines import EXPERIMENT_ENGINES, create_experiment
+from backend.experiments.base_experiment import ResponseData
+from backend.lazy_import import LazyModule
+
+# numpy-backed modules, imported by the first request that needs them
+analytics = LazyModule('backend.analytics')
+quality = LazyModule('backend.quality')
+session_results = LazyModule('backend.session_results')
+
 logger = logging.getLogger(__name__)
 
+_log_listener = None
+
+def configure_logging():
+    """JSON file + console logging through a background listener (called by create_app, not at import)"""
+    global _log_listener
+    if _log_listener is not None:
+        return
+    _log_listener = structured_logging.setup(
+        settings.LOG_FILE,
+        level=getattr(logging, settings.LOG_LEVEL.upper()),
+        rotate=settings.LOG_ROTATE,
+        max_bytes=settings.LOG_MAX_BYTES,
+        backup_count=settings.LOG_BACKUP_COUNT,
+        when=settings.LOG_ROTATE_WHEN,
+        sample_rates=structured_logging.parse_rates(settings.LOG_SAMPLE_RATES),
+        console_json=settings.LOG_CONSOLE_JSON
+    )
+    atexit.register(_log_listener.stop)
+
 # Configuration
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32).hex()
     DB_PATH = Path('database/app.db')
     UPLOAD_FOLDER = Path('uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
+    
+    # Content-addressed snapshot files and thumbnail worker processes
+    SNAPSHOT_STORE = Path(os.environ.get('SNAPSHOT_STORE', 'uploads/blobs'))
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', '2'))
     SESSION_COOKIE_SECURE = True  # Set to True in production with HTTPS
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
@@ -45,6 +76,76 @@ class Config:
     DEFAULT_USERNAME = os.environ.get('ADMIN_USERNAME', 'admin')
     DEFAULT_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'change_me_now')
 
+    # Upper bound on trial records accepted by a single bulk ingest
+    MAX_INGEST_TRIALS = 5000
+
+    # Memory-mapped prior/likelihood grids shared by adaptive procedures
+    ADAPTIVE_TABLE_CACHE = Path(os.environ.get('ADAPTIVE_TABLE_CACHE', 'database/adaptive_tables'))
+
+    # Named config presets (one JSON file each), reloaded when files change
+    PRESET_DIR = Path(os.environ.get('PRESET_DIR', 'presets'))
+
+    # Trial/response store: 'sqlite' (rows per request) or 'log' (append-only
+    # event log, compacted into SQLite in the background)
+    TRIAL_STORE = os.environ.get('TRIAL_STORE', 'sqlite')
+    EVENT_LOG_DIR = Path(os.environ.get('EVENT_LOG_DIR', 'database/event_log'))
+    EVENT_LOG_COMPACT_INTERVAL = float(os.environ.get('EVENT_LOG_COMPACT_INTERVAL', '2.0'))
+
+    # When SQLite trial/response rows become durable: 'trial' (every request),
+    # 'group' (one commit every GROUP_COMMIT_MS) or 'session' (at completion)
+    DURABILITY = os.environ.get('DURABILITY', 'trial')
+    GROUP_COMMIT_MS = float(os.environ.get('GROUP_COMMIT_MS', '50'))
+
+    # Archive databases of old completed sessions (python -m backend.archive)
+    ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', 'database/archive'))
+
+    # JSON log file, rotated by 'size' (LOG_MAX_BYTES) or 'time' (LOG_ROTATE_WHEN);
+    # LOG_SAMPLE_RATES keeps a fraction of high-volume events, e.g.
+    # "session_start=0.1,session_complete=0.1" (whole sessions are kept or dropped)
+    LOG_FILE = os.environ.get('LOG_FILE', 'app.log')
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_ROTATE = os.environ.get('LOG_ROTATE', 'size')
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', '5'))
+    LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN', 'midnight')
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+    LOG_CONSOLE_JSON = os.environ.get('LOG_CONSOLE_JSON') == '1'
+
+    # Subject API rate limits: "N/S" = bursts of N, N per S seconds sustained
+    # ("" disables one). Buckets live in each worker ('memory') or in a SQLite
+    # file shared by the workers of a host ('sqlite'); 'off' disables limits.
+    # A lab behind one NAT address shares the per-IP limits.
+    RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory')
+    RATE_LIMIT_DB = Path(os.environ.get('RATE_LIMIT_DB', 'database/rate_limits.db'))
+    RATE_LIMIT_IP = os.environ.get('RATE_LIMIT_IP', '3000/10')
+    RATE_LIMIT_START = os.environ.get('RATE_LIMIT_START', '60/60')
+    RATE_LIMIT_SESSION = os.environ.get('RATE_LIMIT_SESSION', '100/10')
+
+    # Admission control (per worker): new sessions get a 503 past any of these; 0 disables one
+    MAX_LIVE_SESSIONS = int(os.environ.get('MAX_LIVE_SESSIONS', '5000'))
+    MAX_INFLIGHT_REQUESTS = int(os.environ.get('MAX_INFLIGHT_REQUESTS', '64'))
+    MAX_WRITE_BACKLOG = int(os.environ.get('MAX_WRITE_BACKLOG', '20000'))
+    # Sessions (whole batteries) with no API call for this many seconds are
+    # dropped from memory, unflushed DURABILITY=session rows included; 0 keeps them
+    SESSION_IDLE_TTL = int(os.environ.get('SESSION_IDLE_TTL', '7200'))
+
+class _Settings:
+    """
+    Settings of the app being served: its flask_app.config (Config plus the
+    create_app() overrides) once create_app() has run, Config before that.
+    Module code reads settings.X so overrides never modify Config itself.
+    """
+
+    def __init__(self):
+        self.config = None
+
+    def __getattr__(self, name):
+        if self.config is not None and name in self.config:
+            return self.config[name]
+        return getattr(Config, name)
+
+settings = _Settings()
+
 # Experiment registry - simple list format
 EXPERIMENT_REGISTRY = [
     {
@@ -76,17 +177,26 @@ EXPERIMENT_REGISTRY = [
         "experiment_type": "butterfly_simon",
         "title": "Butterfly Simon",
         "description": "Selective attention task responding to butterfly color while ignoring location."
+    },
+    {
+        "experiment_type": "bart",
+        "title": "BART",
+        "description": "Balloon Analogue Risk Task - measure risk taking by pumping balloons for money."
     }
 ]
 
-# Initialize Flask app
-app = Flask(__name__,
-            template_folder='frontend/templates',
-            static_folder='frontend/static')
-app.config.from_object(Config)
+def _trial_payload(trial):
+    """Engines return TrialData or plain dicts; the API always speaks dicts"""
+    return trial.to_dict() if is_dataclass(trial) else trial
+
+# Routes live on a blueprint; create_app() builds the Flask app around it
+bp = Blueprint('main', __name__)
+preset_registry = presets.PresetRegistry(settings.PRESET_DIR)
+snapshot_store = blob_store.BlobStore(settings.SNAPSHOT_STORE)
+thumbnails = blob_store.ThumbnailPool(snapshot_store, settings.THUMBNAIL_WORKERS)
 
-# Enable CSRF protection
-csrf = CSRFProtect(app)
+# CSRF protection (bound to the app in create_app)
+csrf = CSRFProtect()
 
 # Database connection pool (simple version for SQLite)
 @contextmanager
@@ -94,7 +204,7 @@ def get_db():
     """Context manager for database connections with proper error handling"""
     conn = None
     try:
-        conn = sqlite3.connect(Config.DB_PATH, timeout=10.0)
+        conn = sqlite3.connect(settings.DB_PATH, timeout=10.0)
         conn.row_factory = sqlite3.Row  # Enable column access by name
         conn.execute('PRAGMA foreign_keys = ON')  # Enable foreign key constraints
         yield conn
@@ -113,12 +223,39 @@ def get_db():
         if conn:
             conn.close()
 
+def _ensure_subject(conn, subject_id, created_at):
+    """Register a subject row so session foreign keys resolve"""
+    conn.execute(
+        'INSERT OR IGNORE INTO subjects (id, created_at) VALUES (?, ?)',
+        (subject_id, created_at)
+    )
+
+def _add_column(conn, table, column, definition):
+    """Add a column to an existing table if it is missing"""
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    if column not in existing:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+# Schema generation written by init_db (PRAGMA user_version). Bump it with
+# every change to the DDL, migrations or indexes below.
+SCHEMA_VERSION = 1
+
 def init_db():
-    """Initialize database with proper schema and indices"""
-    Config.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    """Initialize database with proper schema and indices (skipped when already current)"""
+    settings.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     
     try:
         with get_db() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version == SCHEMA_VERSION:
+                return
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
+
+            # Lets backend.archive return freed pages a few at a time
+            # (takes effect only when app.db is created)
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
             # Create tables with foreign keys
             conn.executescript('''
             CREATE TABLE IF NOT EXISTS subjects (
@@ -134,6 +271,7 @@ def init_db():
                 config_json TEXT NOT NULL,
                 started_at TEXT NOT NULL DEFAULT (datetime('now')),
                 completed_at TEXT,
+                qc_flags INTEGER NOT NULL DEFAULT 0,
                 FOREIGN KEY (subject_id) REFERENCES subjects(id)
             );
             
@@ -158,9 +296,90 @@ def init_db():
                 correct INTEGER,
                 feedback TEXT,
                 recorded_at TEXT NOT NULL DEFAULT (datetime('now')),
+                qc_flags INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (session_id) REFERENCES sessions(id)
+            );
+            
+            CREATE TABLE IF NOT EXISTS session_results (
+                session_id TEXT PRIMARY KEY,
+                experiment_type TEXT NOT NULL,
+                source TEXT NOT NULL,
+                results_json TEXT,
+                response_count INTEGER NOT NULL,
+                last_response_id INTEGER NOT NULL,
+                scored_at TEXT NOT NULL,
                 FOREIGN KEY (session_id) REFERENCES sessions(id)
             );
             
+            CREATE TABLE IF NOT EXISTS session_metrics (
+                session_id TEXT NOT NULL,
+                experiment_type TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (session_id, metric),
+                FOREIGN KEY (session_id) REFERENCES sessions(id)
+            ) WITHOUT ROWID;
+            
+            CREATE TABLE IF NOT EXISTS batteries (
+                id TEXT PRIMARY KEY,
+                subject_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                definition_key TEXT NOT NULL,
+                definition_json TEXT NOT NULL,
+                task_order_json TEXT NOT NULL,
+                started_at TEXT NOT NULL DEFAULT (datetime('now')),
+                completed_at TEXT,
+                FOREIGN KEY (subject_id) REFERENCES subjects(id)
+            );
+            
+            CREATE TABLE IF NOT EXISTS counterbalance_studies (
+                study TEXT PRIMARY KEY,
+                n_conditions INTEGER NOT NULL,
+                allocated INTEGER NOT NULL
+            );
+            
+            CREATE TABLE IF NOT EXISTS counterbalance_counts (
+                study TEXT NOT NULL,
+                condition INTEGER NOT NULL,
+                assigned INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (study, condition),
+                FOREIGN KEY (study) REFERENCES counterbalance_studies(study)
+            ) WITHOUT ROWID;
+            
+            CREATE TABLE IF NOT EXISTS counterbalance_assignments (
+                unit_id TEXT PRIMARY KEY,
+                study TEXT NOT NULL,
+                condition INTEGER NOT NULL,
+                sequence INTEGER NOT NULL,
+                assigned_at TEXT NOT NULL,
+                completed_at TEXT,
+                FOREIGN KEY (study) REFERENCES counterbalance_studies(study)
+            );
+            
+            CREATE TABLE IF NOT EXISTS config_presets (
+                hash TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                experiment_type TEXT NOT NULL,
+                config_json TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            
+            CREATE TABLE IF NOT EXISTS event_log_checkpoint (
+                log_dir TEXT PRIMARY KEY,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                frames INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL
+            );
+            
+            CREATE TABLE IF NOT EXISTS snapshot_blobs (
+                sha256 TEXT PRIMARY KEY,
+                size_bytes INTEGER NOT NULL,
+                content_type TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            
             CREATE TABLE IF NOT EXISTS gui_snapshots (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 session_id TEXT,
@@ -175,9 +394,31 @@ def init_db():
             CREATE INDEX IF NOT EXISTS idx_sessions_subject ON sessions(subject_id);
             CREATE INDEX IF NOT EXISTS idx_sessions_type ON sessions(experiment_type);
             CREATE INDEX IF NOT EXISTS idx_trials_session ON trials(session_id);
+            CREATE INDEX IF NOT EXISTS idx_trials_session_number ON trials(session_id, trial_number);
             CREATE INDEX IF NOT EXISTS idx_responses_session ON responses(session_id);
+            CREATE INDEX IF NOT EXISTS idx_session_results_type ON session_results(experiment_type);
+            CREATE INDEX IF NOT EXISTS idx_session_metrics_type ON session_metrics(experiment_type, metric);
+            CREATE INDEX IF NOT EXISTS idx_counterbalance_study ON counterbalance_assignments(study, condition);
+            ''')
+            
+            # Columns added after the first release (databases created earlier lack them)
+            _add_column(conn, 'sessions', 'qc_flags', 'INTEGER NOT NULL DEFAULT 0')
+            _add_column(conn, 'responses', 'qc_flags', 'INTEGER NOT NULL DEFAULT 0')
+            _add_column(conn, 'sessions', 'battery_id', 'TEXT REFERENCES batteries(id)')
+            _add_column(conn, 'sessions', 'battery_position', 'INTEGER')
+            _add_column(conn, 'sessions', 'preset_hash', 'TEXT REFERENCES config_presets(hash)')
+            _add_column(conn, 'gui_snapshots', 'blob_sha256', 'TEXT REFERENCES snapshot_blobs(sha256)')
+            _add_column(conn, 'gui_snapshots', 'filename', 'TEXT')
+            conn.executescript('''
+            CREATE INDEX IF NOT EXISTS idx_sessions_qc ON sessions(experiment_type, qc_flags);
+            CREATE INDEX IF NOT EXISTS idx_responses_qc ON responses(session_id, qc_flags);
+            CREATE INDEX IF NOT EXISTS idx_sessions_battery ON sessions(battery_id, battery_position);
+            CREATE INDEX IF NOT EXISTS idx_batteries_definition ON batteries(definition_key);
+            CREATE INDEX IF NOT EXISTS idx_config_presets_name ON config_presets(name, created_at);
+            CREATE INDEX IF NOT EXISTS idx_gui_snapshots_type ON gui_snapshots(experiment_type, uploaded_at);
             ''')
-        logger.info("Database initialized successfully")
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        logger.info(f"Database initialized (schema version {SCHEMA_VERSION})")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         raise
@@ -189,7 +430,7 @@ def login_required(f):
     def decorated_function(*args, **kwargs):
         if not session.get('logged_in'):
             flash('Please log in to access this page.', 'warning')
-            return redirect(url_for('login', next=request.url))
+            return redirect(url_for('main.login', next=request.url))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -197,14 +438,18 @@ def login_required(f):
 HELP_TEXTS = {
     'digit_span': 'Memorize the sequence, then type the digits in order and press Enter. Corrections allowed before Enter.',
     'sart': 'Press Space for GO digits. Do not press for target digit 3. Keep pace and minimize false alarms.',
-    'stroop': 'Report the INK color, not the word: r=red, g=green, b=blue, y=yellow.'
+    'stroop': 'Report the INK color, not the word: r=red, g=green, b=blue, y=yellow.',
+    'corsi': 'Watch the blocks light up, then tap the same blocks in the same order.',
+    'bart': 'Pump to add money to the balloon, bank before it pops. Popped balloons earn nothing.',
+    'antisaccade': 'Green circle: press the arrow on the same side. Red circle: press the opposite arrow.',
+    'butterfly_simon': 'Purple butterfly: press F (left). Yellow butterfly: press J (right). Ignore where it appears.'
 }
 
 # ============================================
 # AUTHENTICATION ROUTES
 # ============================================
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     """Simple login for experimenter access"""
     if request.method == 'POST':
@@ -212,45 +457,45 @@ def login():
         password = request.form.get('password', '')
         
         # Simple auth (replace with real auth in production)
-        if username == Config.DEFAULT_USERNAME and password == Config.DEFAULT_PASSWORD:
+        if username == settings.DEFAULT_USERNAME and password == settings.DEFAULT_PASSWORD:
             session['logged_in'] = True
             session['username'] = username
             logger.info(f"User {username} logged in")
             
             next_page = request.args.get('next')
-            return redirect(next_page or url_for('home'))
+            return redirect(next_page or url_for('main.home'))
         else:
             flash('Invalid credentials', 'danger')
             logger.warning(f"Failed login attempt for user: {username}")
     
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     """Logout route"""
     username = session.get('username', 'Unknown')
     session.clear()
     logger.info(f"User {username} logged out")
     flash('You have been logged out', 'info')
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
 # ============================================
 # MAIN ROUTES
 # ============================================
 
-@app.route('/')
+@bp.route('/')
 def home():
     """Home page with experiment list"""
     try:
         subject_id = request.args.get('subject_id', '').strip()
         cards = EXPERIMENT_REGISTRY
 
-        return render_template('index.html', cards=cards, subject_id=subject_id)
+        return render_template('index.html', cards=cards, batteries=battery.BATTERIES, subject_id=subject_id)
     except Exception as e:
         logger.error(f"Error in home route: {e}")
         return render_template('error.html', error="Failed to load home page"), 500
 
-@app.route('/consent', methods=['GET', 'POST'])
+@bp.route('/consent', methods=['GET', 'POST'])
 def consent():
     """Consent form for subjects"""
     if request.method == 'POST':
@@ -261,7 +506,7 @@ def consent():
             # Validate subject ID format
             if len(sid) > 50:
                 flash('Subject ID too long', 'danger')
-                return redirect(url_for('consent'))
+                return redirect(url_for('main.consent'))
             
             # Store in database
             with get_db() as conn:
@@ -271,12 +516,12 @@ def consent():
                 )
             
             logger.info(f"Subject {sid} consented")
-            return redirect(url_for('home', subject_id=sid))
+            return redirect(url_for('main.home', subject_id=sid))
             
         except Exception as e:
             logger.error(f"Error in consent route: {e}")
             flash('An error occurred. Please try again.', 'danger')
-            return redirect(url_for('consent'))
+            return redirect(url_for('main.consent'))
     
     return render_template('consent.html')
 
@@ -284,7 +529,7 @@ def consent():
 # EXPERIMENTER ROUTES (Require Login)
 # ============================================
 
-@app.route('/experimenter/<exp_type>')
+@bp.route('/experimenter/<exp_type>')
 @login_required
 def experimenter(exp_type):
     """Experimenter configuration page"""
@@ -302,7 +547,8 @@ def experimenter(exp_type):
             'sart': 'sart_experiment.html',
             'antisaccade': 'antisaccade_experiment.html',
             'corsi': 'corsi_experiment.html',
-            'butterfly_simon': 'butterfly_simon_experiment.html'
+            'butterfly_simon': 'butterfly_simon_experiment.html',
+            'bart': 'bart_experiment.html'
         }
 
         # Get the HTML file for this experiment
@@ -318,7 +564,7 @@ def experimenter(exp_type):
         logger.error(f"Error in experimenter route for {exp_type}: {e}")
         return render_template('error.html', error='Failed to load experimenter page'), 500
 
-@app.route('/data/export/<session_id>')
+@bp.route('/data/export/<session_id>')
 @login_required
 def export_data(session_id):
     """Export session data as CSV"""
@@ -330,31 +576,39 @@ def export_data(session_id):
                 (session_id,)
             ).fetchone()
             
+            prefix = ''
+            if not session_row:
+                # Archived sessions are read through the all_* views
+                archive.attach(conn, settings.ARCHIVE_DIR)
+                session_row = conn.execute(
+                    'SELECT * FROM all_sessions WHERE id = ?',
+                    (session_id,)
+                ).fetchone()
+                prefix = 'all_'
+
             if not session_row:
                 return jsonify({'error': 'Session not found'}), 404
             
             # Get all responses
-            responses = conn.execute('''
+            responses = conn.execute(f'''
                 SELECT r.*, t.stimulus_json, t.correct_response as expected_response
-                FROM responses r
-                JOIN trials t ON r.session_id = t.session_id AND r.trial_number = t.trial_number
+                FROM {prefix}responses r
+                JOIN {prefix}trials t ON r.session_id = t.session_id AND r.trial_number = t.trial_number
                 WHERE r.session_id = ?
                 ORDER BY r.trial_number
             ''', (session_id,)).fetchall()
             
             # Convert to CSV
-            import csv
-            from io import StringIO
-            
             output = StringIO()
             if responses:
-                writer = csv.DictWriter(output, fieldnames=responses[0].keys())
+                writer = csv.DictWriter(output, fieldnames=responses[0].keys() + ['qc_flag_names'])
                 writer.writeheader()
                 for row in responses:
-                    writer.writerow(dict(row))
+                    row = dict(row)
+                    row['qc_flag_names'] = ';'.join(quality.flag_names(row.get('qc_flags') or 0))
+                    writer.writerow(row)
             
             # Return as downloadable file
-            from flask import Response
             return Response(
                 output.getvalue(),
                 mimetype='text/csv',
@@ -365,11 +619,104 @@ def export_data(session_id):
         logger.error(f"Error exporting data for session {session_id}: {e}")
         return jsonify({'error': 'Failed to export data'}), 500
 
+@bp.route('/data/analytics/<exp_type>')
+@login_required
+def study_analytics(exp_type):
+    """Study dashboard data from the materialized per-session results"""
+    try:
+        exclude_flagged = request.args.get('exclude_flagged') == '1'
+        include_archive = request.args.get('include_archive') == '1'
+        with get_db() as conn:
+            if include_archive:
+                archive.attach(conn, settings.ARCHIVE_DIR)
+            sessions, metrics = session_results.load_metrics(conn, exp_type, archived=include_archive)
+
+        if exclude_flagged and 'qc_session_flags' in metrics:
+            keep = metrics['qc_session_flags'] == 0
+            sessions = [row for row, k in zip(sessions, keep.tolist()) if k]
+            metrics = {name: values[keep] for name, values in metrics.items()}
+
+        columns = {name: values.tolist() for name, values in metrics.items()}
+        for i, row in enumerate(sessions):
+            row.update({name: values[i] for name, values in columns.items()})
+
+        return jsonify({
+            'experiment_type': exp_type,
+            'n_sessions': len(sessions),
+            'summary': analytics.summarize(metrics),
+            'sessions': sessions
+        })
+
+    except Exception as e:
+        logger.error(f"Error computing analytics for {exp_type}: {e}")
+        return jsonify({'error': 'Failed to compute analytics'}), 500
+
+@bp.route('/data/counterbalance')
+@login_required
+def counterbalance_report():
+    """Condition counts and imbalance per counterbalanced study"""
+    try:
+        study = request.args.get('study', '').strip() or None
+        with get_db() as conn:
+            return jsonify({'studies': counterbalance.imbalance(conn, study)})
+    except Exception as e:
+        logger.error(f"Error building counterbalance report: {e}")
+        return jsonify({'error': 'Failed to build counterbalance report'}), 500
+
+@bp.route('/data/presets')
+@login_required
+def list_presets():
+    """Current config presets, every stored version and files that failed validation"""
+    try:
+        with get_db() as conn:
+            versions = [dict(row) for row in conn.execute('''
+                SELECT p.hash, p.name, p.experiment_type, p.created_at, COUNT(s.id) AS sessions
+                FROM config_presets p LEFT JOIN sessions s ON s.preset_hash = p.hash
+                GROUP BY p.hash ORDER BY p.name, p.created_at
+            ''')]
+        return jsonify({
+            'presets': [p.to_dict() for p in preset_registry.presets()],
+            'versions': versions,
+            'errors': preset_registry.errors
+        })
+    except Exception as e:
+        logger.error(f"Error listing presets: {e}")
+        return jsonify({'error': 'Failed to list presets'}), 500
+
+@bp.route('/data/export/results/<exp_type>')
+@login_required
+def export_results(exp_type):
+    """Export one row of summary metrics per completed session as CSV"""
+    try:
+        include_archive = request.args.get('include_archive') == '1'
+        with get_db() as conn:
+            if include_archive:
+                archive.attach(conn, settings.ARCHIVE_DIR)
+            sessions, metrics = session_results.load_metrics(conn, exp_type, archived=include_archive)
+
+        output = StringIO()
+        fieldnames = ['session_id', 'subject_id', 'source', 'scored_at'] + sorted(metrics)
+        writer = csv.DictWriter(output, fieldnames=fieldnames)
+        writer.writeheader()
+        for i, row in enumerate(sessions):
+            row.update({name: ('' if math.isnan(values[i]) else float(values[i])) for name, values in metrics.items()})
+            writer.writerow(row)
+
+        return Response(
+            output.getvalue(),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={exp_type}_results.csv'}
+        )
+
+    except Exception as e:
+        logger.error(f"Error exporting results for {exp_type}: {e}")
+        return jsonify({'error': 'Failed to export results'}), 500
+
 # ============================================
 # SUBJECT ROUTES (No login required)
 # ============================================
 
-@app.route('/subject/<exp_type>')
+@bp.route('/subject/<exp_type>')
 def subject(exp_type):
     """Subject run page"""
     try:
@@ -385,7 +732,8 @@ def subject(exp_type):
             'sart': 'sart_experiment.html',
             'antisaccade': 'antisaccade_experiment.html',
             'corsi': 'corsi_experiment.html',
-            'butterfly_simon': 'butterfly_simon_experiment.html'
+            'butterfly_simon': 'butterfly_simon_experiment.html',
+            'bart': 'bart_experiment.html'
         }
 
         # Get the HTML file for this experiment
@@ -401,11 +749,19 @@ def subject(exp_type):
         logger.error(f"Error in subject route for {exp_type}: {e}")
         return render_template('error.html', error='Failed to load experiment'), 500
 
+@bp.route('/battery/<name>')
+def subject_battery(name):
+    """Subject page that runs every task of a battery in one page"""
+    if name not in battery.BATTERIES:
+        return render_template('error.html', error='Unknown battery'), 404
+    subject_id = request.args.get('subject_id', '').strip()
+    return render_template('subject_run.html', exp_type=f'battery: {name}', battery_name=name, subject_id=subject_id)
+
 # ============================================
 # API ROUTES
 # ============================================
 
-@app.route('/api/<exp_type>/help')
+@bp.route('/api/<exp_type>/help')
 def api_help(exp_type):
     """Get help text for experiment"""
     try:
@@ -415,14 +771,14 @@ def api_help(exp_type):
         logger.error(f"Error getting help for {exp_type}: {e}")
         return jsonify({'error': 'Failed to get help text'}), 500
 
-@app.route('/api/<exp_type>/schema')
+@bp.route('/api/<exp_type>/schema')
 def api_schema(exp_type):
     """Get configuration schema for experiment"""
     try:
-        if exp_type not in EXPERIMENT_REGISTRY:
+        if exp_type not in EXPERIMENT_ENGINES:
             return jsonify({'error': 'Unknown experiment type'}), 404
         
-        inst = EXPERIMENT_REGISTRY[exp_type]()
+        inst = create_experiment(exp_type, 'schema', {})
         schema = inst.get_configuration_schema()
         
         return jsonify(schema)
@@ -433,14 +789,312 @@ def api_schema(exp_type):
 
 # In-memory session storage (use Redis in production)
 _sessions = {}
+_quality = {}  # session_id -> quality.SessionMonitor
+_battery_plans = {}  # battery_id -> battery.BatteryPlan
+_battery_of = {}  # session_id -> battery_id
+_last_seen = {}  # session_id (battery_id for battery tasks) -> time.monotonic() of the last API call
+
+# Seconds between sweeps for idle sessions
+SESSION_SWEEP_INTERVAL = 60
+_next_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+def _live_session(sid):
+    """Engine of a running session (None if unknown, finished or evicted); refreshes its idle timer"""
+    inst = _sessions.get(sid) if sid else None
+    if inst is not None:
+        _last_seen[_battery_of.get(sid, sid)] = time.monotonic()
+    return inst
+
+def _running_sessions():
+    """Sessions in progress: standalone ones plus the current task of each battery (queued tasks do not count)"""
+    # Finished tasks leave _sessions and _battery_of, so every battery keeps
+    # its current task and the queued ones in both
+    return len(_sessions) - len(_battery_of) + len(_battery_plans)
+
+def _evict_idle_sessions():
+    """Drop sessions idle for longer than SESSION_IDLE_TTL (at most once per sweep interval) -> number dropped"""
+    global _next_sweep
+    now = time.monotonic()
+    if not settings.SESSION_IDLE_TTL or now < _next_sweep or not _sweep_lock.acquire(blocking=False):
+        return 0
+    try:
+        _next_sweep = now + SESSION_SWEEP_INTERVAL
+        # Tasks of a battery share one timer, so queued tasks stay while an earlier one runs
+        idle = [sid for sid in list(_sessions)
+                if now - _last_seen.get(_battery_of.get(sid, sid), now) > settings.SESSION_IDLE_TTL]
+        discarded = 0
+        for sid in idle:
+            battery_id = _battery_of.pop(sid, None)
+            if battery_id is not None:
+                _battery_plans.pop(battery_id, None)
+            _sessions.pop(sid, None)
+            _quality.pop(sid, None)
+            if _commit_coordinator is not None:
+                discarded += _commit_coordinator.discard_session(sid)
+        live = {_battery_of.get(sid, sid) for sid in list(_sessions)}
+        for key in [key for key in list(_last_seen) if key not in live]:
+            _last_seen.pop(key, None)
+        if idle:
+            logger.info(f"Evicted {len(idle)} sessions idle for over {settings.SESSION_IDLE_TTL}s "
+                        f"({discarded} buffered rows discarded)", extra={'event': 'session_evicted'})
+        return len(idle)
+    finally:
+        _sweep_lock.release()
+
+def _prepare_config(config):
+    """Normalize a client-supplied config in place (keymap may arrive as a JSON string)"""
+    if isinstance(config.get('keymap'), str):
+        try:
+            config['keymap'] = json.loads(config['keymap'])
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse keymap for session")
+    return config
+
+_event_log = None
+_compactor = None
+_commit_coordinator = None
+_event_log_lock = threading.Lock()
+
+def _trial_log():
+    """Event log of TRIAL_STORE=log (opened on first use), else None"""
+    global _event_log, _compactor
+    if settings.TRIAL_STORE != 'log':
+        return None
+    with _event_log_lock:
+        if _event_log is None:
+            _compactor = event_log.Compactor(event_log.EventLog(settings.EVENT_LOG_DIR), settings.DB_PATH,
+                                             settings.EVENT_LOG_COMPACT_INTERVAL)
+            _compactor.start()
+            _event_log = _compactor.log
+    return _event_log
+
+def _commits():
+    """Commit coordinator of the SQLite trial store (started on first use)"""
+    global _commit_coordinator
+    with _event_log_lock:
+        if _commit_coordinator is None:
+            _commit_coordinator = CommitCoordinator(settings.DB_PATH, settings.DURABILITY, settings.GROUP_COMMIT_MS)
+            _commit_coordinator.start()
+            atexit.register(_commit_coordinator.stop)
+    return _commit_coordinator
+
+_rate_limiter = None
+_admission = None
+_limits_lock = threading.Lock()
+
+# Subject API endpoints that create sessions (admission control applies)
+NEW_SESSION_ENDPOINTS = ('main.api_start', 'main.api_battery_start', 'main.api_ingest')
+
+def _limits():
+    """Rate limiter (None when RATE_LIMIT_STORE=off) and admission controller, built on first use"""
+    global _rate_limiter, _admission
+    if _admission is None:
+        with _limits_lock:
+            if _admission is None:
+                if settings.RATE_LIMIT_STORE not in rate_limit.STORES:
+                    raise ValueError(f"RATE_LIMIT_STORE must be one of {', '.join(rate_limit.STORES)}")
+                if settings.RATE_LIMIT_STORE != 'off':
+                    if settings.RATE_LIMIT_STORE == 'sqlite':
+                        store = rate_limit.SQLiteBuckets(settings.RATE_LIMIT_DB)
+                    else:
+                        store = rate_limit.MemoryBuckets()
+                    _rate_limiter = rate_limit.RateLimiter(store, {
+                        'ip': rate_limit.parse_limit(settings.RATE_LIMIT_IP),
+                        'start': rate_limit.parse_limit(settings.RATE_LIMIT_START),
+                        'session': rate_limit.parse_limit(settings.RATE_LIMIT_SESSION)
+                    })
+                _admission = rate_limit.AdmissionController(
+                    settings.MAX_LIVE_SESSIONS, settings.MAX_INFLIGHT_REQUESTS, settings.MAX_WRITE_BACKLOG
+                )
+    return _rate_limiter, _admission
+
+def _check_limits(ip, session_id, new_session):
+    """Rate limits + admission control of one subject API call -> None, or (payload, status, retry_after_s)"""
+    limiter, admission = _limits()
+    if limiter is not None:
+        wait = limiter.check('ip', ip)
+        if not wait:
+            # Calls that name no session share a per-address session bucket
+            wait = limiter.check('start', ip) if new_session else limiter.check('session', session_id or ip)
+        if wait:
+            return {'error': 'Too many requests'}, 429, wait
+    if new_session:
+        _evict_idle_sessions()
+        backlog = _commit_coordinator.backlog() if _commit_coordinator is not None else 0
+        reason = admission.refuse_new_session(_running_sessions(), backlog)
+        if reason:
+            logger.info(f"Refused new session: {reason}", extra={'event': 'admission_refused'})
+            return {'error': 'Server busy, please try again shortly'}, 503, 5
+    return None
+
+def _store_rows(conn, table, rows):
+    """Store trial / response rows: event log append, or SQLite at the configured durability"""
+    if not rows:
+        return
+    log = _trial_log()
+    if log is not None:
+        log.append(table, rows)
+    else:
+        _commits().write(conn, table, rows, rows[0][0])
+
+def _rows_db():
+    """Connection for trial/response writes (none needed when they are logged or deferred)"""
+    if _trial_log() is not None or _commits().deferred:
+        return nullcontext()
+    return get_db()
+
+def _save_trial(conn, sid, trial):
+    """Persist a presented trial"""
+    _store_rows(conn, 'trials', [(
+        sid,
+        int(trial.get('trial_number', 0)),
+        1 if trial.get('trial_type') == 'practice' else 0,
+        json.dumps(trial.get('stimulus_data')),
+        str(trial.get('correct_response', '')),
+        json.dumps(trial.get('metadata', {})),
+        datetime.datetime.utcnow().isoformat()
+    )])
+
+def _save_block(conn, sid, block):
+    """Persist every trial of a served block"""
+    columns = block['columns']
+    stimulus_fields = [k for k in columns if k not in ('trial_number', 'correct_response')]
+    metadata_json = json.dumps({'block_number': block['block_number']})
+    now = datetime.datetime.utcnow().isoformat()
+    rows = [
+        (
+            sid,
+            int(trial_number),
+            0,
+            json.dumps({k: columns[k][i] for k in stimulus_fields}),
+            str(columns.get('correct_response', [''] * len(columns['trial_number']))[i]),
+            metadata_json,
+            now
+        )
+        for i, trial_number in enumerate(columns['trial_number'])
+    ]
+    _store_rows(conn, 'trials', rows)
+
+def _score_response(sid, inst, resp):
+    """Run a response through the engine and the QC monitor -> (feedback, correct, qc_flags)"""
+    response = ResponseData.from_dict(resp)
+    fb = inst.record_response(response)
+    correct = int(bool(fb.get('correct'))) if isinstance(fb, dict) else None
+    monitor = _quality.get(sid)
+    qc_flags = monitor.observe(response.trial_number, response.response,
+                               response.response_time_ms, response.metadata) if monitor else 0
+    return fb, correct, qc_flags
+
+def _save_response(conn, sid, resp, correct, fb, qc_flags):
+    """Persist a recorded response"""
+    _store_rows(conn, 'responses', [(
+        sid,
+        int(resp.get('trial_number', 0)),
+        str(resp.get('response_value', '')),
+        float(resp.get('response_time_ms', 0)),
+        correct,
+        json.dumps(fb),
+        datetime.datetime.utcnow().isoformat(),
+        qc_flags
+    )])
 
-@app.route('/api/<exp_type>/start', methods=['POST'])
+def _battery_handoff(sid):
+    """
+    Completion-response fields for a session that belongs to a battery: the
+    next task (session, instructions and first trial or block) or the end of the battery.
+    """
+    battery_id = _battery_of.pop(sid, None)
+    plan = _battery_plans.get(battery_id)
+    if plan is None:
+        return {}
+    
+    next_sid = plan.next_session(sid)
+    if next_sid is None:
+        with get_db() as conn:
+            conn.execute(
+                'UPDATE batteries SET completed_at = ? WHERE id = ?',
+                (datetime.datetime.utcnow().isoformat(), battery_id)
+            )
+            counterbalance.mark_completed(conn, battery_id)
+        _battery_plans.pop(battery_id, None)
+        _last_seen.pop(battery_id, None)
+        logger.info(f"Battery {battery_id} completed")
+        return {'battery_id': battery_id, 'battery_complete': True}
+    
+    # Block-capable clients get the first block of engines with block delivery
+    inst = _sessions[next_sid]
+    block = inst.get_trial_block() if plan.blocks else None
+    trial = _trial_payload(inst.get_next_trial()) if block is None else None
+    if block is not None or trial is not None:
+        with _rows_db() as conn:
+            if block is not None:
+                _save_block(conn, next_sid, block)
+            else:
+                _save_trial(conn, next_sid, trial)
+    position = plan.position_of(next_sid)
+    return {
+        'battery_id': battery_id,
+        'next_task': {
+            'position': position,
+            'experiment_type': plan.task_at(position).experiment_type,
+            'session_id': next_sid,
+            'instructions': inst.get_instructions(),
+            'trial': trial,
+            'block': block
+        }
+    }
+
+def _apply_quality_flags(conn, sid, monitor):
+    """Write the final trial / session QC flags of a finished session"""
+    trial_flags, session_flags = monitor.finalize()
+    conn.executemany(
+        'UPDATE responses SET qc_flags = ? WHERE session_id = ? AND trial_number = ?',
+        [(flags, sid, trial_number) for trial_number, flags in trial_flags.items()]
+    )
+    conn.execute('UPDATE sessions SET qc_flags = ? WHERE id = ?', (session_flags, sid))
+
+def _complete_session(sid, inst):
+    """Score a finished session, stamp completed_at and drop it from the live sessions"""
+    results = inst.get_results()
+    _sessions.pop(sid, None)
+    _last_seen.pop(sid, None)
+    monitor = _quality.pop(sid, None)
+    # A finished session is always complete in SQLite (QC flags, exports)
+    if _trial_log() is not None:
+        _compactor.compact()
+    with get_db() as conn:
+        if _trial_log() is None:
+            _commits().flush_session(conn, sid)
+        conn.execute(
+            'UPDATE sessions SET completed_at = ? WHERE id = ?',
+            (datetime.datetime.utcnow().isoformat(), sid)
+        )
+        if monitor is not None:
+            _apply_quality_flags(conn, sid, monitor)
+        session_results.store_results(conn, sid, inst.get_experiment_type().value, results)
+        counterbalance.mark_completed(conn, sid)
+    return results
+
+def _find_preset(ref, exp_type):
+    """Current preset by name, or any version by hash (including ones only stored in the DB)"""
+    try:
+        return preset_registry.get(ref, exp_type)
+    except KeyError:
+        with get_db() as conn:
+            stored = presets.load_stored(conn, ref)
+        if stored is None:
+            raise
+        preset_registry.remember(stored)
+        return preset_registry.get(ref, exp_type)
+
+@bp.route('/api/<exp_type>/start', methods=['POST'])
 @csrf.exempt
 def api_start(exp_type):
     """Start a new experiment session"""
     try:
         # Validate experiment type
-        if exp_type not in EXPERIMENT_REGISTRY:
+        if exp_type not in EXPERIMENT_ENGINES:
             return jsonify({'error': 'Unknown experiment type'}), 404
         
         # Get request data
@@ -455,159 +1109,518 @@ def api_start(exp_type):
         if len(subject_id) > 50:
             return jsonify({'error': 'Subject ID too long'}), 400
         
-        # Handle keymap if it's a string
-        if isinstance(config.get('keymap'), str):
+        # A preset was validated and normalized when its file was loaded
+        preset = None
+        if data.get('preset'):
+            if config:
+                return jsonify({'error': 'Send either a preset or a config, not both'}), 400
             try:
-                config['keymap'] = json.loads(config['keymap'])
-            except json.JSONDecodeError:
-                logger.warning(f"Failed to parse keymap for session")
-        
-        # Create experiment instance
-        inst = EXPERIMENT_REGISTRY[exp_type]()
-        inst.configure(config)
+                preset = _find_preset(str(data['preset']), exp_type)
+            except KeyError:
+                return jsonify({'error': 'Unknown preset'}), 404
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            config = preset.config()
+        else:
+            _prepare_config(config)
         
         # Generate session ID
         sid = f'{exp_type}-{int(time.time()*1000)}-{uuid.uuid4().hex[:8]}'
-        _sessions[sid] = inst
         
-        # Save to database
+        # Assign a counterbalancing condition, create the instance and save the
+        # session in one transaction (a failed start releases the allocation)
         now = datetime.datetime.utcnow().isoformat()
-        with get_db() as conn:
-            conn.execute('''
-                INSERT INTO sessions 
-                (id, subject_id, experiment_type, config_json, started_at, completed_at) 
-                VALUES (?, ?, ?, ?, ?, NULL)
-            ''', (sid, subject_id, exp_type, json.dumps(config), now))
+        try:
+            with get_db() as conn:
+                allocation = counterbalance.apply(conn, sid, config)
+                inst = create_experiment(exp_type, sid, config)
+                _ensure_subject(conn, subject_id, now)
+                # Preset sessions keep the preset hash plus their own overrides
+                stored_config = config
+                if preset is not None:
+                    presets.store(conn, preset)
+                    stored_config = presets.overrides(preset, config)
+                conn.execute('''
+                    INSERT INTO sessions 
+                    (id, subject_id, experiment_type, config_json, started_at, completed_at, preset_hash) 
+                    VALUES (?, ?, ?, ?, ?, NULL, ?)
+                ''', (sid, subject_id, exp_type, json.dumps(stored_config), now,
+                      preset.hash if preset is not None else None))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        logger.info(f"Started session {sid} for subject {subject_id}, experiment {exp_type}")
+        _sessions[sid] = inst
+        _quality[sid] = quality.SessionMonitor(quality.profile_for(exp_type, config))
+        _last_seen[sid] = time.monotonic()
         
-        return jsonify({
+        logger.info(f"Started session {sid} for subject {subject_id}, experiment {exp_type}",
+                    extra={'event': 'session_start', 'session_id': sid})
+        
+        payload = {
             'session_id': sid,
             'subject_id': subject_id,
             'instructions': inst.get_instructions()
-        })
+        }
+        if allocation is not None:
+            payload['condition'] = allocation.to_dict()
+        if preset is not None:
+            payload['preset'] = {'name': preset.name, 'hash': preset.hash}
+        return jsonify(payload)
     
     except Exception as e:
         logger.error(f"Error starting {exp_type} session: {e}")
         return jsonify({'error': 'Failed to start session'}), 500
 
-@app.route('/api/<exp_type>/next', methods=['POST'])
+@bp.route('/api/battery/start', methods=['POST'])
 @csrf.exempt
-def api_next(exp_type):
-    """Get next trial"""
+def api_battery_start():
+    """Start a battery: plan the order and create every task session up front"""
     try:
         data = request.get_json(force=True) or {}
-        sid = data.get('session_id', '').strip()
-        
-        # Validate session
-        if not sid or sid not in _sessions:
-            return jsonify({'error': 'Invalid session'}), 400
-        
-        inst = _sessions[sid]
+        subject_id = data.get('subject_id', '').strip() or str(uuid.uuid4())
+        if len(subject_id) > 50:
+            return jsonify({'error': 'Subject ID too long'}), 400
+        try:
+            definition = battery.parse_definition(data.get('battery'), EXPERIMENT_ENGINES)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Check if complete
-        if inst.is_complete():
-            results = inst.get_results()
-            
-            # Update database
+        now = datetime.datetime.utcnow().isoformat()
+        try:
             with get_db() as conn:
-                conn.execute(
-                    'UPDATE sessions SET completed_at = ? WHERE id = ?',
-                    (datetime.datetime.utcnow().isoformat(), sid)
-                )
+                _ensure_subject(conn, subject_id, now)
+                # Latin-square rows go round robin per definition
+                allocation = None
+                participant_index = 0
+                if definition.order == 'latin_square':
+                    allocation = counterbalance.allocate(
+                        conn, f'battery:{definition.key}', len(battery.williams_square(len(definition.tasks)))
+                    )
+                    participant_index = allocation.sequence
+                plan = battery.plan_battery(definition, subject_id, participant_index)
+                plan.blocks = bool(data.get('blocks'))
+                if allocation is not None:
+                    counterbalance.record_assignment(conn, plan.battery_id, allocation)
             
-            logger.info(f"Session {sid} completed")
-            return jsonify({'trial': None, 'complete': True, 'results': results})
-        
-        # Get next trial
-        trial = inst.get_next_trial()
-        
-        if trial is None:
-            results = inst.get_results()
-            
-            with get_db() as conn:
-                conn.execute(
-                    'UPDATE sessions SET completed_at = ? WHERE id = ?',
-                    (datetime.datetime.utcnow().isoformat(), sid)
-                )
+                # Every task's config and trial sequence is generated now; a task
+                # config with a "counterbalance" block is allocated per session,
+                # as in api_start (a failed start releases every allocation)
+                instances = {}
+                for position, sid in enumerate(plan.session_ids):
+                    task = plan.task_at(position)
+                    config = _prepare_config(dict(task.config))
+                    counterbalance.apply(conn, sid, config)
+                    instances[sid] = (task.experiment_type, config, create_experiment(task.experiment_type, sid, config))
             
-            logger.info(f"Session {sid} completed (no more trials)")
-            return jsonify({'trial': None, 'complete': True, 'results': results})
+                conn.execute('''
+                    INSERT INTO batteries 
+                    (id, subject_id, name, definition_key, definition_json, task_order_json, started_at) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (plan.battery_id, subject_id, definition.name, definition.key,
+                      json.dumps(definition.to_dict()), json.dumps(plan.order), now))
+                conn.executemany('''
+                    INSERT INTO sessions 
+                    (id, subject_id, experiment_type, config_json, started_at, completed_at, 
+                     battery_id, battery_position) 
+                    VALUES (?, ?, ?, ?, ?, NULL, ?, ?)
+                ''', [
+                    (sid, subject_id, exp_type, json.dumps(config), now, plan.battery_id, position)
+                    for position, (sid, (exp_type, config, _)) in enumerate(instances.items())
+                ])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Save trial to database
-        with get_db() as conn:
-            conn.execute('''
-                INSERT INTO trials 
-                (session_id, trial_number, is_practice, stimulus_json, 
-                 correct_response, metadata_json, presented_at) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                sid,
-                int(trial.get('trial_number', 0)),
-                1 if trial.get('trial_type') == 'practice' else 0,
-                json.dumps(trial.get('stimulus_data')),
-                str(trial.get('correct_response', '')),
-                json.dumps(trial.get('metadata', {})),
-                datetime.datetime.utcnow().isoformat()
-            ))
+        for sid, (exp_type, config, inst) in instances.items():
+            _sessions[sid] = inst
+            _quality[sid] = quality.SessionMonitor(quality.profile_for(exp_type, config))
+            _battery_of[sid] = plan.battery_id
+        _battery_plans[plan.battery_id] = plan
+        _last_seen[plan.battery_id] = time.monotonic()
+        
+        first_sid = plan.session_ids[0]
+        logger.info(f"Started battery {plan.battery_id} ({definition.name}) for subject {subject_id}, order {plan.order}")
         
-        return jsonify({'trial': trial})
+        return jsonify({
+            'battery_id': plan.battery_id,
+            'subject_id': subject_id,
+            'tasks': plan.schedule(),
+            'session_id': first_sid,
+            'experiment_type': plan.task_at(0).experiment_type,
+            'instructions': _sessions[first_sid].get_instructions()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error starting battery: {e}")
+        return jsonify({'error': 'Failed to start battery'}), 500
+
+def _next_payload(sid):
+    """Next trial of a session, or its completion -> (payload, status)"""
+    inst = _live_session(sid)
+    if inst is None:
+        return {'error': 'Invalid session'}, 400
+    
+    # Check if complete
+    if inst.is_complete():
+        results = _complete_session(sid, inst)
+        logger.info(f"Session {sid} completed", extra={'event': 'session_complete', 'session_id': sid})
+        return {'trial': None, 'complete': True, 'results': results, **_battery_handoff(sid)}, 200
+    
+    # Get next trial
+    trial = _trial_payload(inst.get_next_trial())
+    
+    if trial is None:
+        results = _complete_session(sid, inst)
+        logger.info(f"Session {sid} completed (no more trials)")
+        return {'trial': None, 'complete': True, 'results': results, **_battery_handoff(sid)}, 200
+    
+    # Save trial to database
+    with _rows_db() as conn:
+        _save_trial(conn, sid, trial)
+    
+    return {'trial': trial}, 200
+
+def _record_payload(sid, resp):
+    """Score and store a response -> (payload, status)"""
+    inst = _live_session(sid)
+    if inst is None:
+        return {'error': 'Invalid session'}, 400
+    
+    # Validate response
+    if not isinstance(resp, dict):
+        return {'error': 'Invalid response format'}, 400
+    
+    # Record response
+    fb, correct, qc_flags = _score_response(sid, inst, resp)
+    
+    # Save to database
+    with _rows_db() as conn:
+        _save_response(conn, sid, resp, correct, fb, qc_flags)
+    
+    return {'feedback': fb}, 200
+
+@bp.route('/api/<exp_type>/next', methods=['POST'])
+@csrf.exempt
+def api_next(exp_type):
+    """Get next trial"""
+    try:
+        data = request.get_json(force=True) or {}
+        payload, status = _next_payload(data.get('session_id', '').strip())
+        return jsonify(payload), status
     
     except Exception as e:
         logger.error(f"Error getting next trial for {exp_type}: {e}")
         return jsonify({'error': 'Failed to get next trial'}), 500
 
-@app.route('/api/<exp_type>/record', methods=['POST'])
+@bp.route('/api/<exp_type>/record', methods=['POST'])
 @csrf.exempt
 def api_record(exp_type):
     """Record a response"""
+    try:
+        data = request.get_json(force=True) or {}
+        payload, status = _record_payload(data.get('session_id', '').strip(), data.get('response', {}))
+        return jsonify(payload), status
+    
+    except Exception as e:
+        logger.error(f"Error recording response for {exp_type}: {e}")
+        return jsonify({'error': 'Failed to record response'}), 500
+
+@bp.route('/api/<exp_type>/channel', methods=['POST'])
+@csrf.exempt
+def api_channel(exp_type):
+    """HTTP fallback of the trial channel: a batch of client messages in, server messages out"""
+    try:
+        data = request.get_json(force=True) or {}
+        sid = str(data.get('session_id', '')).strip()
+        messages = data.get('messages')
+        if not isinstance(messages, list) or len(messages) > trial_channel.MAX_BATCH:
+            return jsonify({'error': 'Invalid message batch'}), 400
+        
+        replies = []
+        for message in messages:
+            try:
+                out = trial_channel.handle(trial_channel.validate(message),
+                                           lambda: _next_payload(sid),
+                                           lambda resp: _record_payload(sid, resp))
+            except ValueError as e:
+                out = [trial_channel.error(f'Invalid message: {e}', message)]
+            replies.extend(out)
+            # Battery hand-off: later messages go to the next task's session
+            sid = trial_channel.rebind(out, sid)
+        
+        return jsonify({'session_id': sid, 'messages': replies})
+    
+    except Exception as e:
+        logger.error(f"Error on trial channel for {exp_type}: {e}")
+        return jsonify({'error': 'Trial channel failed'}), 500
+
+@bp.route('/api/<exp_type>/block', methods=['POST'])
+@csrf.exempt
+def api_block(exp_type):
+    """Get the next block of trials in one payload"""
     try:
         data = request.get_json(force=True) or {}
         sid = data.get('session_id', '').strip()
         
         # Validate session
-        if not sid or sid not in _sessions:
+        inst = _live_session(sid)
+        if inst is None:
             return jsonify({'error': 'Invalid session'}), 400
         
-        inst = _sessions[sid]
-        resp = data.get('response', {})
+        block = inst.get_trial_block()
         
-        # Validate response
-        if not isinstance(resp, dict):
-            return jsonify({'error': 'Invalid response format'}), 400
+        if block is None:
+            if not inst.is_complete():
+                return jsonify({'error': 'Experiment does not support trial blocks'}), 400
+            results = _complete_session(sid, inst)
+            logger.info(f"Session {sid} completed", extra={'event': 'session_complete', 'session_id': sid})
+            return jsonify({'block': None, 'complete': True, 'results': results, **_battery_handoff(sid)})
         
-        # Record response
-        fb = inst.record_response(resp)
-        correct = int(bool(fb.get('correct'))) if isinstance(fb, dict) else None
+        # Save every trial of the block in one transaction
+        with _rows_db() as conn:
+            _save_block(conn, sid, block)
+        
+        # Compact binary encoding on request (backend/wire.py)
+        if wire.CONTENT_TYPE in request.headers.get('Accept', ''):
+            return Response(wire.encode(block), mimetype=wire.CONTENT_TYPE)
+        return jsonify({'block': block})
+    
+    except Exception as e:
+        logger.error(f"Error getting trial block for {exp_type}: {e}")
+        return jsonify({'error': 'Failed to get trial block'}), 500
+
+@bp.route('/api/<exp_type>/record_block', methods=['POST'])
+@csrf.exempt
+def api_record_block(exp_type):
+    """Record an array-encoded block of responses"""
+    try:
+        if request.mimetype == wire.CONTENT_TYPE:
+            # Binary body: the session id travels in the block meta
+            try:
+                data = wire.decode(request.get_data())
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            data['responses'] = data.pop('columns')
+        else:
+            data = request.get_json(force=True) or {}
+        sid = str(data.get('session_id', '')).strip()
+        
+        # Validate session
+        inst = _live_session(sid)
+        if inst is None:
+            return jsonify({'error': 'Invalid session'}), 400
+        
+        block = data.get('responses', {})
+        
+        if not isinstance(block, dict):
+            return jsonify({'error': 'Invalid response block format'}), 400
+        
+        try:
+            scored = inst.record_response_block(block)
+        except NotImplementedError:
+            return jsonify({'error': 'Experiment does not support block responses'}), 400
+        except ValueError as e:
+            logger.warning(f"Rejected response block for session {sid}: {e}")
+            return jsonify({'error': str(e)}), 400
+        
+        # Optional per-trial time the page was hidden, parallel to the block arrays
+        hidden_ms = block.get('hidden_ms') or []
+        monitor = _quality.get(sid)
+        qc_flags = [
+            monitor.observe(t['trial_number'], t['response_value'], t['response_time_ms'],
+                            {'hidden_ms': hidden_ms[i] if i < len(hidden_ms) else 0})
+            if monitor else 0
+            for i, t in enumerate(scored['trials'])
+        ]
+        
+        now = datetime.datetime.utcnow().isoformat()
+        rows = [
+            (
+                sid,
+                t['trial_number'],
+                t['response_value'],
+                t['response_time_ms'],
+                int(t['correct']),
+                json.dumps({'correct': t['correct'], 'flags': t['flags']}),
+                now,
+                flags
+            )
+            for t, flags in zip(scored['trials'], qc_flags)
+        ]
+        with _rows_db() as conn:
+            _store_rows(conn, 'responses', rows)
+        
+        return jsonify({'summary': scored['summary'], 'complete': inst.is_complete()})
+    
+    except Exception as e:
+        logger.error(f"Error recording response block for {exp_type}: {e}")
+        return jsonify({'error': 'Failed to record response block'}), 500
+
+@bp.route('/api/<exp_type>/ingest', methods=['POST'])
+@csrf.exempt
+def api_ingest(exp_type):
+    """Ingest a whole client-run session (trials + responses) in one transaction"""
+    try:
+        if exp_type not in EXPERIMENT_ENGINES:
+            return jsonify({'error': 'Unknown experiment type'}), 404
+        
+        data = request.get_json(force=True) or {}
+        config = data.get('config', {})
+        subject_id = str(data.get('subject_id') or '').strip() or str(uuid.uuid4())
+        records = data.get('trials')
+        
+        # Validate inputs
+        if not isinstance(config, dict):
+            return jsonify({'error': 'Invalid configuration format'}), 400
+        
+        if len(subject_id) > 50:
+            return jsonify({'error': 'Subject ID too long'}), 400
+        
+        if not isinstance(records, list) or not records:
+            return jsonify({'error': 'No trials to ingest'}), 400
+        
+        if len(records) > settings.MAX_INGEST_TRIALS:
+            return jsonify({'error': 'Too many trials in one upload'}), 413
+        
+        sid = f'{exp_type}-{int(time.time()*1000)}-{uuid.uuid4().hex[:8]}'
+        inst = create_experiment(exp_type, sid, config)
+        monitor = quality.SessionMonitor(quality.profile_for(exp_type, config))
+        
+        # Score every record through the engine before touching the database
+        now = datetime.datetime.utcnow().isoformat()
+        trial_rows = []
+        response_rows = []
+        for index, rec in enumerate(records, start=1):
+            if not isinstance(rec, dict):
+                return jsonify({'error': f'Invalid trial record at position {index}'}), 400
+            
+            rec.setdefault('trial_number', index)
+            resp = ResponseData.from_dict(rec)
+            fb = inst.record_response(resp)
+            correct = fb.get('correct') if isinstance(fb, dict) else resp.correct
+            monitor.observe(resp.trial_number, resp.response, resp.response_time_ms, resp.metadata)
+            
+            trial_rows.append((
+                sid,
+                resp.trial_number,
+                1 if rec.get('trial_type') == 'practice' else 0,
+                json.dumps(rec.get('stimulus_data')),
+                str(rec.get('correct_response', '')),
+                json.dumps(rec.get('metadata', {})),
+                rec.get('presented_at') or now
+            ))
+            response_rows.append((
+                sid,
+                resp.trial_number,
+                str(resp.response if resp.response is not None else ''),
+                float(resp.response_time_ms),
+                None if correct is None else int(bool(correct)),
+                json.dumps(fb),
+                rec.get('recorded_at') or now
+            ))
+        
+        results = inst.get_results()
         
-        # Save to database
         with get_db() as conn:
+            _ensure_subject(conn, subject_id, now)
             conn.execute('''
+                INSERT INTO sessions 
+                (id, subject_id, experiment_type, config_json, started_at, completed_at) 
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (sid, subject_id, exp_type, json.dumps(config),
+                  data.get('started_at') or now, now))
+            conn.executemany('''
+                INSERT INTO trials 
+                (session_id, trial_number, is_practice, stimulus_json, 
+                 correct_response, metadata_json, presented_at) 
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', trial_rows)
+            conn.executemany('''
                 INSERT INTO responses 
                 (session_id, trial_number, response_value, response_time_ms, 
                  correct, feedback, recorded_at) 
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                sid,
-                int(resp.get('trial_number', 0)),
-                str(resp.get('response_value', '')),
-                float(resp.get('response_time_ms', 0)),
-                correct,
-                json.dumps(fb),
-                datetime.datetime.utcnow().isoformat()
-            ))
+            ''', response_rows)
+            _apply_quality_flags(conn, sid, monitor)
+            session_results.store_results(conn, sid, exp_type, results)
+        
+        logger.info(f"Ingested session {sid} ({len(records)} trials) for subject {subject_id}, experiment {exp_type}",
+                    extra={'event': 'session_ingest', 'session_id': sid})
         
-        return jsonify({'feedback': fb})
+        return jsonify({
+            'session_id': sid,
+            'subject_id': subject_id,
+            'trials_ingested': len(records),
+            'results': results
+        })
     
     except Exception as e:
-        logger.error(f"Error recording response for {exp_type}: {e}")
-        return jsonify({'error': 'Failed to record response'}), 500
+        logger.error(f"Error ingesting {exp_type} session: {e}")
+        return jsonify({'error': 'Failed to ingest session'}), 500
+
+@bp.route('/data/snapshots')
+@login_required
+def list_snapshots():
+    """Snapshot metadata with preview URLs (no image is read; legacy uploads without a blob have none)"""
+    try:
+        exp_type = request.args.get('experiment_type', '').strip()
+        with get_db() as conn:
+            rows = conn.execute('''
+                SELECT g.id, g.session_id, g.experiment_type, g.notes, g.uploaded_at,
+                       COALESCE(g.filename, g.filepath) AS filename,
+                       b.sha256, b.size_bytes, b.content_type
+                FROM gui_snapshots g LEFT JOIN snapshot_blobs b ON b.sha256 = g.blob_sha256
+                WHERE ? = '' OR g.experiment_type = ?
+                ORDER BY g.uploaded_at DESC, g.id DESC LIMIT 200
+            ''', (exp_type, exp_type)).fetchall()
+        snapshots = []
+        for row in rows:
+            item = dict(row)
+            stored = row['sha256'] is not None
+            item['filename'] = os.path.basename(row['filename'] or '')
+            item['url'] = url_for('main.snapshot_blob', digest=row['sha256']) if stored else None
+            item['preview_url'] = url_for('main.snapshot_preview', digest=row['sha256']) if stored else None
+            item['thumbnail_ready'] = stored and snapshot_store.thumbnail_path(row['sha256']).exists()
+            snapshots.append(item)
+        return jsonify({'snapshots': snapshots, 'thumbnails_enabled': thumbnails.available})
+    except Exception as e:
+        logger.error(f"Error listing snapshots: {e}")
+        return jsonify({'error': 'Failed to list snapshots'}), 500
+
+def _snapshot_content_type(digest):
+    """Stored content type of a snapshot blob, None when unknown"""
+    if not blob_store.is_digest(digest):
+        return None
+    with get_db() as conn:
+        row = conn.execute('SELECT content_type FROM snapshot_blobs WHERE sha256 = ?', (digest,)).fetchone()
+    return row['content_type'] if row and snapshot_store.path(digest).exists() else None
+
+@bp.route('/data/snapshots/<digest>')
+@login_required
+def snapshot_blob(digest):
+    """Original snapshot file (immutable, cacheable forever)"""
+    content_type = _snapshot_content_type(digest)
+    if content_type is None:
+        return jsonify({'error': 'Snapshot not found'}), 404
+    return send_file(snapshot_store.path(digest), mimetype=content_type, etag=digest, max_age=31536000)
+
+@bp.route('/data/snapshots/<digest>/preview')
+@login_required
+def snapshot_preview(digest):
+    """Thumbnail of a snapshot, or the original until the thumbnail exists"""
+    content_type = _snapshot_content_type(digest)
+    if content_type is None:
+        return jsonify({'error': 'Snapshot not found'}), 404
+    thumb = snapshot_store.thumbnail_path(digest)
+    if thumb.exists():
+        return send_file(thumb, mimetype='image/png', etag=f'{digest}-thumb', max_age=31536000)
+    # Not cached, so the thumbnail replaces it once ready
+    return send_file(snapshot_store.path(digest), mimetype=content_type, max_age=0)
 
 # ============================================
 # FILE UPLOAD ROUTES
 # ============================================
 
-@app.route('/snapshot/upload', methods=['POST'])
+@bp.route('/snapshot/upload', methods=['POST'])
 @login_required
 def snapshot_upload():
     """Upload GUI snapshot"""
@@ -620,51 +1633,56 @@ def snapshot_upload():
         # Validate inputs
         if not uploaded:
             flash('No file uploaded', 'danger')
-            return redirect(request.referrer or url_for('home'))
+            return redirect(request.referrer or url_for('main.home'))
         
         if not exp_type:
             flash('Experiment type required', 'danger')
-            return redirect(request.referrer or url_for('home'))
+            return redirect(request.referrer or url_for('main.home'))
         
         # Secure filename
         filename = secure_filename(uploaded.filename)
         if not filename:
             flash('Invalid filename', 'danger')
-            return redirect(request.referrer or url_for('home'))
-        
-        # Create upload directory
-        Config.UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
+            return redirect(request.referrer or url_for('main.home'))
         
-        # Save file
-        timestamp = int(time.time())
-        safe_name = f'{exp_type}_{timestamp}_{filename}'
-        save_path = Config.UPLOAD_FOLDER / safe_name
-        
-        uploaded.save(save_path)
+        # Stream into the content-addressed store (identical files are stored once)
+        try:
+            blob = snapshot_store.put(uploaded.stream, settings.MAX_CONTENT_LENGTH)
+        except blob_store.BlobTooLarge as e:
+            flash(str(e), 'danger')
+            return redirect(request.referrer or url_for('main.home'))
         
         # Save to database
         with get_db() as conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO snapshot_blobs (sha256, size_bytes, content_type, created_at)
+                VALUES (?, ?, ?, datetime('now'))
+            ''', (blob.sha256, blob.size_bytes, blob.content_type))
             conn.execute('''
                 INSERT INTO gui_snapshots 
-                (session_id, experiment_type, filepath, notes, uploaded_at) 
-                VALUES (?, ?, ?, ?, datetime('now'))
-            ''', (session_id or None, exp_type, str(save_path), notes))
+                (session_id, experiment_type, filepath, notes, uploaded_at, blob_sha256, filename) 
+                VALUES (?, ?, ?, ?, datetime('now'), ?, ?)
+            ''', (session_id or None, exp_type, str(snapshot_store.path(blob.sha256)), notes,
+                  blob.sha256, filename))
         
-        logger.info(f"Uploaded snapshot: {safe_name}")
+        # Preview is made after the response, in a worker process
+        thumbnails.submit(blob.sha256, blob.content_type)
+        
+        logger.info(f"Uploaded snapshot: {filename} ({blob.sha256[:12]}, {'new' if blob.created else 'duplicate'})")
         flash('Snapshot uploaded successfully', 'success')
         
-        return redirect(url_for('experimenter', exp_type=exp_type))
+        return redirect(url_for('main.experimenter', exp_type=exp_type))
     
     except Exception as e:
         logger.error(f"Error uploading snapshot: {e}")
         flash('Failed to upload snapshot', 'danger')
-        return redirect(request.referrer or url_for('home'))
+        return redirect(request.referrer or url_for('main.home'))
 
 # ============================================
 # UTILITY ROUTES
 # ============================================
 
-@app.route('/psychopy/complete')
+@bp.route('/psychopy/complete')
 def psychopy_complete():
     """PsychoPy completion page"""
     try:
@@ -682,7 +1700,7 @@ def psychopy_complete():
         logger.error(f"Error in psychopy_complete: {e}")
         return render_template('error.html', error='Completion page error'), 500
 
-@app.route('/docs/<path:filename>')
+@bp.route('/docs/<path:filename>')
 def docs(filename):
     """Serve documentation files"""
     try:
@@ -692,7 +1710,7 @@ def docs(filename):
         logger.error(f"Error serving doc {filename}: {e}")
         return "Document not found", 404
 
-@app.route('/experiments/<path:filename>')
+@bp.route('/experiments/<path:filename>')
 def experiments(filename):
     """Serve experiment HTML files"""
     try:
@@ -702,41 +1720,136 @@ def experiments(filename):
         logger.error(f"Error serving experiment {filename}: {e}")
         return "Experiment not found", 404
 
+# ============================================
+# LOG CORRELATION AND RATE LIMITS
+# ============================================
+
+@bp.before_app_request
+def bind_log_context():
+    """Tag every record logged for this request with its request and session ID"""
+    request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex[:16]
+    session_id = (request.view_args or {}).get('session_id') or request.args.get('session_id')
+    if not session_id and request.method == 'POST' and request.path.startswith('/api/'):
+        if request.mimetype == wire.CONTENT_TYPE:
+            # Binary blocks carry the session ID in their meta
+            try:
+                body = wire.decode_meta(request.get_data())
+            except ValueError:
+                body = None
+        else:
+            # Subject API bodies are JSON whatever the content type (get_json(force=True) in the routes)
+            body = request.get_json(force=True, silent=True)
+        if isinstance(body, dict) and isinstance(body.get('session_id'), str):
+            session_id = body['session_id'].strip()
+    g.log_tokens = structured_logging.set_context(request_id=request_id, session_id=session_id)
+    g.request_id = request_id
+    g.session_id = session_id
+
+@bp.before_app_request
+def limit_subject_api():
+    """Rate limit subject API calls and shed new sessions under load"""
+    if request.method != 'POST' or not request.path.startswith('/api/'):
+        return None
+    blocked = _check_limits(request.remote_addr, g.get('session_id'),
+                            request.endpoint in NEW_SESSION_ENDPOINTS)
+    if blocked is not None:
+        payload, status, retry_after = blocked
+        response = jsonify(payload)
+        response.status_code = status
+        response.headers['Retry-After'] = str(math.ceil(retry_after))
+        return response
+    _limits()[1].enter()
+    g.admitted = True
+    return None
+
+@bp.after_app_request
+def add_request_id(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@bp.teardown_app_request
+def reset_log_context(error):
+    tokens = g.pop('log_tokens', None)
+    if tokens is not None:
+        structured_logging.reset_context(tokens)
+    if g.pop('admitted', False):
+        _limits()[1].exit()
+
 # ============================================
 # ERROR HANDLERS
 # ============================================
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     logger.warning(f"404 error: {request.url}")
     return render_template('error.html', error='Page not found'), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     logger.error(f"500 error: {error}")
     return render_template('error.html', error='Internal server error'), 500
 
-@app.errorhandler(Exception)
+@bp.app_errorhandler(Exception)
 def handle_exception(error):
     logger.error(f"Unhandled exception: {error}", exc_info=True)
     return render_template('error.html', error='An unexpected error occurred'), 500
 
+# ============================================
+# APP FACTORY
+# ============================================
+
+def create_app(overrides=None):
+    """
+    Build the Flask app: Config plus overrides in flask_app.config (read by
+    the module through `settings`), logging, CSRF, routes and the database
+    schema check. Engines and numpy-backed modules are loaded by the first
+    request that needs them. Nothing runs at import: entry points (wsgi.py,
+    asgi_app.py, `python app_FIXED.py`) call this once per process.
+    """
+    overrides = dict(overrides or {})
+    for key, value in overrides.items():
+        if not hasattr(Config, key):
+            raise KeyError(f"Unknown config option: {key}")
+        if isinstance(getattr(Config, key), Path):
+            overrides[key] = Path(value)
+
+    flask_app = Flask(__name__,
+                      template_folder='frontend/templates',
+                      static_folder='frontend/static')
+    flask_app.config.from_object(Config)
+    flask_app.config.update(overrides)
+    settings.config = flask_app.config
+    configure_logging()
+    csrf.init_app(flask_app)
+    flask_app.register_blueprint(bp)
+
+    # Read by backend.experiments.table_cache when an adaptive procedure
+    # first needs it (inherited by worker processes)
+    os.environ['ADAPTIVE_TABLE_CACHE'] = str(settings.ADAPTIVE_TABLE_CACHE)
+    preset_registry.set_directory(settings.PRESET_DIR)
+    snapshot_store.root = Path(settings.SNAPSHOT_STORE).absolute()
+    thumbnails.workers = settings.THUMBNAIL_WORKERS
+    thumbnails.start()
+    atexit.register(thumbnails.shutdown)
+    init_db()
+    return flask_app
+
 # ============================================
 # MAIN
 # ============================================
 
 if __name__ == '__main__':
-    # Initialize database
     try:
-        init_db()
+        app = create_app()
         logger.info("Application starting...")
         
         # Print important info
         print("=" * 60)
         print("EXPERIMENT MAKER - FIXED VERSION")
         print("=" * 60)
-        print(f"Default admin username: {Config.DEFAULT_USERNAME}")
-        print(f"Default admin password: {Config.DEFAULT_PASSWORD}")
+        print(f"Default admin username: {settings.DEFAULT_USERNAME}")
+        print(f"Default admin password: {settings.DEFAULT_PASSWORD}")
         print("⚠️  CHANGE THE DEFAULT PASSWORD BEFORE DEPLOYMENT!")
         print("Set environment variables ADMIN_USERNAME and ADMIN_PASSWORD")
         print("=" * 60)
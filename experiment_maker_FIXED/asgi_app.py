@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Experiment Maker - ASGI serving mode
+Serves the same experiment engines and database as app_FIXED.py from an
+event loop. The per-trial hot path (/api/<type>/next and /record) runs as
+native async handlers with SQLite work on a dedicated executor (event log
+appends, with TRIAL_STORE=log, on the WSGI threads); every other
+route is handed to the Flask app unchanged through a WSGI bridge.
+WebSocket /ws/<type>?session_id=... carries the trial channel
+(backend/trial_channel.py): one message per response, next trial pushed back.
+
+Run:        uvicorn asgi_app:app          (or: hypercorn asgi_app:app)
+            The Flask app (app_FIXED.create_app) is built on lifespan startup,
+            or by the first request when the server sends no lifespan events.
+Benchmark:  python asgi_app.py --participants 200 --trials 40
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import io
+import json
+import math
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import app_FIXED as core
+from app_FIXED import logger
+from backend import trial_channel
+from backend.db_executor import DatabaseExecutor
+
+# Threads that run Flask (WSGI) routes outside the hot path
+WSGI_THREADS = 8
+
+FAST_PATH = re.compile(r'^/api/(?P<exp_type>[A-Za-z0-9_]+)/(?P<action>next|record)$')
+CHANNEL_PATH = re.compile(r'^/ws/(?P<exp_type>[A-Za-z0-9_]+)$')
+
+flask_app = None
+db = None
+_wsgi_pool = None
+
+def setup(overrides=None):
+    """Build the Flask app and the DB executor once (create_app overrides apply to both)"""
+    global flask_app, db
+    if flask_app is None:
+        flask_app = core.create_app(overrides)
+        db = DatabaseExecutor(core.settings.DB_PATH)
+    return flask_app
+
+def _wsgi_executor():
+    global _wsgi_pool
+    if _wsgi_pool is None:
+        _wsgi_pool = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+    return _wsgi_pool
+
+# ============================================
+# ASYNC HOT PATH
+# ============================================
+
+async def _save(fn, *args):
+    """Trial/response write; event log appends skip the DB thread so concurrent ones share an fsync"""
+    if core._trial_log() is not None:
+        return await asyncio.get_running_loop().run_in_executor(_wsgi_executor(), fn, None, *args)
+    if core._commits().deferred:
+        return fn(None, *args)  # group / session durability only queues the rows
+    return await db.run(fn, *args)
+
+async def _check_limits(ip, sid):
+    """core._check_limits() on a DB thread: with RATE_LIMIT_STORE=sqlite every check is a write"""
+    return await db.call(core._check_limits, ip, sid, False)
+
+async def _complete(sid, inst):
+    """Score and close a finished session (plus battery hand-off) on the DB thread"""
+    def complete():
+        results = core._complete_session(sid, inst)
+        return {'trial': None, 'complete': True, 'results': results, **core._battery_handoff(sid)}
+    payload = await db.call(complete)
+    logger.info(f"Session {sid} completed", extra={'event': 'session_complete', 'session_id': sid})
+    return payload
+
+async def api_next(exp_type, data):
+    """Get next trial"""
+    sid = str(data.get('session_id', '')).strip()
+    inst = core._live_session(sid)
+    if inst is None:
+        return {'error': 'Invalid session'}, 400
+
+    if inst.is_complete():
+        return await _complete(sid, inst), 200
+
+    trial = core._trial_payload(inst.get_next_trial())
+    if trial is None:
+        return await _complete(sid, inst), 200
+
+    await _save(core._save_trial, sid, trial)
+    return {'trial': trial}, 200
+
+async def api_record(exp_type, data):
+    """Record a response"""
+    sid = str(data.get('session_id', '')).strip()
+    inst = core._live_session(sid)
+    if inst is None:
+        return {'error': 'Invalid session'}, 400
+
+    resp = data.get('response', {})
+    if not isinstance(resp, dict):
+        return {'error': 'Invalid response format'}, 400
+
+    fb, correct, qc_flags = core._score_response(sid, inst, resp)
+    await _save(core._save_response, sid, resp, correct, fb, qc_flags)
+    return {'feedback': fb}, 200
+
+HANDLERS = {'next': api_next, 'record': api_record}
+ERRORS = {'next': 'Failed to get next trial', 'record': 'Failed to record response'}
+
+async def channel_handle(exp_type, sid, message):
+    """Async counterpart of trial_channel.handle() on the hot-path handlers"""
+    if message['op'] == 'ping':
+        return trial_channel.handle(message, None, None)
+    if message['op'] == 'next':
+        return [trial_channel.from_payload(*await api_next(exp_type, {'session_id': sid}), message)]
+
+    data = {'session_id': sid, 'response': message['response']}
+    feedback = trial_channel.from_payload(*await api_record(exp_type, data), message)
+    if feedback['op'] == 'error':
+        return [feedback]
+    return [feedback, trial_channel.from_payload(*await api_next(exp_type, {'session_id': sid}))]
+
+async def channel(scope, receive, send):
+    """Trial channel over WebSocket; stays bound to one session (or battery)"""
+    match = CHANNEL_PATH.match(scope['path'])
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    sid = query.get('session_id', [''])[0].strip()
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    if not match or sid not in core._sessions:
+        return await send({'type': 'websocket.close', 'code': 4400})
+    await send({'type': 'websocket.accept'})
+
+    exp_type = match.group('exp_type')
+    ip = (scope.get('client') or ('',))[0]
+    while True:
+        event = await receive()
+        if event['type'] == 'websocket.disconnect':
+            return
+        raw = event.get('text') if event.get('text') is not None else event.get('bytes')
+        message = None
+        try:
+            message = trial_channel.decode(raw)
+            if await _check_limits(ip, sid) is not None:
+                replies = [trial_channel.error('Too many requests', message)]
+            else:
+                replies = await channel_handle(exp_type, sid, message)
+        except ValueError as e:
+            replies = [trial_channel.error(f'Invalid message: {e}', message)]
+        except Exception as e:
+            logger.error(f"Error on trial channel for {sid}: {e}")
+            replies = [trial_channel.error('Trial channel failed', message)]
+        for reply in replies:
+            await send({'type': 'websocket.send', 'text': flask_app.json.dumps(reply)})
+        sid = trial_channel.rebind(replies, sid)
+
+# ============================================
+# ASGI PLUMBING
+# ============================================
+
+async def _read_body(receive, limit):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if len(body) > limit:
+            raise ValueError('Request body too large')
+        if not message.get('more_body'):
+            return bytes(body)
+
+async def _send(send, status, body, content_type=b'application/json', headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode()), *headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def _send_json(send, payload, status=200):
+    await _send(send, status, flask_app.json.dumps(payload).encode('utf-8') + b'\n')
+
+def _environ(scope, body):
+    """PEP 3333 environ for an ASGI http scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def _call_wsgi(environ):
+    """Run the Flask app to completion; returns (status, headers, body)"""
+    response = {}
+    chunks = []
+    def start_response(status, headers, exc_info=None):
+        response['status'], response['headers'] = status, headers
+        return chunks.append
+    result = flask_app(environ, start_response)
+    try:
+        chunks.extend(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], b''.join(chunks)
+
+async def _wsgi(scope, receive, send):
+    """Hand a request to the Flask app on a worker thread (responses are buffered)"""
+    body = await _read_body(receive, core.settings.MAX_CONTENT_LENGTH)
+    if body is None:
+        return
+    loop = asyncio.get_running_loop()
+    status, headers, payload = await loop.run_in_executor(_wsgi_executor(), _call_wsgi, _environ(scope, body))
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+async def _lifespan(receive, send):
+    global _wsgi_pool
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            setup()
+            db.start()
+            logger.info("ASGI application starting...")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            db.shutdown()
+            if _wsgi_pool is not None:
+                _wsgi_pool.shutdown(wait=False)
+                _wsgi_pool = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if flask_app is None:
+        setup()
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] == 'websocket':
+        return await channel(scope, receive, send)
+    if scope['type'] != 'http':
+        return
+
+    match = FAST_PATH.match(scope['path'])
+    if not match or scope['method'] != 'POST':
+        return await _wsgi(scope, receive, send)
+
+    action = match.group('action')
+    try:
+        body = await _read_body(receive, core.settings.MAX_CONTENT_LENGTH)
+        if body is None:
+            return
+        data = json.loads(body or b'{}')
+        if not isinstance(data, dict):
+            return await _send_json(send, {'error': 'Invalid request'}, 400)
+        blocked = await _check_limits((scope.get('client') or ('',))[0], str(data.get('session_id', '')).strip())
+        if blocked is not None:
+            payload, status, retry_after = blocked
+            return await _send(send, status, flask_app.json.dumps(payload).encode('utf-8') + b'\n',
+                               headers=[(b'retry-after', str(math.ceil(retry_after)).encode())])
+        admission = core._limits()[1]
+        admission.enter()
+        try:
+            payload, status = await HANDLERS[action](match.group('exp_type'), data)
+        finally:
+            admission.exit()
+    except ValueError as e:
+        # Malformed JSON or oversized body
+        return await _send_json(send, {'error': f'Invalid request: {e}'}, 400)
+    except Exception as e:
+        logger.error(f"Error in {action} for {match.group('exp_type')}: {e}")
+        return await _send_json(send, {'error': ERRORS[action]}, 500)
+    await _send_json(send, payload, status)
+
+# ============================================
+# BENCHMARK (sync Flask vs ASGI vs channel, in-process)
+# ============================================
+
+async def _asgi_request(path, payload):
+    """Call the ASGI app in-process; returns (status, parsed JSON)"""
+    body = json.dumps(payload).encode()
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'query_string': b'',
+             'headers': [(b'content-type', b'application/json')], 'http_version': '1.1'}
+    sent = {'done': False}
+    async def receive():
+        if sent['done']:
+            return {'type': 'http.disconnect'}
+        sent['done'] = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    out = {}
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            out['status'] = message['status']
+        else:
+            out['body'] = out.get('body', b'') + message.get('body', b'')
+    await app(scope, receive, send)
+    return out['status'], json.loads(out['body'])
+
+class _ChannelClient:
+    """In-process WebSocket client of the trial channel (benchmark)"""
+
+    def __init__(self, exp_type, sid):
+        self._to_app = asyncio.Queue()
+        self._from_app = asyncio.Queue()
+        scope = {'type': 'websocket', 'path': f'/ws/{exp_type}',
+                 'query_string': f'session_id={sid}'.encode(), 'headers': []}
+        self._task = asyncio.ensure_future(app(scope, self._to_app.get, self._from_app.put))
+
+    async def open(self):
+        await self._to_app.put({'type': 'websocket.connect'})
+        event = await self._from_app.get()
+        if event['type'] != 'websocket.accept':
+            raise RuntimeError(f"Channel refused: {event}")
+
+    async def send(self, message):
+        await self._to_app.put({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self):
+        return json.loads((await self._from_app.get())['text'])
+
+    async def close(self):
+        await self._to_app.put({'type': 'websocket.disconnect', 'code': 1000})
+        await self._task
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _bench_response(trial):
+    return {'trial_number': trial['trial_number'], 'response_value': trial['correct_response'],
+            'response_time_ms': 550, 'correct_response': trial['correct_response'],
+            'metadata': trial.get('metadata') or {}}
+
+def bench(participants=200, trials=40, threads=16, think_ms=0.0, exp_type='stroop'):
+    """
+    N participants run `trials` trials concurrently against each mode and
+    the time from submitting a response to holding the next trial is
+    recorded. sync: /record + /next through the Flask routes on a pool of
+    `threads` threads (a threaded WSGI server); asgi: the same two requests
+    awaited on the event loop; channel: one record message on the
+    WebSocket channel, next trial pushed back. Latency includes queueing;
+    no network stack is involved.
+    """
+    tmp = tempfile.mkdtemp(prefix='asgi-bench-')
+    setup({'DB_PATH': Path(tmp) / 'bench.db', 'LOG_FILE': str(Path(tmp) / 'bench.log'), 'LOG_LEVEL': 'WARNING'})
+    client = flask_app.test_client()
+
+    def start_sessions():
+        return [
+            client.post(f'/api/{exp_type}/start', json={'config': {'total_trials': trials}}).get_json()['session_id']
+            for _ in range(participants)
+        ]
+
+    async def think():
+        if think_ms:
+            await asyncio.sleep(think_ms / 1000.0)
+
+    def http_participant(request):
+        async def participant(sid, latencies):
+            _, data = await request(f'/api/{exp_type}/next', {'session_id': sid})
+            while data.get('trial'):
+                trial = data['trial']
+                await think()
+                t0 = time.perf_counter()
+                await request(f'/api/{exp_type}/record', {'session_id': sid, 'response': _bench_response(trial)})
+                _, data = await request(f'/api/{exp_type}/next', {'session_id': sid})
+                latencies.append(time.perf_counter() - t0)
+        return participant
+
+    async def channel_participant(sid, latencies):
+        conn = _ChannelClient(exp_type, sid)
+        await conn.open()
+        await conn.send({'op': 'next'})
+        message = await conn.receive()
+        while message['op'] == 'trial':
+            await think()
+            t0 = time.perf_counter()
+            await conn.send({'op': 'record', 'response': _bench_response(message['trial'])})
+            await conn.receive()  # feedback
+            message = await conn.receive()
+            latencies.append(time.perf_counter() - t0)
+        await conn.close()
+
+    async def run(participant):
+        sids = start_sessions()
+        latencies = []
+        started = time.perf_counter()
+        await asyncio.gather(*(participant(sid, latencies) for sid in sids))
+        return latencies, time.perf_counter() - started
+
+    pool = ThreadPoolExecutor(max_workers=threads)
+    async def sync_request(path, payload):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(pool, lambda: client.post(path, json=payload))
+        return response.status_code, response.get_json()
+
+    async def modes():
+        report = {}
+        report['sync'] = await run(http_participant(sync_request))
+        db.start()
+        report['asgi'] = await run(http_participant(_asgi_request))
+        report['channel'] = await run(channel_participant)
+        db.shutdown()
+        return report
+
+    results = asyncio.run(modes())
+    pool.shutdown()
+    print(f"{participants} participants x {trials} trials ({exp_type}), think {think_ms:.0f} ms, sync threads {threads}")
+    print("latency = response submitted -> next trial received")
+    print(f"{'mode':<8} {'trials':>7} {'trials/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode, (latencies, elapsed) in results.items():
+        ms = [x * 1000 for x in latencies]
+        print(f"{mode:<8} {len(ms):>7} {len(ms) / elapsed:>9.0f} {statistics.median(ms):>8.2f} "
+              f"{_percentile(ms, 0.95):>8.2f} {_percentile(ms, 0.99):>8.2f} {max(ms):>8.2f}")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark sync (Flask), async (ASGI) and WebSocket channel serving of the trial API")
+    parser.add_argument('--participants', type=int, default=200)
+    parser.add_argument('--trials', type=int, default=40)
+    parser.add_argument('--threads', type=int, default=16, help="Sync worker threads")
+    parser.add_argument('--think-ms', type=float, default=0.0, help="Pause between trial and response")
+    parser.add_argument('--task', default='stroop')
+    args = parser.parse_args()
+    bench(args.participants, args.trials, args.threads, args.think_ms, args.task)
@@ -0,0 +1,322 @@
+"""
+FILE: backend/analytics.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Study-level analytics. Loads every response of one
+                  experiment type from app.db in a single query into
+                  columnar NumPy arrays, then scores all sessions at once.
+
+METHOD: Vectorized scoring
+    - One JOIN of sessions + responses + trials (practice trials excluded);
+      per-type stimulus fields are pulled with SQLite json_extract, so no
+      JSON is parsed in Python
+    - Per-session metrics use np.bincount / np.maximum.at over a session
+      index column instead of replaying sessions through experiment objects
+    - Metrics match the per-session get_results() of each engine
+      (Stroop accuracy/mean RT, SART commission/omission rates and CV,
+      Digit Span max span); other types get accuracy / mean RT
+    - Trials flagged by backend.quality are left out of every RT metric
+    - Group summaries (n, mean, SD, median, min, max) per metric
+
+USAGE:
+    scores = score_sessions(conn, "sart")
+    scores.summary["commission_error_rate"]["mean"]
+    scores.to_records()   # one dict per session
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Callable
+from dataclasses import dataclass, field, replace
+import json
+import sqlite3
+import numpy as np
+
+from . import quality
+
+
+# Per-type trial fields pulled out of the JSON columns in SQL
+FIELD_SPECS = {
+    "stroop": {"congruent": "json_extract(t.metadata_json, '$.congruent')"},
+    "sart": {"is_target": "json_extract(t.stimulus_json, '$.is_target')"},
+    "digit_span": {
+        "span_length": "json_extract(t.metadata_json, '$.span_length')",
+        "backward": "json_extract(t.stimulus_json, '$.direction') = 'backward'",
+    },
+    "corsi": {
+        "span_length": "json_extract(t.metadata_json, '$.span_length')",
+        "backward": "json_extract(t.metadata_json, '$.direction') = 'backward'",
+    },
+}
+
+# Values stored in responses.response_value that mean "no response"
+NO_RESPONSE_VALUES = ("", "None", "no_response")
+
+
+@dataclass
+class ResponseFrame:
+    """Columnar view of every response of one experiment type."""
+    experiment_type: str
+    session_ids: np.ndarray          # (n_sessions,) object
+    subject_ids: np.ndarray          # (n_sessions,) object
+    session_index: np.ndarray        # (n_rows,) int64 -> session_ids
+    trial_number: np.ndarray         # (n_rows,) int64
+    rt: np.ndarray                   # (n_rows,) float64, response_time_ms
+    correct: np.ndarray              # (n_rows,) float64, 1/0/nan
+    responded: np.ndarray            # (n_rows,) bool
+    qc_flags: np.ndarray             # (n_rows,) int64, quality.FLAG_* mask
+    session_qc_flags: np.ndarray     # (n_sessions,) int64, quality.SESSION_FLAG_* mask
+    fields: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @property
+    def n_sessions(self) -> int:
+        return int(self.session_ids.size)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.session_index.size)
+
+    @property
+    def rt_valid(self) -> np.ndarray:
+        """Rows whose RT passed quality screening."""
+        return (self.qc_flags & quality.RT_EXCLUDE_FLAGS) == 0
+
+    def select(self, mask: np.ndarray) -> "ResponseFrame":
+        """Same sessions, only the rows where mask is True."""
+        return replace(
+            self,
+            session_index=self.session_index[mask],
+            trial_number=self.trial_number[mask],
+            rt=self.rt[mask],
+            correct=self.correct[mask],
+            responded=self.responded[mask],
+            qc_flags=self.qc_flags[mask],
+            fields={name: values[mask] for name, values in self.fields.items()}
+        )
+
+    def count(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows per session (optionally only where mask is True)."""
+        weights = None if mask is None else mask.astype(np.float64)
+        counts = np.bincount(self.session_index, weights=weights, minlength=self.n_sessions)
+        return counts.astype(np.int64)
+
+    def total(self, values: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sum of values per session (optionally only where mask is True)."""
+        if mask is not None:
+            values = np.where(mask, values, 0.0)
+        return np.bincount(self.session_index, weights=values, minlength=self.n_sessions)
+
+
+@dataclass
+class StudyScores:
+    """Per-session metric columns plus group summaries."""
+    experiment_type: str
+    session_ids: np.ndarray
+    subject_ids: np.ndarray
+    metrics: Dict[str, np.ndarray]
+    summary: Dict[str, Dict[str, float]]
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """One plain dict per session (JSON-ready)."""
+        columns = {name: values.tolist() for name, values in self.metrics.items()}
+        return [
+            {
+                "session_id": sid,
+                "subject_id": subject,
+                **{name: values[i] for name, values in columns.items()}
+            }
+            for i, (sid, subject) in enumerate(zip(self.session_ids.tolist(), self.subject_ids.tolist()))
+        ]
+
+
+def load_frame(conn: sqlite3.Connection, experiment_type: str,
+               completed_only: bool = False,
+               session_ids: Optional[Sequence[str]] = None) -> ResponseFrame:
+    """Load all responses of one experiment type (or of some sessions) in a single query."""
+    specs = FIELD_SPECS.get(experiment_type, {})
+    extra = "".join(f", {expr} AS f_{name}" for name, expr in specs.items())
+    filters = "AND s.completed_at IS NOT NULL" if completed_only else ""
+    params: Tuple[Any, ...] = ()
+    if session_ids is not None:
+        filters += " AND s.id IN (SELECT value FROM json_each(?))"
+        params = (json.dumps(list(session_ids)),)
+    placeholders = ", ".join("?" for _ in NO_RESPONSE_VALUES)
+
+    # Plain tuples: the app's connections use sqlite3.Row, which is far
+    # slower to build for a few hundred thousand rows
+    cursor = conn.cursor()
+    cursor.row_factory = None
+
+    session_rows = cursor.execute(f'''
+        SELECT s.rowid, s.id, s.subject_id, s.qc_flags FROM sessions s
+        WHERE s.experiment_type = ? {filters}
+        ORDER BY s.rowid
+    ''', (experiment_type, *params)).fetchall()
+
+    # Numeric columns only (sessions by rowid), so the result converts to a
+    # single float matrix without per-value Python work
+    rows = cursor.execute(f'''
+        SELECT s.rowid, r.trial_number, r.response_time_ms, r.correct,
+               CASE WHEN r.response_value IS NULL OR r.response_value IN ({placeholders})
+                    THEN 0 ELSE 1 END, r.qc_flags{extra}
+        FROM responses r
+        JOIN sessions s ON s.id = r.session_id
+        LEFT JOIN trials t ON t.session_id = r.session_id AND t.trial_number = r.trial_number
+        WHERE s.experiment_type = ? {filters} AND COALESCE(t.is_practice, 0) = 0
+    ''', (*NO_RESPONSE_VALUES, experiment_type, *params)).fetchall()
+
+    rowids = np.array([r[0] for r in session_rows], dtype=np.int64)
+    matrix = np.array(rows, dtype=np.float64).reshape(len(rows), 6 + len(specs))
+
+    return ResponseFrame(
+        experiment_type=experiment_type,
+        session_ids=np.array([r[1] for r in session_rows], dtype=object),
+        subject_ids=np.array([r[2] for r in session_rows], dtype=object),
+        session_index=np.searchsorted(rowids, matrix[:, 0].astype(np.int64)),
+        trial_number=matrix[:, 1].astype(np.int64),
+        rt=np.nan_to_num(matrix[:, 2]),
+        correct=matrix[:, 3],
+        responded=matrix[:, 4] == 1,
+        qc_flags=matrix[:, 5].astype(np.int64),
+        session_qc_flags=np.array([r[3] for r in session_rows], dtype=np.int64),
+        fields={name: matrix[:, 6 + i] for i, name in enumerate(specs)}
+    )
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator, dtype=np.float64),
+                     where=denominator > 0)
+
+
+def _session_max(frame: ResponseFrame, values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    result = np.zeros(frame.n_sessions)
+    np.maximum.at(result, frame.session_index[mask], values[mask])
+    return result
+
+
+def score_accuracy_rt(frame: ResponseFrame) -> Dict[str, np.ndarray]:
+    """Generic scoring: trials, accuracy, mean RT of correct responses."""
+    n = frame.count()
+    is_correct = frame.correct == 1
+    rt_mask = is_correct & (frame.rt > 0) & frame.rt_valid
+    return {
+        "total_trials": n,
+        "accuracy": _safe_divide(frame.count(is_correct), n),
+        "mean_rt_ms": _safe_divide(frame.total(frame.rt, rt_mask), frame.count(rt_mask))
+    }
+
+
+def score_stroop(frame: ResponseFrame) -> Dict[str, np.ndarray]:
+    """Same metrics as StroopExperiment.get_results()."""
+    n = frame.count()
+    denominator = np.maximum(n, 1)
+    congruent = frame.fields["congruent"] == 1
+    incongruent = frame.fields["congruent"] == 0
+    is_correct = frame.correct == 1
+    valid = frame.rt_valid
+    positive = (frame.rt > 0) & valid
+    cong_rt = _safe_divide(frame.total(frame.rt, is_correct & positive & congruent),
+                           frame.count(is_correct & positive & congruent))
+    incong_rt = _safe_divide(frame.total(frame.rt, is_correct & positive & incongruent),
+                             frame.count(is_correct & positive & incongruent))
+    return {
+        "total_trials": n,
+        "accuracy": frame.count(is_correct) / denominator,
+        # get_results() divides the summed positive RTs by every trial
+        "mean_rt_ms": _safe_divide(frame.total(frame.rt, positive), frame.count(valid)),
+        "stroop_effect_ms": incong_rt - cong_rt
+    }
+
+
+def score_sart(frame: ResponseFrame) -> Dict[str, np.ndarray]:
+    """Same metrics as SARTExperiment.get_results()."""
+    target = frame.fields["is_target"] == 1
+    responded = frame.responded
+    hit = ~target & responded
+    valid_hit = hit & frame.rt_valid
+
+    commission = frame.count(target & responded)
+    omission = frame.count(~target & ~responded)
+    n_targets = frame.count(target)
+    n_non_targets = frame.count(~target)
+
+    n_hits = frame.count(hit)
+    n_rt = frame.count(valid_hit)
+    rt_sum = frame.total(frame.rt, valid_hit)
+    rt_sumsq = frame.total(frame.rt * frame.rt, valid_hit)
+    mean_rt = _safe_divide(rt_sum, n_rt)
+    variance = _safe_divide(rt_sumsq - n_rt * mean_rt * mean_rt, n_rt - 1)
+    std_rt = np.where(n_rt > 1, np.sqrt(np.maximum(variance, 0.0)), 0.0)
+
+    return {
+        "total_trials": frame.count(),
+        "commission_errors": commission,
+        "commission_error_rate": _safe_divide(commission, n_targets) * 100,
+        "omission_errors": omission,
+        "omission_error_rate": _safe_divide(omission, n_non_targets) * 100,
+        "correct_rejections": frame.count(target & ~responded),
+        "hits": n_hits,
+        "mean_reaction_time_ms": mean_rt,
+        "std_reaction_time_ms": std_rt,
+        "cv_reaction_time": _safe_divide(std_rt, mean_rt)
+    }
+
+
+def score_span(frame: ResponseFrame) -> Dict[str, np.ndarray]:
+    """Same span metrics as DigitSpanExperiment / CorsiExperiment.get_results()."""
+    span = np.nan_to_num(frame.fields["span_length"])
+    backward = frame.fields["backward"] == 1
+    is_correct = frame.correct == 1
+    return {
+        "total_trials": frame.count(),
+        "max_span_achieved": _session_max(frame, span, is_correct),
+        "forward_span": _session_max(frame, span, is_correct & ~backward),
+        "backward_span": _session_max(frame, span, is_correct & backward),
+        "accuracy": _safe_divide(frame.count(is_correct), frame.count())
+    }
+
+
+SCORERS: Dict[str, Callable[[ResponseFrame], Dict[str, np.ndarray]]] = {
+    "stroop": score_stroop,
+    "sart": score_sart,
+    "digit_span": score_span,
+    "corsi": score_span,
+}
+
+
+def summarize(metrics: Dict[str, np.ndarray]) -> Dict[str, Dict[str, float]]:
+    """Group summary of every metric column."""
+    summary = {}
+    for name, values in metrics.items():
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            summary[name] = {"n": 0}
+            continue
+        summary[name] = {
+            "n": int(values.size),
+            "mean": float(values.mean()),
+            "sd": float(values.std(ddof=1)) if values.size > 1 else 0.0,
+            "median": float(np.median(values)),
+            "min": float(values.min()),
+            "max": float(values.max())
+        }
+    return summary
+
+
+def score_sessions(conn: sqlite3.Connection, experiment_type: str,
+                   completed_only: bool = False,
+                   session_ids: Optional[Sequence[str]] = None) -> StudyScores:
+    """Score sessions straight from the raw tables."""
+    frame = load_frame(conn, experiment_type, completed_only=completed_only,
+                       session_ids=session_ids)
+    metrics = SCORERS.get(experiment_type, score_accuracy_rt)(frame)
+    metrics["qc_flagged_trials"] = frame.count(frame.qc_flags != 0)
+    metrics["qc_session_flags"] = frame.session_qc_flags
+    return StudyScores(
+        experiment_type=experiment_type,
+        session_ids=frame.session_ids,
+        subject_ids=frame.subject_ids,
+        metrics=metrics,
+        summary=summarize(metrics)
+    )
@@ -0,0 +1,292 @@
+"""
+FILE: backend/archive.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Retention and archival for long-running deployments. Moves
+                  completed sessions older than a cutoff out of app.db into
+                  per-month or per-study archive databases, which stay
+                  queryable from app.db through ATTACH.
+
+METHOD: Online batches over ATTACHed archives
+    - Candidates: sessions with completed_at before the cutoff whose battery
+      (if any) has finished. Sessions in progress are never touched
+    - Each batch (default 50 sessions) is one BEGIN IMMEDIATE transaction
+      on app.db with the archive ATTACHed: rows are copied with INSERT OR
+      IGNORE, then deleted from app.db. The write lock is held for one
+      small batch only, and the archiver sleeps between batches so
+      participants' writes interleave; a rerun after a crash is idempotent
+    - Moved per session: sessions, trials, responses, session_results,
+      session_metrics, gui_snapshots. Copied (kept in app.db too): the
+      subjects, batteries, config presets and snapshot blob rows they
+      reference, so every archive is self-contained. Snapshot files stay
+      in the blob store
+    - Archive schema = app.db's current DDL and indexes; columns added to
+      app.db later are added to older archives on their next use
+    - Partitions: "month" -> archive-YYYY-MM.db (by completed_at), "study"
+      -> archive-<experiment_type>.db
+    - Space: app.db is created with auto_vacuum=INCREMENTAL (init_db);
+      after each batch `PRAGMA incremental_vacuum(N)` returns freed pages
+      to the OS a few at a time instead of one blocking VACUUM. Databases
+      created before that need one offline --enable-incremental-vacuum
+    - Reading: attach() ATTACHes the archives to a connection and creates
+      TEMP views all_sessions, all_trials, all_responses,
+      all_session_results, all_session_metrics (app.db UNION ALL every
+      archive) for the analytics and export routes
+
+USAGE:
+    python -m backend.archive --older-than 180 --partition month
+    python -m backend.archive --older-than 365 --partition study --dry-run
+    python -m backend.archive --enable-incremental-vacuum   # once, offline
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from pathlib import Path
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Tables keyed by session id, moved in this order (children first on delete)
+SESSION_TABLES = ("trials", "responses", "session_results", "session_metrics", "gui_snapshots")
+
+# Referenced rows copied along: table -> (key column, sessions column / query)
+REFERENCED = (
+    ("subjects", "id", "SELECT subject_id FROM main.sessions WHERE id IN ({ids})"),
+    ("batteries", "id", "SELECT battery_id FROM main.sessions WHERE id IN ({ids})"),
+    ("config_presets", "hash", "SELECT preset_hash FROM main.sessions WHERE id IN ({ids})"),
+    ("snapshot_blobs", "sha256", "SELECT blob_sha256 FROM main.gui_snapshots WHERE session_id IN ({ids})"),
+)
+
+# Tables with an all_<table> view across app.db and the archives
+VIEW_TABLES = ("sessions", "trials", "responses", "session_results", "session_metrics")
+
+PARTITIONS = ("month", "study")
+ARCHIVE_PREFIX = "archive-"
+
+# SQLite's default SQLITE_MAX_ATTACHED is 10
+MAX_ATTACHED = 10
+
+
+@dataclass
+class ArchiveReport:
+    sessions: int = 0
+    batches: int = 0
+    per_archive: Dict[str, int] = field(default_factory=dict)
+    pages_freed: int = 0
+    elapsed_s: float = 0.0
+
+
+def archive_name(partition: str, experiment_type: str, completed_at: str) -> str:
+    if partition == "month":
+        return f"{ARCHIVE_PREFIX}{completed_at[:7]}.db"
+    return f"{ARCHIVE_PREFIX}{re.sub(r'[^A-Za-z0-9_]', '_', experiment_type)}.db"
+
+
+def archives(directory: os.PathLike) -> List[Path]:
+    """Archive files, newest name first."""
+    return sorted(Path(directory).glob(f"{ARCHIVE_PREFIX}*.db"), reverse=True)
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> List[Tuple[str, str]]:
+    return [(row[1], row[2]) for row in conn.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+def _ensure_schema(conn: sqlite3.Connection, schema: str, tables: Tuple[str, ...]) -> None:
+    """Create app.db's tables and indexes in an attached archive (or add new columns)."""
+    for table in tables:
+        existing = {name for name, _ in _columns(conn, schema, table)}
+        if not existing:
+            sql = conn.execute(
+                "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()[0]
+            conn.execute(re.sub(r'^CREATE TABLE (IF NOT EXISTS )?', f'CREATE TABLE IF NOT EXISTS {schema}.', sql))
+        else:
+            for name, decl in _columns(conn, 'main', table):
+                if name not in existing:
+                    conn.execute(f'ALTER TABLE {schema}.{table} ADD COLUMN {name} {decl}')
+        for (sql,) in conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (table,)
+        ).fetchall():
+            conn.execute(re.sub(r'^CREATE (UNIQUE )?INDEX (IF NOT EXISTS )?',
+                                lambda m: f'CREATE {m.group(1) or ""}INDEX IF NOT EXISTS {schema}.', sql))
+
+
+def _copy(conn: sqlite3.Connection, schema: str, table: str, where: str, params: tuple) -> int:
+    columns = ", ".join(name for name, _ in _columns(conn, 'main', table))
+    return conn.execute(
+        f'INSERT OR IGNORE INTO {schema}.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE {where}',
+        params
+    ).rowcount
+
+
+def _move_batch(conn: sqlite3.Connection, schema: str, session_ids: List[str]) -> None:
+    """Copy a batch of sessions into the attached archive and delete them from app.db (one transaction)."""
+    ids = json.dumps(session_ids)
+    in_ids = "(SELECT value FROM json_each(?))"
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for table, key, query in REFERENCED:
+            _copy(conn, schema, table, f'{key} IN ({query.format(ids=in_ids)})', (ids,))
+        _copy(conn, schema, 'sessions', f'id IN {in_ids}', (ids,))
+        for table in SESSION_TABLES:
+            _copy(conn, schema, table, f'session_id IN {in_ids}', (ids,))
+        for table in SESSION_TABLES:
+            conn.execute(f'DELETE FROM main.{table} WHERE session_id IN {in_ids}', (ids,))
+        conn.execute(f'DELETE FROM main.sessions WHERE id IN {in_ids}', (ids,))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def candidates(conn: sqlite3.Connection, cutoff: str, partition: str) -> Dict[str, List[str]]:
+    """Archive file name -> ids of the completed sessions to move there."""
+    by_archive: Dict[str, List[str]] = {}
+    for session_id, experiment_type, completed_at in conn.execute('''
+        SELECT s.id, s.experiment_type, s.completed_at FROM sessions s
+        LEFT JOIN batteries b ON b.id = s.battery_id
+        WHERE s.completed_at IS NOT NULL AND s.completed_at < ?
+          AND (s.battery_id IS NULL OR b.completed_at IS NOT NULL)
+        ORDER BY s.completed_at
+    ''', (cutoff,)):
+        by_archive.setdefault(archive_name(partition, experiment_type, completed_at), []).append(session_id)
+    return by_archive
+
+
+def auto_vacuum_mode(conn: sqlite3.Connection) -> int:
+    """0 = none, 1 = full, 2 = incremental."""
+    return conn.execute('PRAGMA main.auto_vacuum').fetchone()[0]
+
+
+def archive(db_path: os.PathLike, directory: os.PathLike, older_than_days: float,
+            partition: str = "month", batch_size: int = 50, pause_s: float = 0.05,
+            vacuum_pages: int = 2000, dry_run: bool = False) -> ArchiveReport:
+    """Move completed sessions older than the cutoff into archive databases."""
+    if partition not in PARTITIONS:
+        raise ValueError(f"Partition must be one of {', '.join(PARTITIONS)}")
+    report = ArchiveReport()
+    started = time.perf_counter()
+    cutoff = (datetime.datetime.utcnow() - datetime.timedelta(days=older_than_days)).isoformat()
+    directory = Path(directory)
+
+    # Autocommit mode: transactions are explicit (BEGIN IMMEDIATE per batch)
+    conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None)
+    try:
+        plan = candidates(conn, cutoff, partition)
+        if dry_run:
+            report.per_archive = {name: len(ids) for name, ids in plan.items()}
+            report.sessions = sum(report.per_archive.values())
+            return report
+
+        incremental = auto_vacuum_mode(conn) == 2
+        if plan and not incremental:
+            logger.warning("app.db does not use incremental auto-vacuum; freed pages stay in the file "
+                           "(run once with --enable-incremental-vacuum)")
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, session_ids in plan.items():
+            conn.execute('ATTACH DATABASE ? AS archive_db', (str(directory / name),))
+            try:
+                _ensure_schema(conn, 'archive_db', ('subjects', 'batteries', 'config_presets', 'snapshot_blobs',
+                                                    'sessions', *SESSION_TABLES))
+                for start in range(0, len(session_ids), batch_size):
+                    batch = session_ids[start:start + batch_size]
+                    _move_batch(conn, 'archive_db', batch)
+                    report.sessions += len(batch)
+                    report.batches += 1
+                    report.per_archive[name] = report.per_archive.get(name, 0) + len(batch)
+                    if incremental:
+                        before = conn.execute('PRAGMA main.freelist_count').fetchone()[0]
+                        conn.execute(f'PRAGMA main.incremental_vacuum({int(vacuum_pages)})').fetchall()
+                        report.pages_freed += before - conn.execute('PRAGMA main.freelist_count').fetchone()[0]
+                    time.sleep(pause_s)
+            finally:
+                conn.execute('DETACH DATABASE archive_db')
+    finally:
+        conn.close()
+    report.elapsed_s = time.perf_counter() - started
+    return report
+
+
+def enable_incremental_vacuum(db_path: os.PathLike) -> None:
+    """Switch an existing app.db to incremental auto-vacuum (one full VACUUM; run offline)."""
+    conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None)
+    try:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+
+def attach(conn: sqlite3.Connection, directory: os.PathLike) -> List[str]:
+    """
+    ATTACH the archives (newest first, up to SQLite's limit) and create TEMP
+    all_<table> views over app.db + archives -> attached schema names.
+    Must run outside a transaction.
+    """
+    attached = [row[1] for row in conn.execute('PRAGMA database_list') if row[1].startswith('archive_')]
+    paths = archives(directory)
+    room = MAX_ATTACHED - len(attached)
+    if len(paths) > room:
+        logger.warning(f"{len(paths)} archives, attaching the newest {room} (SQLite attach limit)")
+    attached_files = {row[2] for row in conn.execute('PRAGMA database_list')}
+    for path in paths:
+        if len(attached) >= MAX_ATTACHED or str(path.resolve()) in attached_files:
+            continue
+        schema = f'archive_{len(attached) + 1}'
+        conn.execute('ATTACH DATABASE ? AS ' + schema, (str(path.resolve()),))
+        attached.append(schema)
+
+    for table in VIEW_TABLES:
+        columns = [name for name, _ in _columns(conn, 'main', table)]
+        selects = [f'SELECT {", ".join(columns)} FROM main.{table}']
+        for schema in attached:
+            present = {name for name, _ in _columns(conn, schema, table)}
+            if present:
+                selects.append('SELECT ' + ', '.join(c if c in present else f'NULL AS {c}' for c in columns)
+                               + f' FROM {schema}.{table}')
+        conn.execute(f'DROP VIEW IF EXISTS temp.all_{table}')
+        conn.execute(f'CREATE TEMP VIEW all_{table} AS ' + ' UNION ALL '.join(selects))
+    return attached
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Move old completed sessions into archive databases")
+    parser.add_argument("--db", default=os.path.join("database", "app.db"), help="Path to app.db")
+    parser.add_argument("--dir", default=os.path.join("database", "archive"), help="Archive directory")
+    parser.add_argument("--older-than", type=float, default=180, help="Age cutoff in days (completed_at)")
+    parser.add_argument("--partition", choices=PARTITIONS, default="month", help="One archive per month or per study")
+    parser.add_argument("--batch", type=int, default=50, help="Sessions per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would move")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Convert app.db to incremental auto-vacuum (full VACUUM, run offline) and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(args.db)
+        print("app.db now uses incremental auto-vacuum")
+        return 0
+
+    report = archive(args.db, args.dir, args.older_than, args.partition, args.batch, dry_run=args.dry_run)
+    verb = "Would archive" if args.dry_run else "Archived"
+    print(f"{verb} {report.sessions} sessions in {report.batches} batches "
+          f"({report.elapsed_s:.1f}s, {report.pages_freed} pages freed)")
+    for name, count in sorted(report.per_archive.items()):
+        print(f"  {name}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
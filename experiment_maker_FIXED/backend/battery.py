@@ -0,0 +1,207 @@
+"""
+FILE: backend/battery.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Multi-experiment batteries. A battery definition lists
+                  tasks (experiment type + config) and how to order them;
+                  the server plans the whole battery when it starts and
+                  hands the participant from one task to the next.
+
+METHOD: Plan at start, schedule server-side
+    - Orders: "fixed" (as listed), "latin_square" (balanced Williams
+      design: every task appears once per position and follows every
+      other task equally often; rows are assigned by participant index),
+      "random" (independent shuffle per participant)
+    - plan_battery() fixes the order and one session id per task; the app
+      creates every engine instance (configs and trial sequences) and
+      every sessions row in one transaction, all under the same subject
+    - BatteryPlan.next_session() is the scheduler: when a task completes,
+      the app returns the next task's session, instructions and first
+      trial in the completion response, so hand-offs cost no round trip
+
+CONFIGURATION:
+    Built-in definitions in BATTERIES; experimenters can also post a
+    definition: {"name": ..., "order": ..., "tasks": [{"experiment_type":
+    ..., "config": {...}}, ...]}.
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+
+REFERENCES:
+    Williams, E. J. (1949). Experimental designs balanced for the estimation
+        of residual effects of treatments. Australian Journal of Scientific
+        Research, 2(3), 149-168.
+"""
+
+from typing import Dict, Any, Iterable, List, Optional
+from dataclasses import dataclass, field
+import hashlib
+import json
+import random
+import time
+import uuid
+
+
+ORDERS = ("fixed", "latin_square", "random")
+
+# Upper bound on tasks per battery
+MAX_TASKS = 12
+
+
+@dataclass(frozen=True)
+class BatteryTask:
+    """One task of a battery."""
+    experiment_type: str
+    config: Dict[str, Any] = field(default_factory=dict, hash=False)
+
+
+@dataclass(frozen=True)
+class BatteryDefinition:
+    """Tasks of a battery and how to order them."""
+    name: str
+    tasks: List[BatteryTask]
+    order: str = "fixed"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "order": self.order,
+            "tasks": [{"experiment_type": t.experiment_type, "config": t.config} for t in self.tasks]
+        }
+
+    @property
+    def key(self) -> str:
+        """Content hash; participants of the same definition share one counterbalancing sequence."""
+        payload = json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+BATTERIES = {
+    "core": BatteryDefinition(
+        name="core",
+        order="latin_square",
+        tasks=[BatteryTask("stroop"), BatteryTask("digit_span"), BatteryTask("sart")]
+    ),
+    "executive": BatteryDefinition(
+        name="executive",
+        order="latin_square",
+        tasks=[BatteryTask("stroop"), BatteryTask("antisaccade"),
+               BatteryTask("butterfly_simon"), BatteryTask("corsi")]
+    ),
+}
+
+
+def parse_definition(data: Any, known_types: Iterable[str]) -> BatteryDefinition:
+    """Validate a battery name or posted definition; raises ValueError."""
+    if isinstance(data, str):
+        if data not in BATTERIES:
+            raise ValueError(f"Unknown battery: {data}")
+        return BATTERIES[data]
+    if not isinstance(data, dict):
+        raise ValueError("Battery must be a name or a definition object")
+
+    order = data.get("order", "fixed")
+    if order not in ORDERS:
+        raise ValueError(f"Unknown battery order: {order}")
+    tasks = data.get("tasks")
+    if not isinstance(tasks, list) or not tasks:
+        raise ValueError("Battery needs a non-empty task list")
+    if len(tasks) > MAX_TASKS:
+        raise ValueError(f"Battery has more than {MAX_TASKS} tasks")
+
+    known = set(known_types)
+    parsed = []
+    for task in tasks:
+        if isinstance(task, str):
+            task = {"experiment_type": task}
+        if not isinstance(task, dict) or task.get("experiment_type") not in known:
+            raise ValueError(f"Unknown experiment type in battery: {task}")
+        config = task.get("config") or {}
+        if not isinstance(config, dict):
+            raise ValueError("Battery task config must be an object")
+        parsed.append(BatteryTask(task["experiment_type"], config))
+
+    name = str(data.get("name") or "custom")[:50]
+    return BatteryDefinition(name=name, tasks=parsed, order=order)
+
+
+def williams_square(n: int) -> List[List[int]]:
+    """
+    Balanced Latin square (Williams design) over n conditions: n rows for
+    even n, 2n rows (the square plus its mirror) for odd n.
+    """
+    first = [0]
+    low, high = 1, n - 1
+    for i in range(1, n):
+        if i % 2:
+            first.append(low)
+            low += 1
+        else:
+            first.append(high)
+            high -= 1
+    rows = [[(c + r) % n for c in first] for r in range(n)]
+    if n % 2:
+        rows += [list(reversed(row)) for row in rows]
+    return rows
+
+
+def task_order(definition: BatteryDefinition, participant_index: int,
+               rng: Optional[random.Random] = None) -> List[int]:
+    """Task indexes in the order this participant runs them."""
+    n = len(definition.tasks)
+    if definition.order == "latin_square":
+        rows = williams_square(n)
+        return rows[participant_index % len(rows)]
+    order = list(range(n))
+    if definition.order == "random":
+        (rng or random).shuffle(order)
+    return order
+
+
+@dataclass
+class BatteryPlan:
+    """A started battery: order, one session per task, and the scheduler state."""
+    battery_id: str
+    subject_id: str
+    definition: BatteryDefinition
+    order: List[int]
+    session_ids: List[str]
+    # The client runs block delivery: hand-offs carry a trial block when the engine has one
+    blocks: bool = False
+
+    def task_at(self, position: int) -> BatteryTask:
+        return self.definition.tasks[self.order[position]]
+
+    def position_of(self, session_id: str) -> int:
+        return self.session_ids.index(session_id)
+
+    def next_session(self, session_id: str) -> Optional[str]:
+        """Session that follows `session_id`, or None when it was the last task."""
+        position = self.position_of(session_id) + 1
+        return self.session_ids[position] if position < len(self.session_ids) else None
+
+    def schedule(self) -> List[Dict[str, Any]]:
+        """Client-facing task list in run order."""
+        return [
+            {"position": position, "experiment_type": self.task_at(position).experiment_type,
+             "session_id": session_id}
+            for position, session_id in enumerate(self.session_ids)
+        ]
+
+
+def plan_battery(definition: BatteryDefinition, subject_id: str, participant_index: int,
+                 rng: Optional[random.Random] = None) -> BatteryPlan:
+    """Fix the order and allocate one session id per task."""
+    stamp = int(time.time() * 1000)
+    order = task_order(definition, participant_index, rng)
+    session_ids = [
+        f'{definition.tasks[i].experiment_type}-{stamp}-{uuid.uuid4().hex[:8]}'
+        for i in order
+    ]
+    return BatteryPlan(
+        battery_id=f'battery-{stamp}-{uuid.uuid4().hex[:8]}',
+        subject_id=subject_id,
+        definition=definition,
+        order=order,
+        session_ids=session_ids
+    )
@@ -0,0 +1,217 @@
+"""
+FILE: backend/blob_store.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Content-addressed storage for uploaded GUI snapshots, with
+                  downscaled thumbnails generated in the background so
+                  experimenter pages can list previews without reading the
+                  full images.
+
+METHOD: Hash while streaming, dedup by SHA-256, sharded layout
+    - put(): the upload stream is copied in 64 KiB chunks into a temporary
+      file while its SHA-256 is computed, so memory use is flat whatever
+      the file size. New content is fsynced and renamed into place
+      atomically; if the digest is already stored the temporary file is
+      dropped (a repeated upload costs one hash: no fsync, no new file)
+    - Layout: <root>/ab/cd/abcd...  (first two bytes of the digest as two
+      directory levels, so no directory grows past ~65k entries);
+      thumbnails: <root>/thumbs/ab/cd/abcd....png
+    - Content type is sniffed from the first bytes (PNG, JPEG, GIF, WebP,
+      BMP); only images get thumbnails
+    - ThumbnailPool: thumbnails are made in a process pool (decode + resize
+      is CPU-bound) after the upload has returned; a thumbnail that
+      already exists is never regenerated. The app starts the pool (forking
+      its workers) in create_app() and shuts it down at exit, so workers
+      are never forked from a request thread Requires Pillow (optional
+      dependency, imported only in the worker processes) - without it
+      previews fall back to the original file
+    - Blobs are immutable, so routes serving them can be cached forever
+
+TABLES (created in app_FIXED.init_db):
+    snapshot_blobs(sha256, size_bytes, content_type, created_at)
+    gui_snapshots.blob_sha256 -> snapshot_blobs.sha256
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import BinaryIO, Optional
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# Thumbnails are optional; Pillow is looked up here and imported by the workers
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+CHUNK_BYTES = 64 * 1024
+THUMBNAIL_PX = 320
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+class BlobTooLarge(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    sha256: str
+    size_bytes: int
+    content_type: str
+    created: bool  # False when the content was already stored
+
+
+def sniff_content_type(head: bytes) -> str:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return "application/octet-stream"
+
+
+def is_digest(value: str) -> bool:
+    return bool(_DIGEST.match(value or ""))
+
+
+class BlobStore:
+    """Immutable files addressed by their SHA-256 under one root directory."""
+
+    def __init__(self, root: os.PathLike):
+        self.root = Path(root).absolute()
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def thumbnail_path(self, digest: str) -> Path:
+        return self.root / "thumbs" / digest[:2] / digest[2:4] / f"{digest}.png"
+
+    def put(self, stream: BinaryIO, max_bytes: Optional[int] = None) -> StoredBlob:
+        """Store a stream, hashing while writing; raises BlobTooLarge past max_bytes."""
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        fd, tmp_name = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise BlobTooLarge(f"Upload larger than {max_bytes} bytes")
+                    digest.update(chunk)
+                    out.write(chunk)
+                sha256 = digest.hexdigest()
+                final = self.path(sha256)
+                created = not final.exists()
+                if created:
+                    # Only new content pays for the fsync
+                    out.flush()
+                    os.fsync(out.fileno())
+            if created:
+                final.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_name, final)
+                tmp_name = None
+            return StoredBlob(sha256, size, sniff_content_type(head), created)
+        finally:
+            if tmp_name is not None:
+                os.unlink(tmp_name)
+
+
+def make_thumbnail(source: str, target: str, max_px: int = THUMBNAIL_PX) -> bool:
+    """Write a PNG thumbnail of an image (worker process entry point) -> made?"""
+    if not PIL_AVAILABLE or os.path.exists(target):
+        return False
+    from PIL import Image
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with Image.open(source) as image:
+        image.thumbnail((max_px, max_px))
+        if image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+            image = image.convert("RGBA")
+        fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".png")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                image.save(out, format="PNG", optimize=True)
+            os.replace(tmp_name, target)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+    return True
+
+
+class ThumbnailPool:
+    """Background thumbnail generation for one BlobStore."""
+
+    def __init__(self, store: BlobStore, workers: int = 2, max_px: int = THUMBNAIL_PX):
+        self.store = store
+        self.workers = workers
+        self.max_px = max_px
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return PIL_AVAILABLE
+
+    def start(self) -> None:
+        """Create the pool and fork its workers now (no-op without Pillow or when running)."""
+        if not self.available:
+            return
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                # A fork-context pool forks every worker on its first task
+                self._pool.submit(int)
+
+    def submit(self, digest: str, content_type: str) -> Optional[Future]:
+        """Queue a thumbnail unless it exists, is queued, or cannot be made."""
+        if not self.available or not content_type.startswith("image/"):
+            return None
+        target = self.store.thumbnail_path(digest)
+        if target.exists():
+            return None
+        with self._lock:
+            if digest in self._pending:
+                return self._pending[digest]
+            if self._pool is None:
+                return None  # not started, or shut down
+            future = self._pool.submit(make_thumbnail, str(self.store.path(digest)), str(target), self.max_px)
+            self._pending[digest] = future
+        future.add_done_callback(lambda f: self._done(digest, f))
+        return future
+
+    def _done(self, digest: str, future: Future) -> None:
+        with self._lock:
+            self._pending.pop(digest, None)
+        if future.exception() is not None:
+            logger.warning(f"Thumbnail for {digest[:12]} failed: {future.exception()}")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
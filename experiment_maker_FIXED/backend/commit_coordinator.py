@@ -0,0 +1,225 @@
+"""
+FILE: backend/commit_coordinator.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Central commit coordinator for trial and response rows in
+                  the SQLite trial store. Decides when rows written by the
+                  hot path become durable, so experimenters can trade a
+                  bounded loss window for write throughput.
+
+METHOD: One durability level per deployment (Config.DURABILITY)
+    - "trial"   (default): rows are written in the request's own
+                transaction; every response is durable before the reply
+                (one commit + fsync per request). Loss window: none
+    - "group":  rows are queued and a writer thread commits everything
+                queued every interval_ms in one transaction (one fsync per
+                interval, whatever the trial rate). Loss window: the last
+                interval_ms on a crash
+    - "session": rows are buffered in memory per session and written in
+                the session's completion transaction. Loss window: every
+                unfinished session; best for short, fast-paced tasks.
+                Buffers of abandoned sessions are dropped with
+                discard_session() (the app's idle-session eviction);
+                stop() logs how many buffered rows are lost
+    - flush_session() is called when a session completes, before QC flags,
+      results and completed_at are written, so a completed session is
+      always complete in SQLite under every level
+    - A failed group commit keeps its rows queued and is retried on the
+      next interval
+
+USAGE:
+    python -m backend.commit_coordinator   # throughput of each level
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .event_log import insert_sql
+
+logger = logging.getLogger(__name__)
+
+
+DURABILITY_LEVELS = ("trial", "group", "session")
+
+# (table, rows) in write order
+Pending = List[Tuple[str, List[tuple]]]
+
+
+class CommitCoordinator:
+    """Applies one durability level to every trial/response write."""
+
+    def __init__(self, db_path: os.PathLike, level: str = "trial", interval_ms: float = 50.0):
+        if level not in DURABILITY_LEVELS:
+            raise ValueError(f"Durability must be one of {', '.join(DURABILITY_LEVELS)}")
+        self.db_path = db_path
+        self.level = level
+        self.interval_s = interval_ms / 1000.0
+        self._lock = threading.Lock()          # guards the buffers
+        self._commit_lock = threading.Lock()   # one group commit at a time
+        self._queue: Pending = []
+        self._sessions: Dict[str, Pending] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self.commits = 0
+
+    @property
+    def deferred(self) -> bool:
+        """True when writes do not need the request's connection."""
+        return self.level != "trial"
+
+    def write(self, conn: Optional[sqlite3.Connection], table: str, rows: List[tuple],
+              session_id: str) -> None:
+        """Store rows at the configured level (conn: the request transaction, "trial" only)."""
+        if self.level == "trial":
+            conn.executemany(insert_sql(table), rows)
+            return
+        with self._lock:
+            if self.level == "group":
+                self._queue.append((table, list(rows)))
+            else:
+                self._sessions.setdefault(session_id, []).append((table, list(rows)))
+
+    def flush_session(self, conn: sqlite3.Connection, session_id: str) -> None:
+        """Make a completing session's rows part of (or committed before) `conn`'s transaction."""
+        if self.level == "group":
+            self.flush()
+        elif self.level == "session":
+            with self._lock:
+                pending = self._sessions.pop(session_id, [])
+            _insert(conn, pending)
+
+    def discard_session(self, session_id: str) -> int:
+        """Drop the buffered rows of an abandoned session -> rows dropped."""
+        with self._lock:
+            return sum(len(rows) for _, rows in self._sessions.pop(session_id, []))
+
+    def buffered_sessions(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def backlog(self) -> int:
+        """Rows queued for the next group commit (0 at the other levels)."""
+        with self._lock:
+            return sum(len(rows) for _, rows in self._queue)
+
+    # -- group commit --------------------------------------------------
+
+    def flush(self) -> None:
+        """Commit everything queued so far (group level)."""
+        with self._commit_lock:
+            with self._lock:
+                pending, self._queue = self._queue, []
+            if not pending:
+                return
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_path, timeout=10.0, check_same_thread=False)
+            try:
+                with self._conn:
+                    _insert(self._conn, pending)
+            except sqlite3.Error:
+                with self._lock:
+                    self._queue[:0] = pending
+                raise
+            self.commits += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Group commit failed, retrying next interval: {e}")
+
+    def start(self) -> None:
+        if self.level == "group" and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the writer and commit what is queued (session buffers are lost, and logged)."""
+        with self._lock:
+            sessions = len(self._sessions)
+            rows = sum(len(r) for pending in self._sessions.values() for _, r in pending)
+        if rows:
+            logger.warning(f"Stopping with {rows} buffered rows of {sessions} unfinished sessions unwritten")
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.level == "group":
+            self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _insert(conn: sqlite3.Connection, pending: Pending) -> None:
+    by_table: Dict[str, List[tuple]] = {}
+    for table, rows in pending:
+        by_table.setdefault(table, []).extend(rows)
+    for table, rows in by_table.items():
+        conn.executemany(insert_sql(table), rows)
+
+
+def _bench(db_path: str, participants: int = 50, trials: int = 40, interval_ms: float = 20.0) -> None:
+    """Concurrent participants recording responses under each durability level."""
+    import datetime
+    from concurrent.futures import ThreadPoolExecutor
+    from .event_log import TABLE_COLUMNS
+
+    def row(sid, t):
+        return (sid, t, "space", 412.5, 1, '{"correct":true}', datetime.datetime.utcnow().isoformat(), 0)
+
+    print(f"{participants} participants x {trials} responses, SQLite, one connection per request")
+    print(f"{'level':<10} {'responses/s':>12} {'commits':>8}  loss window on crash")
+    windows = {"trial": "none", "group": f"last {interval_ms:g} ms", "session": "unfinished sessions"}
+    for level in DURABILITY_LEVELS:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute(f"CREATE TABLE responses ({', '.join(TABLE_COLUMNS['responses'])})")
+        conn.close()
+        coordinator = CommitCoordinator(db_path, level, interval_ms)
+        coordinator.start()
+
+        def participant(p):
+            sid = f"bench-{p}"
+            for t in range(trials):
+                if coordinator.deferred:
+                    coordinator.write(None, "responses", [row(sid, t)], sid)
+                    continue
+                conn = sqlite3.connect(db_path, timeout=30.0)
+                with conn:
+                    coordinator.write(conn, "responses", [row(sid, t)], sid)
+                conn.close()
+            if level == "session":
+                conn = sqlite3.connect(db_path, timeout=30.0)
+                with conn:
+                    coordinator.flush_session(conn, sid)
+                conn.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=participants) as pool:
+            list(pool.map(participant, range(participants)))
+        coordinator.stop()
+        elapsed = time.perf_counter() - started
+        conn = sqlite3.connect(db_path)
+        stored = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        conn.close()
+        assert stored == participants * trials, (level, stored)
+        commits = {"trial": stored, "group": coordinator.commits, "session": participants}[level]
+        print(f"{level:<10} {stored / elapsed:>12.0f} {commits:>8}  {windows[level]}")
+
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        _bench(os.path.join(tmp, "bench.db"))
@@ -0,0 +1,183 @@
+"""
+FILE: backend/counterbalance.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Counterbalancing allocator. Assigns each new participant
+                  of a study to a condition (config variant or battery
+                  order) so conditions stay balanced, even when many
+                  participants start at once across several app workers.
+
+METHOD: Per-study sequence counter in SQLite
+    - allocate(): one UPSERT bumps the study's allocation count; the
+      statement takes SQLite's write lock, so the read-increment is atomic
+      across threads and gunicorn worker processes, and the following
+      SELECT in the same transaction sees exactly this allocation.
+      condition = sequence % n_conditions (round robin), O(1) per start
+    - Allocation happens in the caller's transaction: if the session
+      insert fails the allocation rolls back with it
+    - Per-condition assigned / completed counters and one assignment row
+      per unit (session or battery) back the imbalance report; completed
+      counts expose drop-out imbalance that round robin cannot prevent
+
+CONFIGURATION:
+    Session config: "counterbalance": {"study": "<name>", "conditions":
+    [{...config overrides...}, ...]}. The chosen overrides are merged into
+    the config and the assignment is recorded under counterbalance.assigned.
+
+TABLES (created in app_FIXED.init_db):
+    counterbalance_studies(study, n_conditions, allocated)
+    counterbalance_counts(study, condition, assigned, completed)
+    counterbalance_assignments(unit_id, study, condition, sequence,
+                               assigned_at, completed_at)
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, asdict
+import datetime
+import sqlite3
+
+
+# Longest accepted study name
+MAX_STUDY_LENGTH = 100
+
+
+@dataclass(frozen=True)
+class Allocation:
+    """Condition assigned to one participant of a study."""
+    study: str
+    sequence: int
+    condition: int
+    n_conditions: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def allocate(conn: sqlite3.Connection, study: str, n_conditions: int,
+             unit_id: Optional[str] = None) -> Allocation:
+    """
+    Assign the next condition of `study`. Call inside the transaction that
+    creates the session / battery so both commit or roll back together.
+    Raises ValueError if the study was set up with a different number of
+    conditions.
+    """
+    if not study or len(study) > MAX_STUDY_LENGTH:
+        raise ValueError("Counterbalancing study name is missing or too long")
+    if n_conditions < 1:
+        raise ValueError("Counterbalancing needs at least one condition")
+
+    conn.execute('''
+        INSERT INTO counterbalance_studies (study, n_conditions, allocated)
+        VALUES (?, ?, 1)
+        ON CONFLICT(study) DO UPDATE SET allocated = allocated + 1
+    ''', (study, n_conditions))
+    stored_conditions, allocated = conn.execute(
+        'SELECT n_conditions, allocated FROM counterbalance_studies WHERE study = ?', (study,)
+    ).fetchone()
+    if stored_conditions != n_conditions:
+        raise ValueError(f"Study {study} has {stored_conditions} conditions, not {n_conditions}")
+
+    sequence = allocated - 1
+    allocation = Allocation(study, sequence, sequence % n_conditions, n_conditions)
+    conn.execute('''
+        INSERT INTO counterbalance_counts (study, condition, assigned, completed)
+        VALUES (?, ?, 1, 0)
+        ON CONFLICT(study, condition) DO UPDATE SET assigned = assigned + 1
+    ''', (study, allocation.condition))
+    if unit_id is not None:
+        record_assignment(conn, unit_id, allocation)
+    return allocation
+
+
+def record_assignment(conn: sqlite3.Connection, unit_id: str, allocation: Allocation) -> None:
+    """Remember which unit (session or battery id) got the allocation, for completion counts."""
+    conn.execute('''
+        INSERT INTO counterbalance_assignments
+        (unit_id, study, condition, sequence, assigned_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (unit_id, allocation.study, allocation.condition, allocation.sequence,
+          datetime.datetime.utcnow().isoformat()))
+
+
+def apply(conn: sqlite3.Connection, unit_id: str, config: Dict[str, Any]) -> Optional[Allocation]:
+    """
+    Counterbalance a session config in place if it asks for it: allocate a
+    condition, merge its overrides and record the assignment. Returns None
+    for configs without a "counterbalance" block; raises ValueError on a
+    malformed one.
+    """
+    spec = config.get("counterbalance")
+    if not spec:
+        return None
+    if not isinstance(spec, dict) or not isinstance(spec.get("conditions"), list):
+        raise ValueError("counterbalance must be {\"study\": ..., \"conditions\": [...]}")
+    conditions = spec["conditions"]
+    if not all(isinstance(c, dict) for c in conditions):
+        raise ValueError("Each counterbalancing condition must be an object of config overrides")
+
+    allocation = allocate(conn, str(spec.get("study") or ""), len(conditions), unit_id)
+    config.update(conditions[allocation.condition])
+    config["counterbalance"] = {**spec, "assigned": allocation.to_dict()}
+    return allocation
+
+
+def mark_completed(conn: sqlite3.Connection, unit_id: str) -> bool:
+    """Count a finished unit towards its condition (once). Returns False if it had no assignment."""
+    now = datetime.datetime.utcnow().isoformat()
+    updated = conn.execute('''
+        UPDATE counterbalance_assignments SET completed_at = ?
+        WHERE unit_id = ? AND completed_at IS NULL
+    ''', (now, unit_id)).rowcount
+    if not updated:
+        return False
+    conn.execute('''
+        UPDATE counterbalance_counts SET completed = completed + 1
+        WHERE (study, condition) = (
+            SELECT study, condition FROM counterbalance_assignments WHERE unit_id = ?
+        )
+    ''', (unit_id,))
+    return True
+
+
+def imbalance(conn: sqlite3.Connection, study: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Balance report per study: counts per condition, the spread (max - min)
+    of assigned and completed counts, and the chi-square statistic of the
+    completed counts against an even split (df = n_conditions - 1).
+    """
+    filters = "WHERE s.study = ?" if study else ""
+    rows = conn.execute(f'''
+        SELECT s.study, s.n_conditions, s.allocated, c.condition,
+               COALESCE(c.assigned, 0), COALESCE(c.completed, 0)
+        FROM counterbalance_studies s
+        LEFT JOIN counterbalance_counts c ON c.study = s.study
+        {filters}
+        ORDER BY s.study, c.condition
+    ''', (study,) if study else ()).fetchall()
+
+    report: Dict[str, Dict[str, Any]] = {}
+    for name, n_conditions, allocated, condition, assigned, completed in rows:
+        entry = report.setdefault(name, {
+            "study": name,
+            "n_conditions": n_conditions,
+            "allocated": allocated,
+            "assigned": [0] * n_conditions,
+            "completed": [0] * n_conditions,
+        })
+        if condition is not None and condition < n_conditions:
+            entry["assigned"][condition] = assigned
+            entry["completed"][condition] = completed
+
+    for entry in report.values():
+        completed = entry["completed"]
+        total = sum(completed)
+        expected = total / len(completed) if completed else 0
+        entry["assigned_spread"] = max(entry["assigned"]) - min(entry["assigned"]) if entry["assigned"] else 0
+        entry["completed_spread"] = max(completed) - min(completed) if completed else 0
+        entry["completed_chi_square"] = (
+            round(sum((c - expected) ** 2 / expected for c in completed), 3) if expected else 0.0
+        )
+    return list(report.values())
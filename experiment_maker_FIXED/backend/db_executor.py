@@ -0,0 +1,89 @@
+"""
+FILE: backend/db_executor.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Dedicated executor for SQLite work in the async (ASGI)
+                  serving mode. Keeps blocking database calls off the event
+                  loop so one process can serve many participants at once.
+
+METHOD: Thread pool with one persistent connection per thread
+    - Default is a single thread: SQLite allows one writer at a time, so a
+      single writer thread with its own connection serialises writes
+      without lock contention and in submission order (a trial row is
+      always written before the responses submitted after it)
+    - Connections are opened once per thread (no connect per request) with
+      foreign keys on, like app_FIXED.get_db()
+    - run(fn, *args): fn(conn, *args) in one transaction (commit on success,
+      rollback on error); call(fn, *args): any blocking callable on a DB
+      thread (e.g. helpers that open their own connection)
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+
+
+class DatabaseExecutor:
+    """Run SQLite work on dedicated threads and await it from async code."""
+
+    def __init__(self, db_path: os.PathLike, workers: int = 1, timeout: float = 10.0):
+        self.db_path = db_path
+        self.workers = workers
+        self.timeout = timeout
+        self._local = threading.local()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def start(self) -> None:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sqlite")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA foreign_keys = ON')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _transaction(self, fn: Callable[..., Any], *args: Any) -> Any:
+        conn = self._connection()
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except BaseException:
+            conn.rollback()
+            raise
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Await fn(conn, *args), executed in one transaction on a DB thread."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(self._transaction, fn, *args))
+
+    async def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Await a blocking callable on a DB thread (it manages its own connection)."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args))
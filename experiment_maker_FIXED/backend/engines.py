@@ -0,0 +1,72 @@
+"""
+FILE: backend/engines.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Registry of server-side experiment engines, shared by the
+                  Flask app and offline tools (replay) so they never have to
+                  import the web application.
+
+METHOD: Engines are registered by import path and loaded on first use, so
+        importing the registry (and the app) does not import every engine
+        and its dependencies (numpy, adaptive tables).
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, Union
+import importlib
+import threading
+
+
+class EngineRegistry(MutableMapping):
+    """experiment_type -> engine factory; values may be "module:attribute" paths resolved lazily."""
+
+    def __init__(self, engines: Dict[str, Union[str, Callable[..., Any]]]):
+        self._engines = dict(engines)
+        self._lock = threading.Lock()
+
+    def __getitem__(self, exp_type: str) -> Callable[..., Any]:
+        engine = self._engines[exp_type]
+        if isinstance(engine, str):
+            module, _, attr = engine.partition(":")
+            engine = getattr(importlib.import_module(module, __package__), attr)
+            with self._lock:
+                self._engines[exp_type] = engine
+        return engine
+
+    def __setitem__(self, exp_type: str, engine: Union[str, Callable[..., Any]]) -> None:
+        with self._lock:
+            self._engines[exp_type] = engine
+
+    def __delitem__(self, exp_type: str) -> None:
+        with self._lock:
+            del self._engines[exp_type]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._engines))
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+    def __contains__(self, exp_type: object) -> bool:
+        return exp_type in self._engines
+
+
+# Experiment engines - experiment_type -> BaseExperiment factory(experiment_id, config)
+# New client-run paradigms can register functools.partial(ClientDrivenExperiment, ...)
+EXPERIMENT_ENGINES = EngineRegistry({
+    'stroop': '.experiments.stroop:StroopExperiment',
+    'digit_span': '.experiments.digit_span:DigitSpanExperiment',
+    'sart': '.experiments.sart:SARTExperiment',
+    'antisaccade': '.experiments.antisaccade:AntisaccadeExperiment',
+    'corsi': '.experiments.corsi:CorsiExperiment',
+    'butterfly_simon': '.experiments.butterfly_simon:ButterflySimonExperiment',
+    'bart': '.experiments.bart:BARTExperiment',
+})
+
+
+def create_experiment(exp_type, experiment_id, config):
+    """Instantiate and configure the engine registered for exp_type"""
+    return EXPERIMENT_ENGINES[exp_type](experiment_id, config)
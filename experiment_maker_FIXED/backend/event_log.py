@@ -0,0 +1,551 @@
+"""
+FILE: backend/event_log.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Append-only event log as the primary store for trial and
+                  response rows (TRIAL_STORE=log). The hot path appends to
+                  a segment file and never touches SQLite; a background
+                  compactor loads the log into the trials/responses tables
+                  for querying.
+
+METHOD: Checksummed segments, group fsync, incremental compaction
+    - Writers: every process appending to a directory (e.g. each gunicorn
+      worker) is a writer with its own series of segments and its own
+      checkpoint; the writer id defaults to the pid. A writer holds an
+      exclusive flock on <EVENT_LOG_DIR>/.lock-<writer> while its log is
+      open, so no two processes ever append to, recover or compact the
+      same series
+    - Segments: <EVENT_LOG_DIR>/<writer>-YYYYMMDD-NNNNNN.seg, numbered per
+      UTC day, rolled early past segment_bytes. Names of one series sort
+      chronologically (segments named YYYYMMDD-NNNNNN.seg, from before
+      writer series, form the series of writer "")
+    - Every append is one frame: payload length u32 | CRC-32 u32 | payload
+      (compact JSON {"t": table, "rows": [[...], ...]}, rows in the column
+      order of TABLE_COLUMNS). A served block or response batch is one frame
+    - Group fsync: append() returns once its frame is on disk. Whoever finds
+      no fsync running becomes the leader and syncs everything written so
+      far; appends that arrive meanwhile wait for the next sync, so under
+      load one fsync covers many participants
+    - Crash recovery: on open, the newest segment of the writer's series
+      is scanned and a torn or corrupt tail (partial frame, bad checksum)
+      is truncated; every frame before it was acknowledged only after its
+      fsync
+    - Compactor: loads frames of its writer's series from that series'
+      checkpoint (segment, offset) up to the durable end, inserting rows
+      and advancing the checkpoint in one transaction, so each frame is
+      loaded exactly once even across crashes. Runs every interval_s on a
+      daemon thread and on demand (session completion compacts first, so
+      finished sessions are always complete in SQLite for QC, exports and
+      analytics). The periodic run also loads the series of writers that
+      have exited (their lock is free), up to their last valid frame
+    - Replay: session_rows() reads a session back from the log alone;
+      `python -m backend.event_log replay` rescores it with the replay
+      module's engines, without the trials/responses tables
+
+TABLES (created in app_FIXED.init_db):
+    event_log_checkpoint(log_dir, segment, offset, frames, updated_at)
+        one row per series: log_dir is "<resolved dir>#<writer>"
+        (the bare directory for the series of writer "")
+
+USAGE:
+    python -m backend.event_log verify  --dir database/event_log
+    python -m backend.event_log compact --dir database/event_log --db database/app.db
+    python -m backend.event_log replay  --dir database/event_log --db database/app.db SESSION_ID
+    python -m backend.event_log bench   # append throughput vs SQLite commits
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from pathlib import Path
+import argparse
+import datetime
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+TABLE_COLUMNS = {
+    "trials": ("session_id", "trial_number", "is_practice", "stimulus_json",
+               "correct_response", "metadata_json", "presented_at"),
+    "responses": ("session_id", "trial_number", "response_value", "response_time_ms",
+                  "correct", "feedback", "recorded_at", "qc_flags"),
+}
+
+SEGMENT_SUFFIX = ".seg"
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+_FRAME = struct.Struct("<II")
+
+# (segment name, byte offset) - a position in the log
+Position = Tuple[str, int]
+
+
+def insert_sql(table: str) -> str:
+    columns = TABLE_COLUMNS[table]
+    return (f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})")
+
+
+def encode_frame(table: str, rows: List[tuple]) -> bytes:
+    payload = json.dumps({"t": table, "rows": rows}, separators=(",", ":")).encode("utf-8")
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(path: Path, start: int = 0,
+                end: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield (end offset, event) for the valid frames of a segment from `start`.
+    Stops quietly at the first incomplete or corrupt frame.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read() if end is None else f.read(max(0, end - start))
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, checksum = _FRAME.unpack_from(data, offset)
+        body = data[offset + _FRAME.size:offset + _FRAME.size + length]
+        if length > MAX_FRAME_BYTES or len(body) < length or zlib.crc32(body) != checksum:
+            return
+        offset += _FRAME.size + length
+        yield start + offset, json.loads(body)
+
+
+def valid_length(path: Path) -> int:
+    """Bytes of a segment up to the end of its last valid frame."""
+    end = 0
+    for end, _ in read_frames(path):
+        pass
+    return end
+
+
+def segments(directory: Path) -> List[Path]:
+    return sorted(Path(directory).glob(f"*{SEGMENT_SUFFIX}"))
+
+
+def writer_of(path: Path) -> str:
+    """Writer id of a segment ("" for segments from before writer series)."""
+    parts = path.stem.rsplit("-", 2)
+    return parts[0] if len(parts) == 3 else ""
+
+
+def series(directory: os.PathLike) -> Dict[str, List[Path]]:
+    """writer -> its segments, oldest first."""
+    by_writer: Dict[str, List[Path]] = {}
+    for path in segments(directory):
+        by_writer.setdefault(writer_of(path), []).append(path)
+    return by_writer
+
+
+def lock_series(directory: os.PathLike, writer: str) -> Optional[int]:
+    """Exclusive lock of a writer's series -> lock fd, or None while another holder has it."""
+    fd = os.open(Path(directory) / f".lock-{writer}", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def unlock_series(fd: int) -> None:
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+class EventLog:
+    """Append-only, group-fsynced segment series of one writer in a directory."""
+
+    def __init__(self, directory: os.PathLike, segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+                 writer: Optional[str] = None, lock_wait_s: float = 10.0):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.writer = writer if writer is not None else f"w{os.getpid()}"
+        if not self.writer or not self.writer.replace("_", "").isalnum():
+            raise ValueError(f"Event log writer id must be letters, digits or _: {self.writer!r}")
+        self.lock_wait_s = lock_wait_s
+        self._lock_fd: Optional[int] = None
+        self._lock()
+        self._cond = threading.Condition()
+        self._fd: Optional[int] = None
+        self._segment: Optional[str] = None
+        self._day = ""
+        self._index = 0
+        self._offset = 0
+        self._written = 0   # frames written
+        self._synced = 0    # frames known to be on disk
+        self._syncing = False
+        self._durable: Optional[Position] = None
+        self.fsyncs = 0
+
+    # -- writing -------------------------------------------------------
+
+    def _lock(self) -> None:
+        """
+        Own this writer's series until close(). Waits up to lock_wait_s, as
+        another process may be loading a series left under a reused pid.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        deadline = time.monotonic() + self.lock_wait_s
+        while (fd := lock_series(self.directory, self.writer)) is None:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Event log writer {self.writer} is already open in {self.directory}")
+            time.sleep(0.05)
+        self._lock_fd = fd
+
+    def _recover(self) -> None:
+        """Continue after the newest segment of this writer's series, dropping a torn tail."""
+        if self._lock_fd is None:
+            self._lock()
+        existing = series(self.directory).get(self.writer)
+        if not existing:
+            return
+        last = existing[-1]
+        _, self._day, index = last.stem.rsplit("-", 2)
+        self._index = int(index)
+        size, valid = last.stat().st_size, valid_length(last)
+        if valid < size:
+            logger.warning(f"Event log {last.name}: dropped {size - valid} bytes of torn tail")
+            with open(last, "r+b") as f:
+                f.truncate(valid)
+                os.fsync(f.fileno())
+
+    def _open(self, day: str) -> None:
+        """Roll to the next segment (caller holds the lock, no fsync running)."""
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self.fsyncs += 1
+        self._index = self._index + 1 if day == self._day else 1
+        self._day = day
+        self._segment = f"{self.writer}-{day}-{self._index:06d}{SEGMENT_SUFFIX}"
+        path = self.directory / self._segment
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._offset = os.fstat(self._fd).st_size
+        self._synced = self._written
+        self._durable = (self._segment, self._offset)
+        # Make the new file's directory entry durable too
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def append(self, table: str, rows: List[tuple]) -> Position:
+        """Write one frame and return once it is on disk -> its end position."""
+        if table not in TABLE_COLUMNS:
+            raise ValueError(f"Unknown event table: {table}")
+        frame = encode_frame(table, [list(row) for row in rows])
+        day = datetime.datetime.utcnow().strftime("%Y%m%d")
+        with self._cond:
+            if self._fd is None:
+                self._recover()
+            if self._fd is None or day != self._day or self._offset >= self.segment_bytes:
+                while self._syncing:
+                    self._cond.wait()
+                self._open(day)
+            os.write(self._fd, frame)
+            self._offset += len(frame)
+            self._written += 1
+            ticket, position = self._written, (self._segment, self._offset)
+
+            while self._synced < ticket:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                # Leader: one fsync for every frame written so far
+                self._syncing = True
+                target, durable, fd = self._written, (self._segment, self._offset), self._fd
+                self._cond.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+                self.fsyncs += 1
+                if target > self._synced:
+                    self._synced, self._durable = target, durable
+        return position
+
+    def durable_position(self) -> Optional[Position]:
+        """End of the data known to be on disk (None before the first append)."""
+        with self._cond:
+            return self._durable
+
+    def close(self) -> None:
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+            if self._fd is not None:
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._fd = None
+                self._synced = self._written
+            if self._lock_fd is not None:
+                unlock_series(self._lock_fd)
+                self._lock_fd = None
+
+
+# -- compaction --------------------------------------------------------
+
+def _checkpoint(conn: sqlite3.Connection, log_dir: str) -> Position:
+    row = conn.execute(
+        'SELECT segment, offset FROM event_log_checkpoint WHERE log_dir = ?', (log_dir,)
+    ).fetchone()
+    return (row[0], row[1]) if row else ("", 0)
+
+
+def compact(conn: sqlite3.Connection, directory: os.PathLike,
+            until: Optional[Position] = None, max_frames: int = 5000, writer: str = "") -> int:
+    """
+    Load frames of one writer's series after its checkpoint into SQLite ->
+    frames loaded. The caller must be that writer or hold its series lock.
+    `until` bounds the scan (the writer's durable position); without it,
+    every valid frame of every segment of the series is loaded. Each
+    transaction holds at most max_frames frames plus its checkpoint.
+    """
+    directory = Path(directory)
+    log_dir = str(directory.resolve()) + (f"#{writer}" if writer else "")
+    segment, offset = _checkpoint(conn, log_dir)
+    loaded = 0
+    for path in series(directory).get(writer, []):
+        if path.name < segment or (until is not None and path.name > until[0]):
+            continue
+        start = offset if path.name == segment else 0
+        end = until[1] if until is not None and path.name == until[0] else None
+        batch: Dict[str, List[list]] = {table: [] for table in TABLE_COLUMNS}
+        frames = 0
+        position = start
+
+        def flush() -> None:
+            with conn:
+                for table, rows in batch.items():
+                    if rows:
+                        conn.executemany(insert_sql(table), rows)
+                        rows.clear()
+                conn.execute('''
+                    INSERT INTO event_log_checkpoint (log_dir, segment, offset, frames, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(log_dir) DO UPDATE SET
+                        segment = excluded.segment, offset = excluded.offset,
+                        frames = frames + excluded.frames, updated_at = excluded.updated_at
+                ''', (log_dir, path.name, position, frames, datetime.datetime.utcnow().isoformat()))
+
+        for position, event in read_frames(path, start, end):
+            batch[event["t"]].extend(event["rows"])
+            frames += 1
+            if frames >= max_frames:
+                flush()
+                loaded += frames
+                frames = 0
+        if frames or path.name != segment:
+            flush()
+            loaded += frames
+    return loaded
+
+
+def compact_exited(conn: sqlite3.Connection, directory: os.PathLike, skip: Tuple[str, ...] = ()) -> int:
+    """Load the series of every writer whose lock is free (it has exited) -> frames loaded."""
+    loaded = 0
+    for writer in series(directory):
+        if writer in skip:
+            continue
+        fd = lock_series(directory, writer)
+        if fd is None:
+            continue  # a live writer compacts its own series
+        try:
+            loaded += compact(conn, directory, writer=writer)
+        finally:
+            unlock_series(fd)
+    return loaded
+
+
+class Compactor:
+    """Periodic compaction of one EventLog (and of exited writers' series) into SQLite on a daemon thread."""
+
+    def __init__(self, log: EventLog, db_path: os.PathLike, interval_s: float = 2.0):
+        self.log = log
+        self.db_path = db_path
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def compact(self) -> int:
+        """Load everything that is durable now (safe to call from request threads)."""
+        until = self.log.durable_position()
+        if until is None:
+            return 0
+        with self._lock:
+            conn = sqlite3.connect(self.db_path, timeout=10.0)
+            try:
+                return compact(conn, self.log.directory, until, writer=self.log.writer)
+            finally:
+                conn.close()
+
+    def compact_exited(self) -> int:
+        """Load what writers that have exited left behind."""
+        if not self.log.directory.is_dir():
+            return 0
+        with self._lock:
+            conn = sqlite3.connect(self.db_path, timeout=10.0)
+            try:
+                return compact_exited(conn, self.log.directory, skip=(self.log.writer,))
+            finally:
+                conn.close()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.compact()
+                self.compact_exited()
+            except Exception as e:
+                logger.error(f"Event log compaction failed: {e}")
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="event-log-compactor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.compact()
+
+
+# -- reading back ------------------------------------------------------
+
+def session_rows(directory: os.PathLike, session_id: str) -> Dict[str, List[list]]:
+    """Every trial and response row of one session, in log order."""
+    rows: Dict[str, List[list]] = {table: [] for table in TABLE_COLUMNS}
+    for path in segments(directory):
+        for _, event in read_frames(path):
+            rows[event["t"]].extend(row for row in event["rows"] if row[0] == session_id)
+    return rows
+
+
+def replay_rows(rows: Dict[str, List[list]]) -> List[tuple]:
+    """Log rows in the shape backend.replay reads from the responses/trials join."""
+    trials = {row[1]: row for row in rows["trials"]}
+    out = []
+    for _, trial_number, value, rt, correct, *_ in rows["responses"]:
+        trial = trials.get(trial_number)
+        out.append((trial_number, value, rt, correct,
+                    *((trial[2], trial[3], trial[4], trial[5]) if trial else (None, None, None, None))))
+    return out
+
+
+def _verify(directory: Path) -> int:
+    bad = 0
+    for path in segments(directory):
+        frames = sum(1 for _ in read_frames(path))
+        size, valid = path.stat().st_size, valid_length(path)
+        status = "ok" if valid == size else f"{size - valid} bytes after the last valid frame"
+        bad += valid != size
+        print(f"{path.name}  {frames:>8} frames  {size:>10} bytes  {status}")
+    return 1 if bad else 0
+
+
+def _replay(directory: Path, db_path: str, session_id: str) -> int:
+    from .presets import session_config
+    from .replay import replay_session
+
+    conn = sqlite3.connect(db_path, timeout=10.0)
+    try:
+        row = conn.execute('''
+            SELECT s.experiment_type, s.config_json, p.config_json
+            FROM sessions s LEFT JOIN config_presets p ON p.hash = s.preset_hash
+            WHERE s.id = ?
+        ''', (session_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        print(f"Unknown session: {session_id}")
+        return 1
+    config_json = row[1] if row[2] is None else json.dumps(session_config(row[2], row[1]))
+    rows = replay_rows(session_rows(directory, session_id))
+    print(json.dumps(replay_session((session_id, row[0], config_json, rows)), indent=2, default=str))
+    return 0
+
+
+def _bench(directory: Path, participants: int = 50, trials: int = 40) -> None:
+    """Response appends from concurrent participants: log vs one SQLite commit each."""
+    from concurrent.futures import ThreadPoolExecutor
+    directory.mkdir(parents=True, exist_ok=True)
+
+    def row(p, t):
+        return (f"bench-{p}", t, "space", 412.5, 1, '{"correct":true}',
+                datetime.datetime.utcnow().isoformat(), 0)
+
+    def run(label, write, fsyncs=None):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=participants) as pool:
+            list(pool.map(lambda p: [write(p, t) for t in range(trials)], range(participants)))
+        elapsed = time.perf_counter() - started
+        n = participants * trials
+        extra = f"  ({fsyncs()} fsyncs)" if fsyncs else ""
+        print(f"{label:<28} {n / elapsed:>10.0f} responses/s{extra}")
+
+    db_path = directory / "bench.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TABLE responses ({', '.join(TABLE_COLUMNS['responses'])})")
+    conn.close()
+
+    def sqlite_write(p, t):
+        conn = sqlite3.connect(db_path, timeout=30.0)
+        with conn:
+            conn.execute(insert_sql("responses"), row(p, t))
+        conn.close()
+
+    log = EventLog(directory / "log")
+    print(f"{participants} participants x {trials} responses, durable on return")
+    run("SQLite, commit per response", sqlite_write)
+    run("event log, group fsync", lambda p, t: log.append("responses", [row(p, t)]), lambda: log.fsyncs)
+    log.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect, compact and replay the trial event log")
+    parser.add_argument("command", choices=("verify", "compact", "replay", "bench"))
+    parser.add_argument("session_id", nargs="?", help="Session to replay")
+    parser.add_argument("--dir", default=os.path.join("database", "event_log"), help="Event log directory")
+    parser.add_argument("--db", default=os.path.join("database", "app.db"), help="Path to app.db")
+    args = parser.parse_intermixed_args(argv)
+    directory = Path(args.dir)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "verify":
+        return _verify(directory)
+    if args.command == "replay":
+        if not args.session_id:
+            parser.error("replay needs a session id")
+        return _replay(directory, args.db, args.session_id)
+    if args.command == "bench":
+        import tempfile
+        with tempfile.TemporaryDirectory(dir=directory if directory.is_dir() else None) as tmp:
+            _bench(Path(tmp))
+        return 0
+
+    conn = sqlite3.connect(args.db, timeout=10.0)
+    try:
+        print(f"Loaded {compact_exited(conn, directory)} frames (series of running writers are left to them)")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
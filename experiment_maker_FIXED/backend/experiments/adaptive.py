@@ -0,0 +1,377 @@
+"""
+FILE: backend/experiments/adaptive.py
+DIRECTORY: /backend/experiments/
+
+FUNCTIONAL ROLE: Adaptive psychophysical procedures shared by experiments.
+                  A procedure chooses the stimulus level of the next trial
+                  (span length, response deadline, stimulus pacing) from the
+                  outcomes so far and reports a threshold estimate.
+
+METHOD: Three procedures behind one interface
+    - QuestPlus: Bayesian; posterior over (threshold, slope) of a logistic
+      psychometric function. Likelihoods of both outcomes at every
+      stimulus level are precomputed as a (2, levels, parameters) NumPy
+      table, so an update is one row multiply and the next level is the
+      one that minimises the expected posterior entropy (one vectorised
+      pass over the table). Tables come from table_cache: built once per
+      (levels, grid, guess/lapse) and memory-mapped read-only by every
+      session and worker process
+    - WeightedUpDown: fixed steps, the easier step scaled by
+      target / (1 - target) so the track converges on `target` accuracy;
+      estimate = mean level at reversals
+    - PEST: Wald sequential test at each level; step halves on reversals
+      and doubles on runs, stops when the step falls below min_step
+
+    Levels are in task units. higher_is_harder says which way difficulty
+    runs (span length: True; deadline or stimulus interval in ms: False).
+    update() takes the level the trial was actually run at, so replaying
+    stored responses reproduces the estimate exactly.
+
+USAGE:
+    procedure = create_procedure("quest_plus", levels=range(3, 13))
+    level = procedure.next_level()
+    procedure.update(level, correct=True)
+    procedure.estimate(), procedure.is_finished(), procedure.summary()
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+
+REFERENCES:
+    Watson, A. B. (2017). QUEST+: A general multidimensional Bayesian adaptive
+        psychometric method. Journal of Vision, 17(3):10, 1-27.
+    Kaernbach, C. (1991). Simple adaptive testing with the weighted up-down
+        method. Perception & Psychophysics, 49(3), 227-229.
+    Taylor, M. M., & Creelman, C. D. (1967). PEST: Efficient estimates on
+        probability functions. Journal of the Acoustical Society of America,
+        41(4), 782-787.
+"""
+
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from abc import ABC, abstractmethod
+import numpy as np
+
+from . import table_cache
+
+
+# Stands in for log(0) so empty posterior cells contribute 0 * LOG_FLOOR = 0
+LOG_FLOOR = -745.0
+
+
+class AdaptiveProcedure(ABC):
+    """Common bookkeeping: allowed levels, trial history and stopping rule."""
+
+    name = ""
+
+    def __init__(self, levels: Sequence[float], higher_is_harder: bool = True,
+                 max_trials: int = 30, start: Optional[float] = None):
+        self.levels = np.unique(np.asarray(levels, dtype=np.float64))
+        if self.levels.size < 2:
+            raise ValueError("An adaptive procedure needs at least two stimulus levels")
+        self.higher_is_harder = higher_is_harder
+        self.harder = 1.0 if higher_is_harder else -1.0
+        self.spacing = float(np.median(np.diff(self.levels)))
+        self.max_trials = max_trials
+        self.start = None if start is None else self.snap(start)
+        self.history: List[Tuple[float, bool]] = []
+
+    def snap(self, level: float) -> float:
+        """Nearest allowed level."""
+        return float(self.levels[np.abs(self.levels - level).argmin()])
+
+    def next_level(self) -> float:
+        """Stimulus level for the next trial."""
+        if not self.history and self.start is not None:
+            return self.start
+        return self._next_level()
+
+    def update(self, level: float, correct: bool) -> None:
+        """Record the outcome of a trial run at `level`."""
+        level = self.snap(level)
+        self.history.append((level, bool(correct)))
+        self._update(level, bool(correct))
+
+    def is_finished(self) -> bool:
+        return len(self.history) >= self.max_trials
+
+    @property
+    def n_trials(self) -> int:
+        return len(self.history)
+
+    @abstractmethod
+    def _next_level(self) -> float:
+        pass
+
+    @abstractmethod
+    def _update(self, level: float, correct: bool) -> None:
+        pass
+
+    @abstractmethod
+    def estimate(self) -> float:
+        """Current threshold estimate in level units."""
+        pass
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-safe state for get_results()."""
+        return {
+            "procedure": self.name,
+            "estimate": round(self.estimate(), 3),
+            "trials": self.n_trials,
+            "history": [[level, correct] for level, correct in self.history]
+        }
+
+
+# ============================================================================
+# QUEST+
+# ============================================================================
+
+def psychometric(levels: np.ndarray, thresholds: np.ndarray, slopes: np.ndarray,
+                 guess_rate: float, lapse_rate: float, higher_is_harder: bool = True) -> np.ndarray:
+    """P(correct) at every (level, threshold, slope): shape (levels, thresholds, slopes)."""
+    distance = thresholds[None, :, None] - levels[:, None, None]
+    if not higher_is_harder:
+        distance = -distance
+    z = distance * slopes[None, None, :]
+    return guess_rate + (1.0 - guess_rate - lapse_rate) / (1.0 + np.exp(-z))
+
+
+def default_grids(levels: np.ndarray, spacing: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Threshold grid at quarter-level resolution and slopes from shallow to steep."""
+    thresholds = np.arange(levels[0], levels[-1] + spacing / 8, spacing / 4)
+    slopes = np.geomspace(0.5, 4.0, 5) / spacing
+    return thresholds, slopes
+
+
+def build_tables(levels: np.ndarray, thresholds: np.ndarray, slopes: np.ndarray,
+                 guess_rate: float, lapse_rate: float,
+                 higher_is_harder: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Precompute everything QuestPlus needs per parameter grid:
+      likelihood  (2, levels, params)  P(incorrect), P(correct)
+      log_likelihood                   natural log of the above
+      prior       (params,)            uniform over thresholds and slopes
+      threshold   (params,)            threshold of each flattened parameter
+    """
+    p_correct = psychometric(levels, thresholds, slopes, guess_rate, lapse_rate, higher_is_harder)
+    p_correct = np.clip(p_correct.reshape(levels.size, -1), 1e-12, 1.0 - 1e-12)
+    likelihood = np.stack([1.0 - p_correct, p_correct])
+    n_params = thresholds.size * slopes.size
+    return {
+        "likelihood": likelihood,
+        "log_likelihood": np.log(likelihood),
+        "prior": np.full(n_params, 1.0 / n_params),
+        "threshold": np.repeat(thresholds, slopes.size),
+    }
+
+
+class QuestPlus(AdaptiveProcedure):
+    """
+    QUEST+ over (threshold, slope) with fixed guess and lapse rates.
+
+    Stops at max_trials, or once at least min_trials were run and the
+    posterior SD of the threshold is below sd_stop (level units).
+    """
+
+    name = "quest_plus"
+
+    def __init__(self, levels: Sequence[float], higher_is_harder: bool = True,
+                 max_trials: int = 30, start: Optional[float] = None,
+                 guess_rate: float = 0.0, lapse_rate: float = 0.02,
+                 thresholds: Optional[Sequence[float]] = None,
+                 slopes: Optional[Sequence[float]] = None,
+                 min_trials: int = 8, sd_stop: Optional[float] = None):
+        super().__init__(levels, higher_is_harder, max_trials, start)
+        default_thresholds, default_slopes = default_grids(self.levels, self.spacing)
+        self.thresholds = default_thresholds if thresholds is None else np.asarray(thresholds, dtype=np.float64)
+        self.slopes = default_slopes if slopes is None else np.asarray(slopes, dtype=np.float64)
+        self.guess_rate = guess_rate
+        self.lapse_rate = lapse_rate
+        self.min_trials = min_trials
+        self.sd_stop = sd_stop
+
+        spec = {
+            "levels": self.levels, "thresholds": self.thresholds, "slopes": self.slopes,
+            "guess_rate": guess_rate, "lapse_rate": lapse_rate, "higher_is_harder": higher_is_harder
+        }
+        tables = table_cache.get_tables(self.name, spec, lambda: build_tables(
+            self.levels, self.thresholds, self.slopes, guess_rate, lapse_rate, higher_is_harder
+        ))
+        self.likelihood = tables["likelihood"]
+        self.log_likelihood = tables["log_likelihood"]
+        self.param_threshold = tables["threshold"]
+        self.posterior = tables["prior"].copy()
+
+    def _next_level(self) -> float:
+        # Expected entropy after each level: sum_o p(o) H(post | o) =
+        # sum_o [p(o) log p(o)] - sum_{o,params} j log j, with j = L * post
+        joint = self.likelihood * self.posterior
+        p_outcome = joint.sum(axis=2)
+        log_joint = self.log_likelihood + np.log(self.posterior, out=np.full_like(self.posterior, -np.inf),
+                                                 where=self.posterior > 0)
+        j_log_j = (joint * np.maximum(log_joint, LOG_FLOOR)).sum(axis=2)
+        expected_entropy = (p_outcome * np.log(p_outcome) - j_log_j).sum(axis=0)
+        return float(self.levels[expected_entropy.argmin()])
+
+    def _update(self, level: float, correct: bool) -> None:
+        index = int(np.searchsorted(self.levels, level))
+        self.posterior *= self.likelihood[int(correct), index]
+        self.posterior /= self.posterior.sum()
+
+    def estimate(self) -> float:
+        return float(self.posterior @ self.param_threshold)
+
+    def threshold_sd(self) -> float:
+        mean = self.estimate()
+        return float(np.sqrt(self.posterior @ (self.param_threshold - mean) ** 2))
+
+    def is_finished(self) -> bool:
+        if super().is_finished():
+            return True
+        return (self.sd_stop is not None and self.n_trials >= self.min_trials
+                and self.threshold_sd() < self.sd_stop)
+
+    def summary(self) -> Dict[str, Any]:
+        summary = super().summary()
+        summary["threshold_sd"] = round(self.threshold_sd(), 3)
+        return summary
+
+
+# ============================================================================
+# WEIGHTED UP-DOWN
+# ============================================================================
+
+class WeightedUpDown(AdaptiveProcedure):
+    """Kaernbach (1991): step_easier * (1 - target) = step_harder * target."""
+
+    name = "weighted_up_down"
+
+    def __init__(self, levels: Sequence[float], higher_is_harder: bool = True,
+                 max_trials: int = 30, start: Optional[float] = None,
+                 target: float = 0.5, step: Optional[float] = None,
+                 max_reversals: Optional[int] = 10, discard_reversals: int = 2):
+        super().__init__(levels, higher_is_harder, max_trials, start)
+        if not 0.0 < target < 1.0:
+            raise ValueError("target must be between 0 and 1")
+        self.target = target
+        self.step_harder = step if step is not None else self.spacing
+        self.step_easier = self.step_harder * target / (1.0 - target)
+        self.max_reversals = max_reversals
+        self.discard_reversals = discard_reversals
+        self.level = self.start if self.start is not None else float(self.levels[0] if higher_is_harder else self.levels[-1])
+        self.reversals: List[float] = []
+        self._direction = 0
+
+    def _next_level(self) -> float:
+        return self.snap(self.level)
+
+    def _update(self, level: float, correct: bool) -> None:
+        direction = 1 if correct else -1
+        if self._direction and direction != self._direction:
+            self.reversals.append(level)
+        self._direction = direction
+        step = self.step_harder if correct else -self.step_easier
+        self.level = float(np.clip(level + self.harder * step, self.levels[0], self.levels[-1]))
+
+    def estimate(self) -> float:
+        usable = self.reversals[self.discard_reversals:]
+        if usable:
+            return float(np.mean(usable))
+        if self.history:
+            return float(np.mean([level for level, _ in self.history]))
+        return self.level
+
+    def is_finished(self) -> bool:
+        return super().is_finished() or (
+            self.max_reversals is not None and len(self.reversals) >= self.max_reversals
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        summary = super().summary()
+        summary["reversals"] = self.reversals
+        return summary
+
+
+# ============================================================================
+# PEST
+# ============================================================================
+
+class PEST(AdaptiveProcedure):
+    """
+    Taylor & Creelman (1967). Trials stay at one level until the number
+    correct leaves target * n +/- wald; then the level moves. Steps halve on
+    a reversal and double from the third consecutive step in one direction.
+    """
+
+    name = "pest"
+
+    def __init__(self, levels: Sequence[float], higher_is_harder: bool = True,
+                 max_trials: int = 40, start: Optional[float] = None,
+                 target: float = 0.5, step: Optional[float] = None,
+                 min_step: Optional[float] = None, max_step: Optional[float] = None,
+                 wald: float = 1.0):
+        super().__init__(levels, higher_is_harder, max_trials, start)
+        self.target = target
+        self.step = step if step is not None else 4 * self.spacing
+        self.min_step = min_step if min_step is not None else self.spacing
+        self.max_step = max_step if max_step is not None else 8 * self.spacing
+        self.wald = wald
+        self.level = self.start if self.start is not None else float(self.levels[0] if higher_is_harder else self.levels[-1])
+        self.n_at_level = 0
+        self.correct_at_level = 0
+        self._direction = 0
+        self._run = 0
+
+    def _next_level(self) -> float:
+        return self.snap(self.level)
+
+    def _update(self, level: float, correct: bool) -> None:
+        if level != self.snap(self.level):
+            # Trial was run elsewhere (e.g. a restart); the test restarts there
+            self.level, self.n_at_level, self.correct_at_level = level, 0, 0
+        self.n_at_level += 1
+        self.correct_at_level += int(correct)
+
+        expected = self.target * self.n_at_level
+        if self.correct_at_level >= expected + self.wald:
+            direction = 1
+        elif self.correct_at_level <= expected - self.wald:
+            direction = -1
+        else:
+            return
+
+        if self._direction and direction != self._direction:
+            self.step /= 2.0
+            self._run = 1
+        else:
+            self._run += 1
+            if self._run >= 3:
+                self.step = min(self.step * 2.0, self.max_step)
+        self._direction = direction
+        self.level = float(np.clip(self.level + self.harder * direction * self.step,
+                                   self.levels[0], self.levels[-1]))
+        self.n_at_level = 0
+        self.correct_at_level = 0
+
+    def estimate(self) -> float:
+        return float(self.level)
+
+    def is_finished(self) -> bool:
+        return super().is_finished() or self.step < self.min_step
+
+    def summary(self) -> Dict[str, Any]:
+        summary = super().summary()
+        summary["final_step"] = self.step
+        return summary
+
+
+PROCEDURES = {
+    QuestPlus.name: QuestPlus,
+    WeightedUpDown.name: WeightedUpDown,
+    PEST.name: PEST,
+}
+
+
+def create_procedure(name: str, levels: Sequence[float], **options: Any) -> AdaptiveProcedure:
+    """Build a procedure by name ("quest_plus", "weighted_up_down" or "pest")."""
+    if name not in PROCEDURES:
+        raise ValueError(f"Unknown adaptive procedure: {name}")
+    return PROCEDURES[name](levels, **options)
@@ -0,0 +1,472 @@
+"""
+FILE: backend/experiments/antisaccade.py
+DIRECTORY: /backend/experiments/
+
+FUNCTIONAL ROLE: Antisaccade inhibitory control task implementation.
+                  A colored cue appears on the left or right. Green (pro)
+                  means press the arrow on the SAME side; red (anti) means
+                  press the arrow on the OPPOSITE side.
+
+METHOD: Pre-generated balanced blocks
+    - Every block has equal pro/anti trials, and within each condition
+      equal left/right cue sides, shuffled
+    - Fixation duration before each cue is jittered uniformly between
+      fixation_min_ms and fixation_max_ms
+    - The full plan is drawn with NumPy at configure() time
+
+BLOCK PROTOCOL:
+    - get_trial_block() returns one block in a single payload: constant
+      timing values in "header", per-trial values as parallel "columns".
+      It shares its cursor with get_next_trial(), so after trial-by-trial
+      delivery it serves the rest of the current block
+    - record_response_block() takes the block back array-encoded:
+        {"trial_number": [...], "response": [0|1|2, ...],
+         "rt_ms": [...], "fixation_ms": [...]}
+      response codes: 0 = no response, 1 = left, 2 = right; named columns
+      {"response_value": ["left" | "right" | "", ...], "response_time_ms"}
+      are accepted as well
+    - Timing is validated server-side: RTs outside the response window are
+      timeouts, RTs below min_rt_ms are anticipations, and measured fixation
+      durations that differ from the plan by more than timing_tolerance_ms
+      invalidate the trial
+
+SCORING:
+    Per-condition error rate and correct-trial RT are computed from the
+    stored response arrays in one vectorized pass (np.bincount by condition).
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+
+REFERENCES:
+    Hallett, P. E. (1978). Primary and secondary saccades to goals defined by
+        instructions. Vision Research, 18(10), 1279-1296.
+    Antoniades, C., et al. (2013). An internationally standardised
+        antisaccade protocol. Vision Research, 84, 1-5.
+"""
+
+from typing import Dict, Any, List, Optional
+import numpy as np
+from .base_experiment import (
+    BaseExperiment, ExperimentType, TrialData, ResponseData
+)
+
+
+SIDES = ("left", "right")
+CONDITIONS = ("pro", "anti")
+CUE_COLORS = {"pro": "green", "anti": "red"}
+
+# Compact response codes used by record_response_block()
+NO_RESPONSE, RESPONSE_LEFT, RESPONSE_RIGHT = 0, 1, 2
+RESPONSE_NAMES = {NO_RESPONSE: None, RESPONSE_LEFT: "left", RESPONSE_RIGHT: "right"}
+KEY_CODES = {"left": RESPONSE_LEFT, "arrowleft": RESPONSE_LEFT,
+             "right": RESPONSE_RIGHT, "arrowright": RESPONSE_RIGHT}
+
+# Per-trial flags stored with each response
+FLAG_TIMEOUT = "timeout"
+FLAG_ANTICIPATION = "anticipation"
+FLAG_TIMING = "timing_deviation"
+
+
+class AntisaccadeExperiment(BaseExperiment):
+    """
+    Antisaccade task.
+
+    Configuration options:
+    - n_blocks: Number of test blocks (default 2)
+    - trials_per_block: Trials per block, rounded up to a multiple of 4 (default 20)
+    - fixation_min_ms / fixation_max_ms: Fixation jitter range (default 1000-2000)
+    - response_timeout_ms: Response window after cue onset (default 2500)
+    - min_rt_ms: Faster responses count as anticipations (default 100)
+    - feedback_ms: Feedback duration (default 700)
+    - timing_tolerance_ms: Allowed fixation timing error (default 50)
+    - seed: Optional RNG seed for reproducible plans
+    """
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Parse antisaccade configuration and pre-generate all blocks."""
+        self.n_blocks = int(config.get("n_blocks", 2))
+        per_block = int(config.get("trials_per_block", 20))
+        self.trials_per_block = max(4, -(-per_block // 4) * 4)
+
+        self.fixation_min_ms = int(config.get("fixation_min_ms", 1000))
+        self.fixation_max_ms = int(config.get("fixation_max_ms", 2000))
+        self.response_timeout_ms = int(config.get("response_timeout_ms", 2500))
+        self.min_rt_ms = int(config.get("min_rt_ms", 100))
+        self.feedback_ms = int(config.get("feedback_ms", 700))
+        self.timing_tolerance_ms = int(config.get("timing_tolerance_ms", 50))
+
+        self._rng = np.random.default_rng(config.get("seed"))
+        plan = [self._generate_block() for _ in range(self.n_blocks)]
+        self.plan_side = np.concatenate([b[0] for b in plan])
+        self.plan_condition = np.concatenate([b[1] for b in plan])
+        self.plan_fixation = np.concatenate([b[2] for b in plan])
+        self.total_trials = int(self.plan_side.size)
+
+        # One cursor for both delivery modes (blocks and trial by trial)
+        self.trials_served = 0
+
+        # Response store, one slot per planned trial (grown for ingested extras)
+        n = self.total_trials
+        self.resp_condition = self.plan_condition.copy()
+        self.resp_recorded = np.zeros(n, dtype=bool)
+        self.resp_correct = np.zeros(n, dtype=bool)
+        self.resp_valid = np.zeros(n, dtype=bool)
+        self.resp_timeout = np.zeros(n, dtype=bool)
+        self.resp_rt = np.full(n, np.nan)
+
+    def _generate_block(self):
+        """Balanced pro/anti x left/right block with jittered fixations."""
+        quarter = self.trials_per_block // 4
+        cells = np.arange(4).repeat(quarter)
+        cells = self._rng.permutation(cells)
+        side = (cells % 2).astype(np.int8)          # 0 = left, 1 = right
+        condition = (cells // 2).astype(np.int8)    # 0 = pro, 1 = anti
+        fixation = self._rng.integers(self.fixation_min_ms, self.fixation_max_ms + 1,
+                                      size=cells.size, dtype=np.int32)
+        return side, condition, fixation
+
+    def _correct_code(self, side: np.ndarray, condition: np.ndarray) -> np.ndarray:
+        """Response code that is correct for each planned trial."""
+        same = side + 1
+        opposite = 2 - side
+        return np.where(condition == 0, same, opposite)
+
+    def get_experiment_type(self) -> ExperimentType:
+        return ExperimentType.ANTISACCADE
+
+    def get_instructions(self) -> List[Dict[str, Any]]:
+        """Return antisaccade instruction screens."""
+        return [
+            {
+                "type": "text",
+                "title": "Antisaccade Task",
+                "content": """
+                    <h2>Welcome to the Antisaccade Task</h2>
+                    <p>A colored circle will appear on the left or the right.</p>
+                    <ul>
+                        <li><strong style="color:green;">Green</strong>: press the arrow on the
+                            <strong>same</strong> side</li>
+                        <li><strong style="color:red;">Red</strong>: press the arrow on the
+                            <strong>opposite</strong> side</li>
+                    </ul>
+                    <p>Respond as quickly and accurately as you can.</p>
+                """,
+                "duration_ms": None
+            }
+        ]
+
+    # ---- Block delivery -------------------------------------------------
+
+    def get_trial_block(self) -> Optional[Dict[str, Any]]:
+        """Serve the rest of the current pre-generated block in one payload."""
+        if self.trials_served >= self.total_trials:
+            return None
+
+        start = self.trials_served
+        block_index = start // self.trials_per_block
+        stop = (block_index + 1) * self.trials_per_block
+        self.trials_served = self.current_trial_number = stop
+
+        side = self.plan_side[start:stop]
+        condition = self.plan_condition[start:stop]
+        correct = self._correct_code(side, condition)
+
+        return {
+            "block_number": block_index + 1,
+            "header": {
+                "response_timeout_ms": self.response_timeout_ms,
+                "min_rt_ms": self.min_rt_ms,
+                "feedback_ms": self.feedback_ms,
+                "cue_colors": CUE_COLORS,
+                "response_codes": {"none": NO_RESPONSE, "left": RESPONSE_LEFT,
+                                   "right": RESPONSE_RIGHT}
+            },
+            "columns": {
+                "trial_number": list(range(start + 1, stop + 1)),
+                "side": [SIDES[s] for s in side],
+                "condition": [CONDITIONS[c] for c in condition],
+                "fixation_ms": self.plan_fixation[start:stop].tolist(),
+                "correct_response": [RESPONSE_NAMES[int(c)] for c in correct]
+            }
+        }
+
+    def record_response_block(self, block: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and score an array-encoded response block in one pass."""
+        if "response" not in block and "response_value" in block:
+            # Named columns (subject_runner.js block mode): "left" / "right" / ""
+            block = dict(block, rt_ms=block.get("response_time_ms"), response=[
+                RESPONSE_LEFT if v == "left" else RESPONSE_RIGHT if v == "right" else NO_RESPONSE
+                for v in block["response_value"]
+            ])
+        try:
+            numbers = np.asarray(block["trial_number"], dtype=np.int64)
+            codes = np.asarray(block["response"], dtype=np.int64)
+            rts = np.asarray([np.nan if v is None else v for v in block["rt_ms"]], dtype=float)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Malformed response block: {e}")
+
+        if not (numbers.size == codes.size == rts.size) or numbers.size == 0:
+            raise ValueError("Response block columns must be non-empty and equal length")
+
+        idx = numbers - 1
+        if (idx < 0).any() or (idx >= self.trials_served).any():
+            raise ValueError("Response block contains trials that were not served")
+        if np.unique(idx).size != idx.size or self.resp_recorded[idx].any():
+            raise ValueError("Response block contains duplicate trial numbers")
+        if not np.isin(codes, list(RESPONSE_NAMES)).all():
+            raise ValueError("Unknown response code in block")
+
+        measured = block.get("fixation_ms")
+        if measured is not None:
+            measured = np.asarray([np.nan if v is None else v for v in measured], dtype=float)
+            if measured.size != idx.size:
+                raise ValueError("fixation_ms column length does not match block")
+            timing_bad = np.abs(measured - self.plan_fixation[idx]) > self.timing_tolerance_ms
+        else:
+            timing_bad = np.zeros(idx.size, dtype=bool)
+
+        responded = codes != NO_RESPONSE
+        timeout = ~responded | np.isnan(rts) | (rts > self.response_timeout_ms)
+        anticipation = ~timeout & (rts < self.min_rt_ms)
+        expected = self._correct_code(self.plan_side[idx], self.plan_condition[idx])
+        correct = ~timeout & ~anticipation & (codes == expected)
+
+        self.resp_recorded[idx] = True
+        self.resp_correct[idx] = correct
+        self.resp_timeout[idx] = timeout
+        self.resp_valid[idx] = ~timing_bad & ~anticipation
+        self.resp_rt[idx] = np.where(timeout, np.nan, rts)
+
+        trials = []
+        for i in range(idx.size):
+            flags = []
+            if timeout[i]:
+                flags.append(FLAG_TIMEOUT)
+            if anticipation[i]:
+                flags.append(FLAG_ANTICIPATION)
+            if timing_bad[i]:
+                flags.append(FLAG_TIMING)
+            trials.append({
+                "trial_number": int(numbers[i]),
+                "response_value": RESPONSE_NAMES[int(codes[i])] or "",
+                "response_time_ms": 0.0 if timeout[i] else float(rts[i]),
+                "correct": bool(correct[i]),
+                "flags": flags
+            })
+
+        return {
+            "trials": trials,
+            "summary": {
+                "recorded": int(idx.size),
+                "correct": int(correct.sum()),
+                "timeouts": int(timeout.sum()),
+                "anticipations": int(anticipation.sum()),
+                "timing_deviations": int(timing_bad.sum())
+            }
+        }
+
+    # ---- Trial-by-trial delivery (subject_runner.js / bulk ingest) -------
+
+    def get_next_trial(self) -> Optional[TrialData]:
+        """Serve the next planned trial when the client is not using blocks."""
+        if self.trials_served >= self.total_trials:
+            return None
+
+        i = self.trials_served
+        self.trials_served += 1
+        self.current_trial_number = self.trials_served
+        side = int(self.plan_side[i])
+        condition = int(self.plan_condition[i])
+        correct = int(self._correct_code(self.plan_side[i:i + 1], self.plan_condition[i:i + 1])[0])
+
+        return TrialData(
+            trial_number=self.current_trial_number,
+            trial_type="test",
+            stimulus_data={
+                "side": SIDES[side],
+                "color": CUE_COLORS[CONDITIONS[condition]],
+                "fixation_ms": int(self.plan_fixation[i]),
+                "response_timeout_ms": self.response_timeout_ms
+            },
+            correct_response=RESPONSE_NAMES[correct],
+            metadata={"condition": CONDITIONS[condition]}
+        )
+
+    def _ensure_capacity(self, idx: int) -> None:
+        """Grow the response store for records beyond the planned trials."""
+        extra = idx + 1 - self.resp_recorded.size
+        if extra <= 0:
+            return
+        self.resp_condition = np.concatenate([self.resp_condition, np.zeros(extra, dtype=np.int8)])
+        self.resp_recorded = np.concatenate([self.resp_recorded, np.zeros(extra, dtype=bool)])
+        self.resp_correct = np.concatenate([self.resp_correct, np.zeros(extra, dtype=bool)])
+        self.resp_valid = np.concatenate([self.resp_valid, np.zeros(extra, dtype=bool)])
+        self.resp_timeout = np.concatenate([self.resp_timeout, np.zeros(extra, dtype=bool)])
+        self.resp_rt = np.concatenate([self.resp_rt, np.full(extra, np.nan)])
+
+    def record_response(self, response_data: ResponseData) -> Dict[str, Any]:
+        """Record a single trial (trial-by-trial clients and bulk ingest)."""
+        self.trial_history.append(response_data)
+        metadata = response_data.metadata or {}
+        idx = response_data.trial_number - 1
+        if idx < 0:
+            idx = len(self.trial_history) - 1
+        self._ensure_capacity(idx)
+
+        condition = metadata.get("condition")
+        if condition in CONDITIONS:
+            self.resp_condition[idx] = CONDITIONS.index(condition)
+
+        code = KEY_CODES.get(str(response_data.response or "").strip().lower(), NO_RESPONSE)
+        rt = float(response_data.response_time_ms or 0)
+        timeout = (code == NO_RESPONSE and response_data.correct is None) \
+            or bool(metadata.get("timeout")) or rt <= 0 or rt > self.response_timeout_ms
+        anticipation = not timeout and rt < self.min_rt_ms
+
+        expected = KEY_CODES.get(str(metadata.get("correct_response", "")).strip().lower())
+        if code != NO_RESPONSE and expected is not None:
+            correct = code == expected
+        else:
+            correct = bool(response_data.correct)
+        correct = correct and not timeout and not anticipation
+
+        self.resp_recorded[idx] = True
+        self.resp_correct[idx] = correct
+        self.resp_timeout[idx] = timeout
+        self.resp_valid[idx] = not anticipation
+        self.resp_rt[idx] = np.nan if timeout else rt
+
+        return {
+            "correct": correct,
+            "feedback_message": "Correct." if correct else "Incorrect.",
+            "continue": not self.is_complete()
+        }
+
+    def is_complete(self) -> bool:
+        """Complete once every planned trial has been served."""
+        return self.trials_served >= self.total_trials
+
+    def get_results(self) -> Dict[str, Any]:
+        """Per-condition error rates and RTs in one vectorized pass."""
+        recorded = self.resp_recorded
+        condition = self.resp_condition[recorded].astype(np.int64)
+        correct = self.resp_correct[recorded]
+        valid = self.resp_valid[recorded]
+        timeout = self.resp_timeout[recorded]
+        rt = self.resp_rt[recorded]
+
+        n_cond = len(CONDITIONS)
+        n = np.bincount(condition, minlength=n_cond)
+        n_correct = np.bincount(condition, weights=correct, minlength=n_cond)
+        n_timeout = np.bincount(condition, weights=timeout, minlength=n_cond)
+        rt_mask = correct & valid & ~np.isnan(rt)
+        rt_n = np.bincount(condition, weights=rt_mask, minlength=n_cond)
+        rt_sum = np.bincount(condition, weights=np.where(rt_mask, rt, 0.0), minlength=n_cond)
+
+        by_condition = {}
+        for c, name in enumerate(CONDITIONS):
+            by_condition[name] = {
+                "trials": int(n[c]),
+                "error_rate": round(1 - n_correct[c] / n[c], 4) if n[c] else 0,
+                "timeouts": int(n_timeout[c]),
+                "mean_rt_ms": round(rt_sum[c] / rt_n[c], 2) if rt_n[c] else 0,
+                "median_rt_ms": round(float(np.median(rt[rt_mask & (condition == c)])), 2)
+                                if rt_n[c] else 0
+            }
+
+        total = int(n.sum())
+        return {
+            "total_trials": total,
+            "accuracy": round(float(correct.sum()) / total, 4) if total else 0,
+            "invalid_trials": int((~valid).sum()),
+            "by_condition": by_condition,
+            # Antisaccade cost: anti - pro on correct-trial RT and error rate
+            "antisaccade_rt_cost_ms": round(by_condition["anti"]["mean_rt_ms"]
+                                            - by_condition["pro"]["mean_rt_ms"], 2),
+            "antisaccade_error_cost": round(by_condition["anti"]["error_rate"]
+                                            - by_condition["pro"]["error_rate"], 4)
+        }
+
+    def get_default_configuration(self) -> Dict[str, Any]:
+        """Default antisaccade settings."""
+        return {
+            "n_blocks": 2,
+            "trials_per_block": 20,
+            "fixation_min_ms": 1000,
+            "fixation_max_ms": 2000,
+            "response_timeout_ms": 2500,
+            "min_rt_ms": 100,
+            "feedback_ms": 700,
+            "timing_tolerance_ms": 50
+        }
+
+    def get_configuration_schema(self) -> Dict[str, Any]:
+        """Configuration options for experimenter GUI."""
+        return {
+            "basic": {
+                "n_blocks": {
+                    "type": "number",
+                    "label": "Number of Blocks",
+                    "default": 2,
+                    "min": 1,
+                    "max": 10,
+                    "description": "Test blocks, each balanced for pro/anti and side"
+                },
+                "trials_per_block": {
+                    "type": "number",
+                    "label": "Trials Per Block",
+                    "default": 20,
+                    "min": 4,
+                    "max": 200,
+                    "step": 4,
+                    "description": "Rounded up to a multiple of 4 for balancing"
+                }
+            },
+            "advanced": {
+                "fixation_min_ms": {
+                    "type": "number",
+                    "label": "Minimum Fixation (ms)",
+                    "default": 1000,
+                    "min": 200,
+                    "max": 5000,
+                    "step": 100,
+                    "description": "Shortest jittered fixation before the cue"
+                },
+                "fixation_max_ms": {
+                    "type": "number",
+                    "label": "Maximum Fixation (ms)",
+                    "default": 2000,
+                    "min": 200,
+                    "max": 5000,
+                    "step": 100,
+                    "description": "Longest jittered fixation before the cue"
+                },
+                "response_timeout_ms": {
+                    "type": "number",
+                    "label": "Response Window (ms)",
+                    "default": 2500,
+                    "min": 500,
+                    "max": 5000,
+                    "step": 100,
+                    "description": "Responses after this count as timeouts"
+                },
+                "min_rt_ms": {
+                    "type": "number",
+                    "label": "Anticipation Cutoff (ms)",
+                    "default": 100,
+                    "min": 0,
+                    "max": 300,
+                    "step": 10,
+                    "description": "Faster responses are scored as anticipations"
+                },
+                "timing_tolerance_ms": {
+                    "type": "number",
+                    "label": "Timing Tolerance (ms)",
+                    "default": 50,
+                    "min": 5,
+                    "max": 500,
+                    "step": 5,
+                    "description": "Allowed difference between planned and measured fixation"
+                }
+            }
+        }
@@ -0,0 +1,354 @@
+"""
+FILE: backend/experiments/bart.py
+DIRECTORY: /backend/experiments/
+
+FUNCTIONAL ROLE: BART (Balloon Analogue Risk Task) implementation.
+                  Participants pump balloons to earn money per pump and
+                  bank before the balloon explodes. Measures risk taking.
+
+METHOD: Precomputed explosion schedules
+    - Each balloon color has its own risk profile (maximum pumps)
+    - Explosion points for the whole session are drawn at configure() time
+      with NumPy from a seeded generator, so a seed reproduces a schedule
+    - "uniform": explosion point ~ U{1..max_pumps} (Lejuez et al., 2002)
+    - "balanced": evenly spaced explosion points per color, shuffled, so
+      every participant faces the same mean explosion point
+    - Balloon colors are interleaved in a random order
+
+RESPONSE FORMAT:
+    The client posts ONE record per balloon, not per pump:
+    - response_value: number of pumps before banking / explosion
+    Explosions are decided by the server-side schedule.
+
+SCORING:
+    - Adjusted average pumps = mean pumps on balloons that did NOT explode,
+      per color and overall; kept as running sums, so get_results() is O(colors)
+    - Records that name no configured color (e.g. the standalone client's
+      single-color balloons) are reported under "unknown"
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+
+REFERENCES:
+    Lejuez, C. W., Read, J. P., Kahler, C. W., Richards, J. B., Ramsey, S. E.,
+        Stuart, G. L., Strong, D. R., & Brown, R. A. (2002). Evaluation of a
+        behavioral measure of risk taking: The Balloon Analogue Risk Task (BART).
+        Journal of Experimental Psychology: Applied, 8(2), 75-84.
+"""
+
+from typing import Dict, Any, List, Optional
+import numpy as np
+from .base_experiment import (
+    BaseExperiment, ExperimentType, TrialData, ResponseData
+)
+
+
+# Lejuez et al. (2002) colors: high, medium and low risk
+DEFAULT_BALLOON_COLORS = [
+    {"color": "blue", "max_pumps": 128},
+    {"color": "yellow", "max_pumps": 32},
+    {"color": "orange", "max_pumps": 8},
+]
+
+# by_color key of balloons whose record names no configured color
+UNKNOWN_COLOR = "unknown"
+
+
+def build_explosion_schedule(max_pumps: np.ndarray, balloons_per_color: int,
+                             risk_profile: str, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """
+    Draw a whole session's balloons in one vectorized pass.
+
+    Returns parallel arrays `color_index` and `explosion_point`, one entry per
+    balloon in presentation order.
+    """
+    n_colors = len(max_pumps)
+    color_index = np.repeat(np.arange(n_colors, dtype=np.int16), balloons_per_color)
+    limits = max_pumps[color_index]
+
+    if risk_profile == "balanced":
+        # Evenly spaced quantiles of 1..max_pumps, shuffled within each color
+        quantiles = (np.arange(balloons_per_color) + 0.5) / balloons_per_color
+        explosion = np.ceil(np.outer(max_pumps, quantiles)).astype(np.int32)
+        explosion = rng.permuted(explosion, axis=1).ravel()
+    else:
+        explosion = rng.integers(1, limits + 1, dtype=np.int32)
+
+    order = rng.permutation(color_index.size)
+    return {
+        "color_index": color_index[order],
+        "explosion_point": explosion[order],
+    }
+
+
+class BARTExperiment(BaseExperiment):
+    """
+    Balloon Analogue Risk Task.
+
+    Configuration options:
+    - balloon_colors: List of {"color", "max_pumps"} risk profiles
+                      (default blue/128, yellow/32, orange/8)
+    - balloons_per_color: Balloons of each color (default 10)
+    - risk_profile: "uniform" | "balanced" explosion schedule (default "uniform")
+    - pump_value: Money earned per pump (default 0.05)
+    - practice_balloons: Practice balloons before the test (default 1)
+    - seed: Optional RNG seed for reproducible schedules
+    """
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Parse BART configuration and precompute the explosion schedule."""
+        colors = config.get("balloon_colors") or DEFAULT_BALLOON_COLORS
+        self.color_names = [str(c["color"]) for c in colors]
+        self.max_pumps = np.array([int(c["max_pumps"]) for c in colors], dtype=np.int32)
+        if (self.max_pumps < 1).any():
+            raise ValueError("max_pumps must be at least 1 for every balloon color")
+
+        self.balloons_per_color = int(config.get("balloons_per_color", 10))
+        self.risk_profile = config.get("risk_profile", "uniform")
+        self.pump_value = float(config.get("pump_value", 0.05))
+        self.practice_balloons = int(config.get("practice_balloons", 1))
+        self.seed = config.get("seed")
+
+        self._rng = np.random.default_rng(self.seed)
+        schedule = build_explosion_schedule(
+            self.max_pumps, self.balloons_per_color, self.risk_profile, self._rng
+        )
+        self.schedule_color = schedule["color_index"]
+        self.schedule_explosion = schedule["explosion_point"]
+        self.total_balloons = int(self.schedule_color.size)
+        self.balloons_served = 0
+
+        # Running per-color accumulators (index = color, last slot = unknown color)
+        n_colors = len(self.color_names) + 1
+        self.banked_count = np.zeros(n_colors, dtype=np.int64)
+        self.banked_pumps = np.zeros(n_colors, dtype=np.int64)
+        self.exploded_count = np.zeros(n_colors, dtype=np.int64)
+        self.total_pumps = np.zeros(n_colors, dtype=np.int64)
+        self.total_earned = 0.0
+
+    def get_experiment_type(self) -> ExperimentType:
+        return ExperimentType.BART
+
+    def get_instructions(self) -> List[Dict[str, Any]]:
+        """Return BART instruction screens."""
+        return [
+            {
+                "type": "text",
+                "title": "Balloon Task",
+                "content": f"""
+                    <h2>Welcome to the Balloon Task</h2>
+                    <p>Each pump inflates the balloon and adds
+                       <strong>${self.pump_value:.2f}</strong> to the balloon's value.</p>
+                    <p>Bank the money at any time to keep it. If the balloon pops,
+                       you lose the money for that balloon.</p>
+                    <p>Balloons of different colors may pop at different sizes.</p>
+                """,
+                "duration_ms": None
+            }
+        ]
+
+    def get_practice_trials(self) -> Optional[List[TrialData]]:
+        """Practice balloons drawn from the first risk profile."""
+        if self.practice_balloons <= 0:
+            return None
+        limit = int(self.max_pumps[0])
+        points = self._rng.integers(1, limit + 1, size=self.practice_balloons)
+        return [
+            TrialData(
+                trial_number=i + 1,
+                trial_type="practice",
+                stimulus_data=self._stimulus(0, int(point), i + 1),
+                correct_response=None,
+                metadata={"phase": "practice", "color": self.color_names[0]}
+            )
+            for i, point in enumerate(points)
+        ]
+
+    def _stimulus(self, color_idx: int, explosion_point: int, balloon_number: int) -> Dict[str, Any]:
+        return {
+            "balloon_number": balloon_number,
+            "color": self.color_names[color_idx],
+            "max_pumps": int(self.max_pumps[color_idx]),
+            "explosion_point": explosion_point,
+            "pump_value": self.pump_value
+        }
+
+    def get_next_trial(self) -> Optional[TrialData]:
+        """Serve the next balloon from the precomputed schedule."""
+        if self.balloons_served >= self.total_balloons:
+            return None
+
+        idx = self.balloons_served
+        self.balloons_served += 1
+        self.current_trial_number = self.balloons_served
+        color_idx = int(self.schedule_color[idx])
+
+        return TrialData(
+            trial_number=self.current_trial_number,
+            trial_type="test",
+            stimulus_data=self._stimulus(color_idx, int(self.schedule_explosion[idx]),
+                                         self.current_trial_number),
+            correct_response=None,
+            metadata={"color": self.color_names[color_idx]}
+        )
+
+    def _outcome(self, response_data: ResponseData, pumps: int):
+        """
+        Return (color_idx, exploded) for a balloon record.
+
+        A record that carries its balloon's explosion point (replay feeds the
+        stored stimulus back in) is judged against that point, since a
+        seedless engine rebuilt for replay draws a different schedule.
+        Balloons served live by this engine are judged against the server
+        schedule; other records (e.g. bulk ingest of a client-run session)
+        fall back to the client's own explosion flag.
+        """
+        metadata = response_data.metadata or {}
+        color = metadata.get("color")
+        recorded = metadata.get("explosion_point")
+        if recorded is not None:
+            return self._color_index(color), pumps >= int(recorded)
+
+        idx = response_data.trial_number - 1
+        if 0 <= idx < self.total_balloons:
+            color_idx = int(self.schedule_color[idx])
+            if color == self.color_names[color_idx]:
+                return color_idx, pumps >= int(self.schedule_explosion[idx])
+
+        return self._color_index(color), bool(metadata.get("exploded", False))
+
+    def _color_index(self, color: Any) -> int:
+        """Index of a configured color; the unknown slot for anything else."""
+        return self.color_names.index(color) if color in self.color_names else len(self.color_names)
+
+    def _color_name(self, color_idx: int) -> str:
+        return self.color_names[color_idx] if color_idx < len(self.color_names) else UNKNOWN_COLOR
+
+    def record_response(self, response_data: ResponseData) -> Dict[str, Any]:
+        """Score one whole balloon (all pumps batched into a single record)."""
+        self.trial_history.append(response_data)
+        metadata = response_data.metadata or {}
+
+        try:
+            pumps = max(0, int(float(response_data.response or 0)))
+        except (TypeError, ValueError):
+            pumps = int(metadata.get("pumps", 0))
+
+        color_idx, exploded = self._outcome(response_data, pumps)
+        earned = 0.0 if exploded else round(pumps * self.pump_value, 2)
+        metadata.update({"pumps": pumps, "exploded": exploded,
+                         "color": self._color_name(color_idx)})
+
+        if metadata.get("phase") == "practice":
+            return {"correct": not exploded, "exploded": exploded, "earned": earned,
+                    "feedback_message": None, "continue": True}
+
+        self.total_pumps[color_idx] += pumps
+        if exploded:
+            self.exploded_count[color_idx] += 1
+            feedback = "The balloon popped!"
+        else:
+            self.banked_count[color_idx] += 1
+            self.banked_pumps[color_idx] += pumps
+            self.total_earned += earned
+            feedback = f"You banked ${earned:.2f}."
+
+        return {
+            "correct": not exploded,
+            "exploded": exploded,
+            "earned": earned,
+            "total_earned": round(self.total_earned, 2),
+            "feedback_message": feedback,
+            "continue": not self.is_complete()
+        }
+
+    def is_complete(self) -> bool:
+        """Check if every scheduled balloon was served."""
+        return self.balloons_served >= self.total_balloons
+
+    def get_results(self) -> Dict[str, Any]:
+        """Adjusted average pumps from the running per-color sums."""
+        adjusted = self.banked_pumps / np.maximum(self.banked_count, 1)
+
+        balloons = self.banked_count + self.exploded_count
+        by_color = {
+            self._color_name(i): {
+                "balloons": int(balloons[i]),
+                "explosions": int(self.exploded_count[i]),
+                "adjusted_avg_pumps": round(float(adjusted[i]), 2),
+                "total_pumps": int(self.total_pumps[i])
+            }
+            for i in range(balloons.size)
+            if i < len(self.color_names) or balloons[i]
+        }
+
+        n_banked = int(self.banked_count.sum())
+        n_balloons = int(balloons.sum())
+        return {
+            "adjusted_avg_pumps": round(float(self.banked_pumps.sum()) / n_banked, 2) if n_banked else 0,
+            "total_balloons": n_balloons,
+            "total_explosions": int(self.exploded_count.sum()),
+            "explosion_rate": round(float(self.exploded_count.sum()) / n_balloons, 3) if n_balloons else 0,
+            "total_earned": round(self.total_earned, 2),
+            "by_color": by_color
+        }
+
+    def get_default_configuration(self) -> Dict[str, Any]:
+        """Default BART settings."""
+        return {
+            "balloon_colors": DEFAULT_BALLOON_COLORS,
+            "balloons_per_color": 10,
+            "risk_profile": "uniform",
+            "pump_value": 0.05,
+            "practice_balloons": 1
+        }
+
+    def get_configuration_schema(self) -> Dict[str, Any]:
+        """Configuration options for experimenter GUI."""
+        return {
+            "basic": {
+                "balloons_per_color": {
+                    "type": "number",
+                    "label": "Balloons Per Color",
+                    "default": 10,
+                    "min": 1,
+                    "max": 50,
+                    "description": "Number of balloons of each color"
+                },
+                "pump_value": {
+                    "type": "number",
+                    "label": "Money Per Pump ($)",
+                    "default": 0.05,
+                    "min": 0.01,
+                    "max": 1.0,
+                    "step": 0.01,
+                    "description": "Amount added to the balloon by each pump"
+                }
+            },
+            "advanced": {
+                "risk_profile": {
+                    "type": "select",
+                    "label": "Explosion Schedule",
+                    "options": [
+                        {"value": "uniform", "label": "Uniform random (Lejuez et al., 2002)"},
+                        {"value": "balanced", "label": "Balanced (same mean for everyone)"}
+                    ],
+                    "default": "uniform",
+                    "description": "How explosion points are drawn for each color"
+                },
+                "practice_balloons": {
+                    "type": "number",
+                    "label": "Practice Balloons",
+                    "default": 1,
+                    "min": 0,
+                    "max": 5,
+                    "description": "Balloons that do not count toward results"
+                },
+                "seed": {
+                    "type": "number",
+                    "label": "Random Seed",
+                    "default": None,
+                    "description": "Fix to reproduce the same explosion schedule"
+                }
+            }
+        }
@@ -25,7 +25,7 @@ LAST MODIFIED: 2025-11-05
 
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from enum import Enum
 import json
 
@@ -37,6 +37,11 @@ class ExperimentType(Enum):
     SART = "sart"
     STROOP = "stroop"
     NBACK = "nback"
+    ANTISACCADE = "antisaccade"
+    CORSI = "corsi"
+    BART = "bart"
+    BUTTERFLY_SIMON = "butterfly_simon"
+    CLIENT_DRIVEN = "client_driven"
     # Students can easily add more
 
 
@@ -49,6 +54,10 @@ class TrialData:
     correct_response: Optional[Any] = None
     metadata: Dict[str, Any] = None
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the JSON-ready form sent to the client and stored in `trials`."""
+        return asdict(self)
+
 
 @dataclass
 class ResponseData:
@@ -59,6 +68,40 @@ class ResponseData:
     correct: Optional[bool] = None
     metadata: Dict[str, Any] = None
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ResponseData":
+        """
+        Build a ResponseData from a client response payload.
+
+        The client posts `response_value`, `response_time_ms`,
+        `correct_response` and the trial `metadata`. The expected answer is
+        folded into metadata so engines can score without a trial lookup.
+        If the client did not score the trial, correctness is derived from
+        a case-insensitive match against `correct_response`.
+        """
+        metadata = dict(data.get("metadata") or {})
+        expected = data.get("correct_response")
+        if expected is not None:
+            metadata.setdefault("correct_response", expected)
+
+        response = data.get("response_value", data.get("response"))
+        correct = data.get("correct")
+        if correct is None and expected is not None and response is not None:
+            correct = str(response).strip().lower() == str(expected).strip().lower()
+
+        try:
+            rt = float(data.get("response_time_ms") or 0)
+        except (TypeError, ValueError):
+            rt = 0.0
+
+        return cls(
+            trial_number=int(data.get("trial_number") or 0),
+            response=response,
+            response_time_ms=rt,
+            correct=None if correct is None else bool(correct),
+            metadata=metadata
+        )
+
 
 class BaseExperiment(ABC):
     """
@@ -163,6 +206,43 @@ class BaseExperiment(ABC):
         """
         pass
     
+    def get_trial_block(self) -> Optional[Dict[str, Any]]:
+        """
+        Return the next block of trials in one payload.
+        
+        Base implementation returns None (trial-by-trial delivery only).
+        Subclasses that pre-generate blocks can override.
+        
+        Returns:
+            {
+                "block_number": int,
+                "header": {...},   # values shared by every trial in the block
+                "columns": {       # one list per field, all the same length
+                    "trial_number": [...],
+                    "correct_response": [...],
+                    ...
+                }
+            }
+        """
+        return None
+    
+    def record_response_block(self, block: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a whole block of array-encoded responses.
+        
+        Only required for subclasses that override get_trial_block().
+        
+        Returns:
+            {
+                "trials": [{"trial_number", "response_value",
+                            "response_time_ms", "correct", "flags"}, ...],
+                "summary": {...}
+            }
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support block responses"
+        )
+    
     @abstractmethod
     def is_complete(self) -> bool:
         """
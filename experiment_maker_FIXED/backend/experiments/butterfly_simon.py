@@ -0,0 +1,415 @@
+"""
+FILE: backend/experiments/butterfly_simon.py
+DIRECTORY: /backend/experiments/
+
+FUNCTIONAL ROLE: Butterfly Simon task implementation.
+                  A colored butterfly appears on the left or right. The
+                  butterfly's COLOR decides the response side; its LOCATION
+                  must be ignored. Measures stimulus-response interference.
+
+METHOD: Counterbalanced location x color blocks
+    - Every block contains each color x location cell equally often,
+      shuffled within the block
+    - Congruent = butterfly appears on the side of its correct response
+
+LIVE ANALYTICS:
+    record_response() updates running accumulators only, so every metric
+    below is available at any time in O(1) without rescanning history:
+    - Simon effect: incongruent - congruent mean RT (correct trials) and
+      accuracy difference
+    - Post-error slowing: mean RT after errors - mean RT after correct
+      trials, plus the robust E+1 minus E-1 version (Dutilh et al., 2012)
+    - Conditional accuracy function: accuracy per fixed-width RT bin,
+      split by congruency
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+
+REFERENCES:
+    Simon, J. R., & Rudell, A. P. (1967). Auditory S-R compatibility: The
+        effect of an irrelevant cue on information processing. Journal of
+        Applied Psychology, 51(3), 300-304.
+    Dutilh, G., van Ravenzwaaij, D., Nieuwenhuis, S., van der Maas, H. L. J.,
+        Forstmann, B. U., & Wagenmakers, E.-J. (2012). How to measure
+        post-error slowing. Journal of Mathematical Psychology, 56(3), 208-216.
+"""
+
+from typing import Dict, Any, List, Optional
+import math
+import random
+from .base_experiment import (
+    BaseExperiment, ExperimentType, TrialData, ResponseData
+)
+
+
+COLORS = ("purple", "yellow")
+LOCATIONS = ("left", "right")
+
+
+class _RunningStats:
+    """Count / accuracy / correct-trial RT mean and SD, updated in O(1)."""
+
+    __slots__ = ("n", "n_correct", "rt_n", "rt_sum", "rt_sumsq")
+
+    def __init__(self):
+        self.n = 0
+        self.n_correct = 0
+        self.rt_n = 0
+        self.rt_sum = 0.0
+        self.rt_sumsq = 0.0
+
+    def add(self, correct: bool, rt: Optional[float]) -> None:
+        self.n += 1
+        if correct:
+            self.n_correct += 1
+            if rt is not None:
+                self.rt_n += 1
+                self.rt_sum += rt
+                self.rt_sumsq += rt * rt
+
+    @property
+    def accuracy(self) -> float:
+        return self.n_correct / self.n if self.n else 0.0
+
+    @property
+    def mean_rt(self) -> float:
+        return self.rt_sum / self.rt_n if self.rt_n else 0.0
+
+    @property
+    def sd_rt(self) -> float:
+        if self.rt_n < 2:
+            return 0.0
+        var = (self.rt_sumsq - self.rt_sum * self.rt_sum / self.rt_n) / (self.rt_n - 1)
+        return math.sqrt(max(var, 0.0))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trials": self.n,
+            "accuracy": round(self.accuracy, 4),
+            "mean_rt_ms": round(self.mean_rt, 2),
+            "sd_rt_ms": round(self.sd_rt, 2)
+        }
+
+
+class ButterflySimonExperiment(BaseExperiment):
+    """
+    Butterfly Simon task.
+
+    Configuration options:
+    - n_blocks: Number of test blocks (default 2)
+    - trials_per_block: Trials per block, rounded up to a multiple of 4 (default 12)
+    - practice_trials: Practice trials, rounded up to a multiple of 4 (default 4)
+    - color_sides: Which side each color maps to (default purple=left, yellow=right)
+    - left_key / right_key: Response keys (default "f" / "j")
+    - isi_ms: Blank between trials (default 400)
+    - min_rt_ms: Faster responses count as anticipations (default 120)
+    - caf_bin_ms / caf_max_ms: Conditional accuracy function bins (default 100 / 1500)
+    - seed: Optional RNG seed for reproducible trial order
+    """
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Parse Simon configuration and pre-generate counterbalanced blocks."""
+        self.n_blocks = int(config.get("n_blocks", 2))
+        self.trials_per_block = self._round_to_cells(int(config.get("trials_per_block", 12)))
+        self.practice_count = self._round_to_cells(int(config.get("practice_trials", 4)))
+        self.color_sides = dict(config.get("color_sides") or {"purple": "left", "yellow": "right"})
+        self.left_key = str(config.get("left_key", "f")).lower()
+        self.right_key = str(config.get("right_key", "j")).lower()
+        self.isi_ms = int(config.get("isi_ms", 400))
+        self.min_rt_ms = float(config.get("min_rt_ms", 120))
+        self.caf_bin_ms = float(config.get("caf_bin_ms", 100))
+        self.caf_max_ms = float(config.get("caf_max_ms", 1500))
+
+        self._rng = random.Random(config.get("seed"))
+        self.trial_plan: List[Dict[str, Any]] = []
+        for block in range(self.n_blocks):
+            self.trial_plan.extend(self._generate_block(self.trials_per_block, block + 1))
+        self.trials_served = 0
+
+        # Live accumulators
+        self.stats = {"congruent": _RunningStats(), "incongruent": _RunningStats()}
+        self.post_error = _RunningStats()
+        self.post_correct = _RunningStats()
+        self.anticipations = 0
+        self._prev_correct: Optional[bool] = None
+        self._prev_rt: Optional[float] = None
+        self._pending_pes: Optional[float] = None   # RT at E-1 awaiting E+1
+        self.robust_pes_sum = 0.0
+        self.robust_pes_n = 0
+        n_bins = int(math.ceil(self.caf_max_ms / self.caf_bin_ms)) + 1
+        self.caf = {
+            "congruent": [[0, 0] for _ in range(n_bins)],     # [n, n_correct]
+            "incongruent": [[0, 0] for _ in range(n_bins)]
+        }
+
+    @staticmethod
+    def _round_to_cells(n: int) -> int:
+        return max(4, -(-n // 4) * 4)
+
+    def _generate_block(self, size: int, block_number: int) -> List[Dict[str, Any]]:
+        """Each color x location cell size/4 times, shuffled."""
+        cells = [(color, location) for color in COLORS for location in LOCATIONS]
+        trials = [
+            {
+                "color": color,
+                "location": location,
+                "correct_response": self.color_sides[color],
+                "congruent": location == self.color_sides[color],
+                "block_number": block_number
+            }
+            for color, location in cells * (size // 4)
+        ]
+        self._rng.shuffle(trials)
+        return trials
+
+    def get_experiment_type(self) -> ExperimentType:
+        return ExperimentType.BUTTERFLY_SIMON
+
+    def get_instructions(self) -> List[Dict[str, Any]]:
+        """Return Simon instruction screens."""
+        rules = "".join(
+            f"<li><strong>{color.upper()}</strong> butterfly: choose the "
+            f"<strong>{side.upper()}</strong> side "
+            f"(key {(self.left_key if side == 'left' else self.right_key).upper()})</li>"
+            for color, side in self.color_sides.items()
+        )
+        return [
+            {
+                "type": "text",
+                "title": "Butterfly Simon Task",
+                "content": f"""
+                    <h2>Welcome to the Butterfly Task</h2>
+                    <ul>{rules}</ul>
+                    <p>Ignore where the colored butterfly is located.
+                       Its color decides the side.</p>
+                """,
+                "duration_ms": None
+            }
+        ]
+
+    def _to_trial(self, info: Dict[str, Any], number: int, trial_type: str) -> TrialData:
+        return TrialData(
+            trial_number=number,
+            trial_type=trial_type,
+            stimulus_data={
+                "color": info["color"],
+                "location": info["location"],
+                "left_key": self.left_key,
+                "right_key": self.right_key,
+                "isi_ms": self.isi_ms
+            },
+            correct_response=info["correct_response"],
+            metadata={
+                "congruent": info["congruent"],
+                "block_number": info["block_number"],
+                "phase": "practice" if trial_type == "practice" else "test"
+            }
+        )
+
+    def get_practice_trials(self) -> Optional[List[TrialData]]:
+        """One counterbalanced practice block."""
+        block = self._generate_block(self.practice_count, 0)
+        return [self._to_trial(info, i + 1, "practice") for i, info in enumerate(block)]
+
+    def get_next_trial(self) -> Optional[TrialData]:
+        """Serve the next trial from the pre-generated blocks."""
+        if self.trials_served >= len(self.trial_plan):
+            return None
+
+        info = self.trial_plan[self.trials_served]
+        self.trials_served += 1
+        self.current_trial_number = self.trials_served
+        return self._to_trial(info, self.current_trial_number, "test")
+
+    def _response_side(self, response: Any) -> Optional[str]:
+        """Accept "left"/"right", the configured keys, or "key:F" / "mouse" forms."""
+        value = str(response or "").strip().lower()
+        if value.startswith("key:"):
+            value = value[4:]
+        if value in LOCATIONS:
+            return value
+        if value == self.left_key:
+            return "left"
+        if value == self.right_key:
+            return "right"
+        return None
+
+    def record_response(self, response_data: ResponseData) -> Dict[str, Any]:
+        """Score one trial and update every live accumulator in O(1)."""
+        self.trial_history.append(response_data)
+        metadata = response_data.metadata or {}
+
+        side = self._response_side(response_data.response)
+        expected = metadata.get("correct_response")
+        if side is not None and expected in LOCATIONS:
+            correct = side == expected
+        else:
+            correct = bool(response_data.correct)
+
+        rt = float(response_data.response_time_ms or 0)
+        if 0 < rt < self.min_rt_ms:
+            self.anticipations += 1
+            correct = False
+        rt_value = rt if rt >= self.min_rt_ms else None
+
+        feedback = {
+            "correct": correct,
+            "feedback_message": "Correct!" if correct else "Oops - color decides the side.",
+            "continue": not self.is_complete()
+        }
+        if metadata.get("phase") == "practice":
+            return feedback
+
+        congruent = metadata.get("congruent")
+        if isinstance(congruent, str):
+            congruent = congruent.lower() == "true"
+        key = "congruent" if congruent else "incongruent"
+        self.stats[key].add(correct, rt_value)
+
+        # Conditional accuracy function (fixed-width RT bins)
+        if rt_value is not None:
+            bin_index = min(int(rt_value // self.caf_bin_ms), len(self.caf[key]) - 1)
+            self.caf[key][bin_index][0] += 1
+            self.caf[key][bin_index][1] += int(correct)
+
+        # Traditional post-error slowing
+        if self._prev_correct is not None:
+            (self.post_correct if self._prev_correct else self.post_error).add(correct, rt_value)
+
+        # Robust post-error slowing: correct E-1, error E, correct E+1
+        if self._pending_pes is not None:
+            if correct and rt_value is not None:
+                self.robust_pes_sum += rt_value - self._pending_pes
+                self.robust_pes_n += 1
+            self._pending_pes = None
+        if not correct and self._prev_correct and self._prev_rt is not None:
+            self._pending_pes = self._prev_rt
+
+        self._prev_correct = correct
+        self._prev_rt = rt_value if correct else None
+        return feedback
+
+    def is_complete(self) -> bool:
+        """Complete once every planned trial has been served."""
+        return self.trials_served >= len(self.trial_plan)
+
+    def get_results(self) -> Dict[str, Any]:
+        """Simon effect, post-error slowing and CAF from the accumulators."""
+        congruent = self.stats["congruent"]
+        incongruent = self.stats["incongruent"]
+        total = congruent.n + incongruent.n
+
+        caf = {}
+        for key, bins in self.caf.items():
+            caf[key] = [
+                {
+                    "rt_from_ms": i * self.caf_bin_ms,
+                    "trials": n,
+                    "accuracy": round(n_correct / n, 4)
+                }
+                for i, (n, n_correct) in enumerate(bins) if n
+            ]
+
+        return {
+            "total_trials": total,
+            "accuracy": round((congruent.n_correct + incongruent.n_correct) / total, 4) if total else 0,
+            "anticipations": self.anticipations,
+            "congruent": congruent.summary(),
+            "incongruent": incongruent.summary(),
+            "simon_effect_rt_ms": round(incongruent.mean_rt - congruent.mean_rt, 2),
+            "simon_effect_accuracy": round(congruent.accuracy - incongruent.accuracy, 4),
+            "post_error_slowing_ms": round(self.post_error.mean_rt - self.post_correct.mean_rt, 2)
+                                     if self.post_error.rt_n and self.post_correct.rt_n else None,
+            "robust_post_error_slowing_ms": round(self.robust_pes_sum / self.robust_pes_n, 2)
+                                            if self.robust_pes_n else None,
+            "conditional_accuracy": caf
+        }
+
+    def get_default_configuration(self) -> Dict[str, Any]:
+        """Default Simon settings."""
+        return {
+            "n_blocks": 2,
+            "trials_per_block": 12,
+            "practice_trials": 4,
+            "color_sides": {"purple": "left", "yellow": "right"},
+            "left_key": "f",
+            "right_key": "j",
+            "isi_ms": 400,
+            "min_rt_ms": 120,
+            "caf_bin_ms": 100,
+            "caf_max_ms": 1500
+        }
+
+    def get_configuration_schema(self) -> Dict[str, Any]:
+        """Configuration options for experimenter GUI."""
+        return {
+            "basic": {
+                "n_blocks": {
+                    "type": "number",
+                    "label": "Number of Blocks",
+                    "default": 2,
+                    "min": 1,
+                    "max": 20,
+                    "description": "Blocks balanced for color x location"
+                },
+                "trials_per_block": {
+                    "type": "number",
+                    "label": "Trials Per Block",
+                    "default": 12,
+                    "min": 4,
+                    "max": 400,
+                    "step": 4,
+                    "description": "Rounded up to a multiple of 4 for balancing"
+                },
+                "practice_trials": {
+                    "type": "number",
+                    "label": "Practice Trials",
+                    "default": 4,
+                    "min": 4,
+                    "max": 40,
+                    "step": 4,
+                    "description": "Practice trials with feedback, not scored"
+                }
+            },
+            "advanced": {
+                "left_key": {
+                    "type": "string",
+                    "label": "Left Key",
+                    "default": "f",
+                    "description": "Key for the LEFT response"
+                },
+                "right_key": {
+                    "type": "string",
+                    "label": "Right Key",
+                    "default": "j",
+                    "description": "Key for the RIGHT response"
+                },
+                "isi_ms": {
+                    "type": "number",
+                    "label": "Inter-Stimulus Interval (ms)",
+                    "default": 400,
+                    "min": 100,
+                    "max": 2000,
+                    "step": 50,
+                    "description": "Blank between trials"
+                },
+                "min_rt_ms": {
+                    "type": "number",
+                    "label": "Anticipation Cutoff (ms)",
+                    "default": 120,
+                    "min": 0,
+                    "max": 300,
+                    "step": 10,
+                    "description": "Faster responses are scored as anticipations"
+                },
+                "caf_bin_ms": {
+                    "type": "number",
+                    "label": "CAF Bin Width (ms)",
+                    "default": 100,
+                    "min": 25,
+                    "max": 500,
+                    "step": 25,
+                    "description": "RT bin width for the conditional accuracy function"
+                }
+            }
+        }
@@ -0,0 +1,165 @@
+"""
+FILE: backend/experiments/client_driven.py
+DIRECTORY: /backend/experiments/
+
+FUNCTIONAL ROLE: Generic adapter for paradigms whose trials are generated and
+                  timed entirely in the browser (the standalone BART, Corsi,
+                  Antisaccade and Butterfly Simon pages). The server does not
+                  schedule trials; it accepts finished trial records through
+                  the bulk ingest endpoint and scores them with the same
+                  lifecycle as every other BaseExperiment.
+
+METHOD: Passive scoring
+    - get_next_trial() always returns None (the client owns the trial plan)
+    - record_response() folds each submitted record into running
+      accumulators, overall and per condition
+    - get_results() reports accuracy and mean RT without rescanning history
+
+CONDITIONS:
+    The condition of a record is read from its metadata (falling back to
+    the stimulus data the client echoed back) using `condition_field`,
+    e.g. "condition" (pro/anti) for antisaccade or "congruent" for Simon tasks.
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, List, Optional
+from .base_experiment import (
+    BaseExperiment, ExperimentType, TrialData, ResponseData
+)
+
+
+# Default condition split for each client-run paradigm
+DEFAULT_CONDITION_FIELDS = {
+    ExperimentType.ANTISACCADE: "condition",
+    ExperimentType.CORSI: "sequence_length",
+    ExperimentType.BART: "color",
+    ExperimentType.BUTTERFLY_SIMON: "congruent",
+}
+
+
+class ClientDrivenExperiment(BaseExperiment):
+    """
+    Scoring-only experiment for client-run paradigms.
+
+    Configuration options:
+    - condition_field: Metadata key used to split results (default None)
+    - expected_trials: Number of records that completes the session
+                       (default 0 = complete whenever the client says so)
+    """
+
+    def __init__(self, experiment_id: str, configuration: Dict[str, Any],
+                 experiment_type: ExperimentType = ExperimentType.CLIENT_DRIVEN):
+        self.experiment_type = experiment_type
+        super().__init__(experiment_id, configuration)
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Parse adapter configuration."""
+        self.condition_field = (config.get("condition_field")
+                                or DEFAULT_CONDITION_FIELDS.get(self.experiment_type))
+        self.expected_trials = int(config.get("expected_trials", 0) or 0)
+
+        # Running accumulators: {condition: [n, n_correct, rt_sum, n_rt]}
+        self._totals = [0, 0, 0.0, 0]
+        self._by_condition: Dict[str, List[float]] = {}
+
+    def get_experiment_type(self) -> ExperimentType:
+        return self.experiment_type
+
+    def get_instructions(self) -> List[Dict[str, Any]]:
+        return [{
+            "type": "text",
+            "title": "Client-run task",
+            "content": "This task runs in the browser; results are uploaded when it finishes.",
+            "duration_ms": None
+        }]
+
+    def get_next_trial(self) -> Optional[TrialData]:
+        """Trials are generated by the client."""
+        return None
+
+    def _condition_of(self, response_data: ResponseData) -> Optional[str]:
+        if not self.condition_field:
+            return None
+        metadata = response_data.metadata or {}
+        value = metadata.get(self.condition_field)
+        if value is None:
+            value = (metadata.get("stimulus_data") or {}).get(self.condition_field)
+        return None if value is None else str(value)
+
+    @staticmethod
+    def _accumulate(bucket: List[float], correct: Optional[bool], rt: float) -> None:
+        bucket[0] += 1
+        if correct:
+            bucket[1] += 1
+        if rt > 0:
+            bucket[2] += rt
+            bucket[3] += 1
+
+    def record_response(self, response_data: ResponseData) -> Dict[str, Any]:
+        """Fold one client-scored record into the accumulators."""
+        self.trial_history.append(response_data)
+        self.current_trial_number = max(self.current_trial_number, response_data.trial_number)
+
+        correct = response_data.correct
+        rt = float(response_data.response_time_ms or 0)
+        self._accumulate(self._totals, correct, rt)
+
+        condition = self._condition_of(response_data)
+        if condition is not None:
+            bucket = self._by_condition.setdefault(condition, [0, 0, 0.0, 0])
+            self._accumulate(bucket, correct, rt)
+
+        return {
+            "correct": correct,
+            "feedback_message": None,
+            "continue": not self.is_complete()
+        }
+
+    def is_complete(self) -> bool:
+        if self.expected_trials <= 0:
+            return True
+        return self._totals[0] >= self.expected_trials
+
+    @staticmethod
+    def _summarize(bucket: List[float]) -> Dict[str, Any]:
+        n, n_correct, rt_sum, n_rt = bucket
+        return {
+            "trials": int(n),
+            "accuracy": round(n_correct / n, 4) if n else 0,
+            "mean_rt_ms": round(rt_sum / n_rt, 2) if n_rt else 0
+        }
+
+    def get_results(self) -> Dict[str, Any]:
+        """Overall and per-condition accuracy / mean RT."""
+        results = self._summarize(self._totals)
+        results["experiment_type"] = self.experiment_type.value
+        if self._by_condition:
+            results["by_condition"] = {
+                condition: self._summarize(bucket)
+                for condition, bucket in sorted(self._by_condition.items())
+            }
+        return results
+
+    def get_configuration_schema(self) -> Dict[str, Any]:
+        """Configuration options for experimenter GUI."""
+        return {
+            "basic": {},
+            "advanced": {
+                "condition_field": {
+                    "type": "string",
+                    "label": "Condition Field",
+                    "default": "",
+                    "description": "Trial metadata key used to split results by condition"
+                },
+                "expected_trials": {
+                    "type": "number",
+                    "label": "Expected Trials",
+                    "default": 0,
+                    "min": 0,
+                    "max": 1000,
+                    "description": "Records needed to complete the session (0 = any)"
+                }
+            }
+        }
@@ -0,0 +1,516 @@
+"""
+FILE: backend/experiments/corsi.py
+DIRECTORY: /backend/experiments/
+
+FUNCTIONAL ROLE: Corsi block-tapping visuospatial working memory test.
+                  Blocks light up one at a time; participants tap the same
+                  blocks in the same (or reverse) order. Sequence length
+                  increases until failure threshold reached.
+
+METHOD: Adaptive staircase procedure (same rules as DigitSpanExperiment)
+    - Start with sequence length N (default 2)
+    - If correct: increase length by 1
+    - If incorrect: repeat same length (max 2 attempts)
+    - Stop after 2 consecutive failed lengths, or when max_length passed
+
+SEQUENCE GENERATION:
+    - Block positions come from a cached layout index (grid_rows x grid_cols,
+      matching the 3x3 board in Corsi/script.js by default)
+    - Consecutive blocks must be at least `min_path_distance` apart
+      (in block units) and the same block is never tapped twice in a row;
+      by default a block appears at most once per sequence
+    - A candidate pool for every length is generated at configure() time,
+      so trials are served without any generation on the request path
+
+TYPICAL PARADIGM (from Kessels et al., 2000):
+    - 9 blocks, 1 block per second
+    - Two trials per length, starting at length 2
+    - Scoring: Corsi span and total score (span x trials correct)
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+
+REFERENCES:
+    Corsi, P. M. (1972). Human memory and the medial temporal region of the
+        brain. Dissertation Abstracts International, 34, 891B.
+    Kessels, R. P. C., van Zandvoort, M. J. E., Postma, A., Kappelle, L. J.,
+        & de Haan, E. H. F. (2000). The Corsi Block-Tapping Task:
+        Standardization and normative data. Applied Neuropsychology, 7(4),
+        252-258.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+import math
+import random
+from .base_experiment import (
+    BaseExperiment, ExperimentType, TrialData, ResponseData
+)
+
+
+# Search budget for one sequence; only exhausted by infeasible constraints
+MAX_SEARCH_STEPS = 20000
+
+# Rules out orthogonal neighbours but keeps diagonal ones. Anything above
+# sqrt(2) leaves the centre of a 3x3 board without successors, so no
+# sequence could use all 9 blocks
+DEFAULT_MIN_PATH_DISTANCE = 1.4
+
+
+@dataclass(frozen=True)
+class BlockLayout:
+    """Block positions plus, per block, the blocks that may follow it."""
+    positions: Tuple[Tuple[float, float], ...]
+    successors: Tuple[Tuple[int, ...], ...]
+
+    @property
+    def n_blocks(self) -> int:
+        return len(self.positions)
+
+
+@lru_cache(maxsize=32)
+def get_block_layout(rows: int, cols: int, min_path_distance: float) -> BlockLayout:
+    """
+    Build (once per process) the layout index for a rows x cols board.
+
+    Positions are in block units; successors[i] lists every block j != i at
+    Euclidean distance >= min_path_distance from block i.
+    """
+    positions = tuple((float(c), float(r)) for r in range(rows) for c in range(cols))
+    successors = tuple(
+        tuple(
+            j for j, (x2, y2) in enumerate(positions)
+            if j != i and math.hypot(x2 - x1, y2 - y1) >= min_path_distance
+        )
+        for i, (x1, y1) in enumerate(positions)
+    )
+    return BlockLayout(positions=positions, successors=successors)
+
+
+class CorsiExperiment(BaseExperiment):
+    """
+    Corsi block-tapping test.
+
+    Configuration options:
+    - direction: "forward" | "backward" | "both"
+    - starting_length: Initial sequence length (default 2)
+    - max_length: Stop if this length reached (default 9)
+    - trials_per_length: Attempts at each length (default 2)
+    - failure_threshold: Consecutive failed lengths to stop (default 2)
+    - grid_rows / grid_cols: Board layout (default 3 x 3)
+    - min_path_distance: Minimum distance between consecutive blocks (default 1.4)
+    - allow_repeats: Allow a block to reappear later in a sequence (default False)
+    - pool_per_length: Candidate sequences prefetched per length (default 6)
+    - block_highlight_ms: How long each block lights up (default 600)
+    - inter_block_interval_ms: Gap between highlights (default 260)
+    - seed: Optional RNG seed for reproducible sequences
+    """
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Parse Corsi specific configuration and prefetch sequences."""
+        # Basic options
+        self.direction = config.get("direction", "forward")
+        self.starting_length = int(config.get("starting_length", 2))
+        self.max_length = int(config.get("max_length", 9))
+        self.trials_per_length = int(config.get("trials_per_length", 2))
+        self.failure_threshold = int(config.get("failure_threshold", 2))
+
+        # Layout / sequence constraints
+        self.grid_rows = int(config.get("grid_rows", 3))
+        self.grid_cols = int(config.get("grid_cols", 3))
+        self.min_path_distance = float(config.get("min_path_distance", DEFAULT_MIN_PATH_DISTANCE))
+        self.allow_repeats = bool(config.get("allow_repeats", False))
+        self.pool_per_length = int(config.get("pool_per_length", 6))
+
+        # Advanced timing options
+        self.block_highlight_ms = config.get("block_highlight_ms", 600)
+        self.inter_block_interval_ms = config.get("inter_block_interval_ms", 260)
+        self.feedback_enabled = config.get("feedback_enabled", True)
+
+        self.layout = get_block_layout(self.grid_rows, self.grid_cols, self.min_path_distance)
+        if not self.allow_repeats:
+            self.max_length = min(self.max_length, self.layout.n_blocks)
+        self._rng = random.Random(config.get("seed"))
+
+        # State tracking
+        self.current_length = self.starting_length
+        self.trials_at_current_length = 0
+        self.consecutive_failures = 0
+        self.max_span_achieved = 0
+        self.correct_trials = 0
+
+        # For "both" direction mode
+        self.current_phase = "forward" if self.direction == "both" else self.direction
+        self.forward_complete = False
+
+        # Prefetch the whole session's candidate pool
+        self.sequence_pool = self._build_sequence_pool()
+
+    def _build_sequence_pool(self) -> Dict[int, List[List[int]]]:
+        """Generate `pool_per_length` sequences for every reachable length."""
+        phases = 2 if self.direction == "both" else 1
+        per_length = max(1, self.pool_per_length) * phases
+        return {
+            length: [self._generate_sequence(length) for _ in range(per_length)]
+            for length in range(self.starting_length, self.max_length + 1)
+        }
+
+    def _generate_sequence(self, length: int) -> List[int]:
+        """
+        Randomized depth-first walk over the layout's successor lists.
+
+        Backtracks on dead ends, so any length the constraints allow is found;
+        raises ValueError if none exists within MAX_SEARCH_STEPS expansions.
+        """
+        successors = self.layout.successors
+        rng = self._rng
+        budget = [MAX_SEARCH_STEPS]
+
+        def extend(path: List[int], used: set) -> bool:
+            if len(path) == length:
+                return True
+            budget[0] -= 1
+            if budget[0] <= 0:
+                return False
+            candidates = list(successors[path[-1]])
+            rng.shuffle(candidates)
+            for block in candidates:
+                if not self.allow_repeats and block in used:
+                    continue
+                path.append(block)
+                used.add(block)
+                if extend(path, used):
+                    return True
+                path.pop()
+                used.discard(block)
+            return False
+
+        starts = list(range(self.layout.n_blocks))
+        rng.shuffle(starts)
+        for start in starts:
+            path = [start]
+            if extend(path, {start}):
+                return path
+
+        raise ValueError(
+            f"No Corsi sequence of length {length} satisfies min_path_distance="
+            f"{self.min_path_distance} on a {self.grid_rows}x{self.grid_cols} board"
+        )
+
+    def _next_sequence(self, length: int) -> List[int]:
+        pool = self.sequence_pool.get(length)
+        if pool:
+            return pool.pop()
+        return self._generate_sequence(length)
+
+    def get_experiment_type(self) -> ExperimentType:
+        return ExperimentType.CORSI
+
+    def get_instructions(self) -> List[Dict[str, Any]]:
+        """Return instruction screens based on direction mode."""
+        instructions = [
+            {
+                "type": "text",
+                "title": "Block Tapping Test",
+                "content": """
+                    <h2>Welcome to the Block Tapping Test</h2>
+                    <p>This test measures your memory for locations.</p>
+                    <p><strong>What you'll do:</strong></p>
+                    <ul>
+                        <li>Blocks will light up one at a time</li>
+                        <li>When they stop, tap the blocks you saw</li>
+                        <li>Sequences will get longer as you succeed</li>
+                    </ul>
+                """,
+                "duration_ms": None
+            }
+        ]
+
+        if self.direction == "backward" or self.direction == "both":
+            instructions.append({
+                "type": "text",
+                "title": "Backward Order",
+                "content": """
+                    <h3>Backward Order</h3>
+                    <p>In the backward part, tap the blocks in <strong>reverse order</strong>,
+                       starting with the last block that lit up.</p>
+                """,
+                "duration_ms": None
+            })
+
+        return instructions
+
+    def get_practice_trials(self) -> Optional[List[TrialData]]:
+        """One practice trial at an easy length."""
+        practice_length = max(2, self.starting_length)
+        return [self._generate_trial(practice_length, is_practice=True)]
+
+    def get_next_trial(self) -> Optional[TrialData]:
+        """Generate next trial based on adaptive staircase."""
+        if self.is_complete():
+            return None
+
+        self.current_trial_number += 1
+        return self._generate_trial(self.current_length, is_practice=False)
+
+    def _generate_trial(self, length: int, is_practice: bool) -> TrialData:
+        """Build a block-sequence trial from the prefetched pool."""
+        sequence = (self._generate_sequence(length) if is_practice
+                    else self._next_sequence(length))
+        expected = sequence if self.current_phase == "forward" else list(reversed(sequence))
+
+        return TrialData(
+            trial_number=self.current_trial_number,
+            trial_type="practice" if is_practice else "test",
+            stimulus_data={
+                "sequence": sequence,
+                "length": length,
+                "direction": self.current_phase,
+                "grid_rows": self.grid_rows,
+                "grid_cols": self.grid_cols,
+                "block_highlight_ms": self.block_highlight_ms,
+                "inter_block_interval_ms": self.inter_block_interval_ms
+            },
+            correct_response=",".join(map(str, expected)),
+            metadata={
+                "span_length": length,
+                "direction": self.current_phase,
+                "trials_at_length": self.trials_at_current_length
+            }
+        )
+
+    @staticmethod
+    def _parse_blocks(value: Any) -> List[int]:
+        """Accept "0,4,8", "0 4 8" or [0, 4, 8]."""
+        if isinstance(value, (list, tuple)):
+            return [int(v) for v in value]
+        text = str(value or "").replace(" ", ",")
+        return [int(v) for v in text.split(",") if v.strip().lstrip("-").isdigit()]
+
+    def record_response(self, response_data: ResponseData) -> Dict[str, Any]:
+        """Process tapped sequence and update adaptive state."""
+        self.trial_history.append(response_data)
+        metadata = response_data.metadata or {}
+
+        expected = metadata.get("correct_response")
+        if expected is not None:
+            correct = self._parse_blocks(response_data.response) == self._parse_blocks(expected)
+        else:
+            correct = bool(response_data.correct)
+        response_data.correct = correct
+
+        # Practice taps are scored but never move the staircase
+        if metadata.get("phase") == "practice":
+            return {"correct": correct, "feedback_message": None, "continue": True}
+
+        length = int(metadata.get("span_length", metadata.get("sequence_length", self.current_length)))
+        metadata.setdefault("span_length", length)
+        metadata.setdefault("direction", self.current_phase)
+
+        if correct:
+            self.correct_trials += 1
+            self.consecutive_failures = 0
+            self.max_span_achieved = max(self.max_span_achieved, length)
+            self.current_length += 1
+            self.trials_at_current_length = 0
+            feedback = f"✓ Correct! Moving to {self.current_length} blocks."
+        else:
+            self.trials_at_current_length += 1
+            if self.trials_at_current_length >= self.trials_per_length:
+                self.consecutive_failures += 1
+                self.current_length += 1
+                self.trials_at_current_length = 0
+                feedback = "That length was challenging. Let's try the next one."
+            else:
+                feedback = f"Not quite. You'll get another try at {self.current_length} blocks."
+
+        return {
+            "correct": correct,
+            "feedback_message": feedback if self.feedback_enabled else None,
+            "continue": not self.is_complete()
+        }
+
+    def is_complete(self) -> bool:
+        """Check stopping criteria."""
+        if self.current_length > self.max_length:
+            return self._check_phase_transition()
+
+        if self.consecutive_failures >= self.failure_threshold:
+            return self._check_phase_transition()
+
+        return False
+
+    def _check_phase_transition(self) -> bool:
+        """
+        For 'both' mode, transition from forward to backward.
+        Returns True if fully complete.
+        """
+        if self.direction == "both" and not self.forward_complete:
+            self.forward_complete = True
+            self.current_phase = "backward"
+            self.current_length = self.starting_length
+            self.trials_at_current_length = 0
+            self.consecutive_failures = 0
+            self.current_trial_number = 0
+            return False
+
+        return True
+
+    def get_results(self) -> Dict[str, Any]:
+        """Calculate Corsi span and total score."""
+        spans = {"forward": 0, "backward": 0}
+        correct_by_direction = {"forward": 0, "backward": 0}
+        accuracy_by_length: Dict[int, Dict[str, int]] = {}
+
+        for response in self.trial_history:
+            metadata = response.metadata or {}
+            if metadata.get("phase") == "practice":
+                continue
+            length = metadata.get("span_length", 0)
+            direction = metadata.get("direction", "forward")
+            bucket = accuracy_by_length.setdefault(length, {"correct": 0, "total": 0})
+            bucket["total"] += 1
+            if response.correct:
+                bucket["correct"] += 1
+                correct_by_direction[direction] = correct_by_direction.get(direction, 0) + 1
+                spans[direction] = max(spans.get(direction, 0), length)
+
+        results = {
+            "max_span_achieved": self.max_span_achieved,
+            "total_trials": sum(b["total"] for b in accuracy_by_length.values()),
+            "correct_trials": self.correct_trials,
+            "direction_mode": self.direction
+        }
+
+        for direction in ("forward", "backward"):
+            if self.direction in (direction, "both"):
+                results[f"{direction}_span"] = spans[direction]
+                # Kessels et al. (2000) total score: span x number of correct trials
+                results[f"{direction}_total_score"] = spans[direction] * correct_by_direction[direction]
+
+        results["accuracy_by_length"] = {
+            k: v["correct"] / v["total"] if v["total"] > 0 else 0
+            for k, v in sorted(accuracy_by_length.items())
+        }
+
+        return results
+
+    def get_default_configuration(self) -> Dict[str, Any]:
+        """Default settings for Corsi."""
+        return {
+            "direction": "forward",
+            "starting_length": 2,
+            "max_length": 9,
+            "trials_per_length": 2,
+            "failure_threshold": 2,
+            "grid_rows": 3,
+            "grid_cols": 3,
+            "min_path_distance": DEFAULT_MIN_PATH_DISTANCE,
+            "allow_repeats": False,
+            "pool_per_length": 6,
+            "block_highlight_ms": 600,
+            "inter_block_interval_ms": 260,
+            "feedback_enabled": True
+        }
+
+    def get_configuration_schema(self) -> Dict[str, Any]:
+        """Configuration options for experimenter GUI."""
+        return {
+            "basic": {
+                "direction": {
+                    "type": "select",
+                    "label": "Direction",
+                    "options": [
+                        {"value": "forward", "label": "Forward Only"},
+                        {"value": "backward", "label": "Backward Only"},
+                        {"value": "both", "label": "Both (Forward then Backward)"}
+                    ],
+                    "default": "forward",
+                    "description": "Order in which blocks should be tapped"
+                },
+                "starting_length": {
+                    "type": "number",
+                    "label": "Starting Sequence Length",
+                    "default": 2,
+                    "min": 2,
+                    "max": 6,
+                    "description": "Number of blocks in first trial"
+                },
+                "feedback_enabled": {
+                    "type": "boolean",
+                    "label": "Show Feedback",
+                    "default": True,
+                    "description": "Tell participants if they were correct"
+                }
+            },
+            "advanced": {
+                "max_length": {
+                    "type": "number",
+                    "label": "Maximum Sequence Length",
+                    "default": 9,
+                    "min": 4,
+                    "max": 16,
+                    "description": "Stop test if this length reached (capped at number of blocks)"
+                },
+                "trials_per_length": {
+                    "type": "number",
+                    "label": "Trials Per Length",
+                    "default": 2,
+                    "min": 1,
+                    "max": 3,
+                    "description": "How many attempts at each sequence length"
+                },
+                "failure_threshold": {
+                    "type": "number",
+                    "label": "Consecutive Failures to Stop",
+                    "default": 2,
+                    "min": 1,
+                    "max": 3,
+                    "description": "Stop after this many failed lengths in a row"
+                },
+                "grid_rows": {
+                    "type": "number",
+                    "label": "Board Rows",
+                    "default": 3,
+                    "min": 2,
+                    "max": 5,
+                    "description": "Rows of blocks on the board"
+                },
+                "grid_cols": {
+                    "type": "number",
+                    "label": "Board Columns",
+                    "default": 3,
+                    "min": 2,
+                    "max": 5,
+                    "description": "Columns of blocks on the board"
+                },
+                "min_path_distance": {
+                    "type": "number",
+                    "label": "Minimum Path Distance (blocks)",
+                    "default": DEFAULT_MIN_PATH_DISTANCE,
+                    "min": 1.0,
+                    "max": 3.0,
+                    "step": 0.1,
+                    "description": "Minimum distance between consecutive blocks in a sequence"
+                },
+                "block_highlight_ms": {
+                    "type": "number",
+                    "label": "Block Highlight Time (ms)",
+                    "default": 600,
+                    "min": 300,
+                    "max": 2000,
+                    "step": 100,
+                    "description": "How long each block lights up"
+                },
+                "inter_block_interval_ms": {
+                    "type": "number",
+                    "label": "Gap Between Blocks (ms)",
+                    "default": 260,
+                    "min": 0,
+                    "max": 1000,
+                    "step": 20,
+                    "description": "Pause between highlights"
+                }
+            }
+        }
@@ -13,14 +13,18 @@ METHOD: Adaptive staircase procedure
     - If correct: increase length by 1
     - If incorrect: repeat same length (max 2 attempts)
     - Stop after 2 consecutive failures at same length
+    - Optional: adaptive_procedure = "quest_plus" | "weighted_up_down" |
+      "pest" replaces the rule above with a procedure from
+      backend/experiments/adaptive.py over lengths starting_length ..
+      max_length; the threshold estimate is reported as span_estimate
 
 TYPICAL PARADIGM (from Wechsler Adult Intelligence Scale):
     - Forward span: Recall in same order
     - Backward span: Recall in reverse order
     - Scoring: Longest sequence correctly recalled
 
-VERSION: 3.0.0
-LAST MODIFIED: 2025-11-05
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
 
 REFERENCES:
     Wechsler, D. (2008). Wechsler Adult Intelligence Scale (4th ed.). 
@@ -34,6 +38,7 @@ import random
 from .base_experiment import (
     BaseExperiment, ExperimentType, TrialData, ResponseData
 )
+from .adaptive import AdaptiveProcedure, create_procedure
 
 
 class DigitSpanExperiment(BaseExperiment):
@@ -48,6 +53,9 @@ class DigitSpanExperiment(BaseExperiment):
     - max_length: Stop if this length reached (default 12)
     - trials_per_length: Attempts at each length (default 2)
     - failure_threshold: Consecutive failures to stop (default 2)
+    - adaptive_procedure: "staircase" (rule above, default) | "quest_plus" |
+      "weighted_up_down" | "pest"
+    - adaptive_max_trials: Trials per direction for adaptive procedures (default 20)
     """
     
     def configure(self, config: Dict[str, Any]) -> None:
@@ -64,6 +72,12 @@ class DigitSpanExperiment(BaseExperiment):
         self.inter_digit_interval_ms = config.get("inter_digit_interval_ms", 200)
         self.feedback_enabled = config.get("feedback_enabled", True)
         
+        # Adaptive procedure ("staircase" = classic rule above)
+        self.adaptive_procedure = config.get("adaptive_procedure", "staircase")
+        self.adaptive_max_trials = int(config.get("adaptive_max_trials", 20))
+        self.procedure: Optional[AdaptiveProcedure] = None
+        self.procedure_summaries: Dict[str, Dict[str, Any]] = {}
+        
         # State tracking
         self.current_length = self.starting_length
         self.trials_at_current_length = 0
@@ -73,6 +87,19 @@ class DigitSpanExperiment(BaseExperiment):
         # For "both" direction mode
         self.current_phase = "forward" if self.direction == "both" else self.direction
         self.forward_complete = False
+        self.procedure = self._new_procedure()
+    
+    def _new_procedure(self) -> Optional[AdaptiveProcedure]:
+        """Procedure for the current phase, or None for the classic staircase."""
+        if self.adaptive_procedure in (None, "", "staircase"):
+            return None
+        return create_procedure(
+            self.adaptive_procedure,
+            levels=range(self.starting_length, self.max_length + 1),
+            higher_is_harder=True,
+            max_trials=self.adaptive_max_trials,
+            start=self.starting_length
+        )
     
     def get_experiment_type(self) -> ExperimentType:
         return ExperimentType.DIGIT_SPAN
@@ -164,12 +191,18 @@ class DigitSpanExperiment(BaseExperiment):
             return None
         
         self.current_trial_number += 1
+        if self.procedure is not None:
+            self.current_length = int(self.procedure.next_level())
         return self._generate_trial(self.current_length, is_practice=False)
     
     def _generate_trial(self, length: int, is_practice: bool) -> TrialData:
         """Generate a digit sequence trial."""
-        # Generate random digits (0-9, no repeats within sequence)
-        digits = random.sample(range(10), length)
+        # Generate random digits (0-9, no repeats within sequence while
+        # there are enough distinct digits; longer spans must repeat some)
+        if length <= 10:
+            digits = random.sample(range(10), length)
+        else:
+            digits = random.choices(range(10), k=length)
         
         # Determine correct response based on direction
         if self.current_phase == "forward":
@@ -201,6 +234,9 @@ class DigitSpanExperiment(BaseExperiment):
         # Check correctness
         correct = response_data.correct
         
+        if self.procedure is not None:
+            return self._record_adaptive(response_data, bool(correct))
+        
         # Update state based on correctness
         if correct:
             self.consecutive_failures = 0
@@ -230,8 +266,31 @@ class DigitSpanExperiment(BaseExperiment):
             "continue": not self.is_complete()
         }
     
+    def _record_adaptive(self, response_data: ResponseData, correct: bool) -> Dict[str, Any]:
+        """Feed the response to the adaptive procedure at the length actually shown."""
+        metadata = response_data.metadata or {}
+        length = int(metadata.get("span_length") or self.current_length)
+        if metadata.get("phase") != "practice":
+            self.procedure.update(length, correct)
+        if correct:
+            self.max_span_achieved = max(self.max_span_achieved, length)
+            feedback = "✓ Correct!"
+        else:
+            feedback = "Not quite."
+        
+        return {
+            "correct": correct,
+            "feedback_message": feedback if self.feedback_enabled else None,
+            "continue": not self.is_complete()
+        }
+    
     def is_complete(self) -> bool:
         """Check stopping criteria."""
+        if self.procedure is not None:
+            if self.procedure.is_finished():
+                return self._check_phase_transition()
+            return False
+        
         # Stop if max length reached
         if self.current_length > self.max_length:
             return self._check_phase_transition()
@@ -251,6 +310,9 @@ class DigitSpanExperiment(BaseExperiment):
         For 'both' mode, transition from forward to backward.
         Returns True if fully complete.
         """
+        if self.procedure is not None:
+            self.procedure_summaries[self.current_phase] = self.procedure.summary()
+        
         if self.direction == "both" and not self.forward_complete:
             # Transition to backward phase
             self.forward_complete = True
@@ -259,6 +321,7 @@ class DigitSpanExperiment(BaseExperiment):
             self.trials_at_current_length = 0
             self.consecutive_failures = 0
             self.current_trial_number = 0
+            self.procedure = self._new_procedure()
             return False  # Continue with backward
         
         return True  # Fully complete
@@ -310,6 +373,16 @@ class DigitSpanExperiment(BaseExperiment):
             for k, v in accuracy_by_length.items()
         }
         
+        if self.procedure is not None:
+            summaries = dict(self.procedure_summaries)
+            summaries.setdefault(self.current_phase, self.procedure.summary())
+            results["adaptive_procedure"] = self.adaptive_procedure
+            results["adaptive"] = summaries
+            for phase, summary in summaries.items():
+                results[f"{phase}_span_estimate"] = summary["estimate"]
+            if len(summaries) == 1:
+                results["span_estimate"] = next(iter(summaries.values()))["estimate"]
+        
         return results
     
     def get_default_configuration(self) -> Dict[str, Any]:
@@ -322,7 +395,9 @@ class DigitSpanExperiment(BaseExperiment):
             "failure_threshold": 2,
             "digit_display_time_ms": 1000,
             "inter_digit_interval_ms": 200,
-            "feedback_enabled": True
+            "feedback_enabled": True,
+            "adaptive_procedure": "staircase",
+            "adaptive_max_trials": 20
         }
     
     def get_configuration_schema(self) -> Dict[str, Any]:
@@ -397,6 +472,26 @@ class DigitSpanExperiment(BaseExperiment):
                     "max": 500,
                     "step": 50,
                     "description": "Pause between digits"
+                },
+                "adaptive_procedure": {
+                    "type": "select",
+                    "label": "Adaptive Procedure",
+                    "options": [
+                        {"value": "staircase", "label": "Classic Staircase"},
+                        {"value": "quest_plus", "label": "QUEST+ (Bayesian)"},
+                        {"value": "weighted_up_down", "label": "Weighted Up-Down"},
+                        {"value": "pest", "label": "PEST"}
+                    ],
+                    "default": "staircase",
+                    "description": "How sequence length adapts to performance"
+                },
+                "adaptive_max_trials": {
+                    "type": "number",
+                    "label": "Adaptive Trials Per Direction",
+                    "default": 20,
+                    "min": 8,
+                    "max": 60,
+                    "description": "Trial budget for QUEST+ / Weighted Up-Down / PEST"
                 }
             }
         }
@@ -21,8 +21,23 @@ TYPICAL PARADIGM (from Robertson et al., 1997):
     - Target digit "3" (25 occurrences, 11%)
     - Digits vary in size/font to prevent habituation
 
-VERSION: 3.0.0
-LAST MODIFIED: 2025-11-05
+ADAPTIVE PACING (optional, pacing_procedure):
+    - A procedure from backend/experiments/adaptive.py sets the mask and
+      response window of each trial between pacing_min_ms and
+      mask_duration_ms; a trial succeeds when it is answered correctly
+    - The pace the procedure converges on is reported as pacing_estimate_ms
+
+BLOCK PROTOCOL (fixed pacing only):
+    - get_trial_block() serves block_size trials at once: the timing values
+      in "header", digit / is_target / font_size / correct_response as
+      parallel "columns" (also in the binary encoding of backend/wire.py)
+    - record_response_block() takes the responses back as columns:
+        {"trial_number": [...], "response_value": ["space" | "", ...],
+         "response_time_ms": [...]}
+      and scores them exactly like record_response()
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
 
 REFERENCES:
     Robertson, I. H., Manly, T., Andrade, J., Baddeley, B. T., & Yiend, J. (1997).
@@ -39,6 +54,7 @@ import random
 from .base_experiment import (
     BaseExperiment, ExperimentType, TrialData, ResponseData
 )
+from .adaptive import AdaptiveProcedure, create_procedure
 
 
 class SARTExperiment(BaseExperiment):
@@ -53,6 +69,10 @@ class SARTExperiment(BaseExperiment):
     - mask_duration_ms: Blank/mask duration (default 900)
     - response_window_ms: Time allowed for response (default 900)
     - vary_font_size: Randomize digit size (default True)
+    - pacing_procedure: None | "quest_plus" | "weighted_up_down" | "pest"
+    - pacing_min_ms: Fastest mask/response window for adaptive pacing (default 400)
+    - pacing_target: Target accuracy for up-down / PEST pacing (default 0.8)
+    - block_size: Trials per block for block delivery (default 25)
     """
     
     def configure(self, config: Dict[str, Any]) -> None:
@@ -71,10 +91,30 @@ class SARTExperiment(BaseExperiment):
         self.vary_font_size = config.get("vary_font_size", True)
         self.font_sizes = config.get("font_sizes", [48, 72, 94, 100, 120])
         self.feedback_on_errors = config.get("feedback_on_errors", False)
+        self.block_size = max(1, int(config.get("block_size", 25)))
+        
+        # Adaptive pacing (faster = harder)
+        self.pacing: Optional[AdaptiveProcedure] = None
+        pacing_procedure = config.get("pacing_procedure")
+        if pacing_procedure and pacing_procedure != "none":
+            slowest = int(self.mask_duration_ms)
+            fastest = min(int(config.get("pacing_min_ms", 400)), slowest - 50)
+            options = ({"guess_rate": 0.5} if pacing_procedure == "quest_plus"
+                       else {"target": float(config.get("pacing_target", 0.8))})
+            self.pacing = create_procedure(
+                pacing_procedure,
+                levels=range(fastest, slowest + 1, 50),
+                higher_is_harder=False,
+                max_trials=int(self.total_trials),
+                start=slowest,
+                **options
+            )
         
         # Pre-generate trial sequence for consistency
         self.trial_sequence = self._generate_trial_sequence()
         self.trials_completed = 0
+        self.blocks_served = 0
+        self.block_recorded = set()
         
         # Performance tracking
         self.commission_errors = 0  # Responded to target (false alarm)
@@ -268,6 +308,11 @@ class SARTExperiment(BaseExperiment):
         self.trials_completed += 1
         self.current_trial_number = self.trials_completed
         
+        mask_duration_ms = self.mask_duration_ms
+        response_window_ms = self.response_window_ms
+        if self.pacing is not None:
+            mask_duration_ms = response_window_ms = int(self.pacing.next_level())
+        
         return TrialData(
             trial_number=self.current_trial_number,
             trial_type="test",
@@ -276,13 +321,14 @@ class SARTExperiment(BaseExperiment):
                 "is_target": trial_info["is_target"],
                 "font_size": trial_info["font_size"],
                 "digit_display_ms": self.digit_display_ms,
-                "mask_duration_ms": self.mask_duration_ms,
-                "response_window_ms": self.response_window_ms
+                "mask_duration_ms": mask_duration_ms,
+                "response_window_ms": response_window_ms
             },
             correct_response=trial_info["correct_response"],
             metadata={
                 "trial_number": self.current_trial_number,
-                "is_target": trial_info["is_target"]
+                "is_target": trial_info["is_target"],
+                "mask_duration_ms": mask_duration_ms
             }
         )
     
@@ -315,6 +361,10 @@ class SARTExperiment(BaseExperiment):
                 feedback = "✗ You should have responded."
                 correct = False
         
+        pace = response_data.metadata.get("mask_duration_ms")
+        if self.pacing is not None and pace and response_data.metadata.get("phase") != "practice":
+            self.pacing.update(float(pace), correct)
+        
         # Only show feedback if enabled
         show_feedback = self.feedback_on_errors and not correct
         
@@ -324,6 +374,76 @@ class SARTExperiment(BaseExperiment):
             "continue": not self.is_complete()
         }
     
+    def get_trial_block(self) -> Optional[Dict[str, Any]]:
+        """Serve the next block_size trials in one payload (not with adaptive pacing)."""
+        if self.pacing is not None or self.trials_completed >= len(self.trial_sequence):
+            return None
+        
+        start = self.trials_completed
+        stop = min(start + self.block_size, len(self.trial_sequence))
+        trials = self.trial_sequence[start:stop]
+        self.trials_completed = self.current_trial_number = stop
+        self.blocks_served += 1
+        
+        return {
+            "block_number": self.blocks_served,
+            "header": {
+                "digit_display_ms": self.digit_display_ms,
+                "mask_duration_ms": self.mask_duration_ms,
+                "response_window_ms": self.response_window_ms
+            },
+            "columns": {
+                "trial_number": list(range(start + 1, stop + 1)),
+                "digit": [t["digit"] for t in trials],
+                "is_target": [t["is_target"] for t in trials],
+                "font_size": [t["font_size"] for t in trials],
+                "correct_response": [t["correct_response"] for t in trials]
+            }
+        }
+    
+    def record_response_block(self, block: Dict[str, Any]) -> Dict[str, Any]:
+        """Score a block of column-encoded responses trial by trial."""
+        try:
+            numbers = [int(n) for n in block["trial_number"]]
+            values = ["" if v is None else str(v) for v in block["response_value"]]
+            rts = [0.0 if v is None else float(v) for v in block["response_time_ms"]]
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Malformed response block: {e}")
+        
+        if not (len(numbers) == len(values) == len(rts)) or not numbers:
+            raise ValueError("Response block columns must be non-empty and equal length")
+        if any(n < 1 or n > self.trials_completed for n in numbers):
+            raise ValueError("Response block contains trials that were not served")
+        if len(set(numbers)) != len(numbers) or self.block_recorded.intersection(numbers):
+            raise ValueError("Response block contains duplicate trial numbers")
+        self.block_recorded.update(numbers)
+        
+        trials = []
+        for number, value, rt in zip(numbers, values, rts):
+            feedback = self.record_response(ResponseData(
+                trial_number=number,
+                response=value,
+                response_time_ms=rt,
+                metadata={"is_target": self.trial_sequence[number - 1]["is_target"]}
+            ))
+            trials.append({
+                "trial_number": number,
+                "response_value": value,
+                "response_time_ms": rt,
+                "correct": feedback["correct"],
+                "flags": []
+            })
+        
+        return {
+            "trials": trials,
+            "summary": {
+                "recorded": len(trials),
+                "correct": sum(t["correct"] for t in trials),
+                "commission_errors": self.commission_errors,
+                "omission_errors": self.omission_errors
+            }
+        }
+    
     def is_complete(self) -> bool:
         """Check if all trials completed."""
         return self.trials_completed >= self.total_trials
@@ -348,7 +468,7 @@ class SARTExperiment(BaseExperiment):
             std_rt = 0
             cv_rt = 0
         
-        return {
+        results = {
             "commission_errors": self.commission_errors,
             "commission_error_rate": round(commission_error_rate, 2),
             "omission_errors": self.omission_errors,
@@ -361,6 +481,12 @@ class SARTExperiment(BaseExperiment):
             "cv_reaction_time": round(cv_rt, 3),
             "interpretation": self._interpret_results(commission_error_rate, cv_rt)
         }
+        
+        if self.pacing is not None:
+            results["pacing_estimate_ms"] = round(self.pacing.estimate(), 1)
+            results["adaptive"] = self.pacing.summary()
+        
+        return results
     
     def _interpret_results(self, commission_rate: float, cv_rt: float) -> Dict[str, str]:
         """Provide interpretation of SART results."""
@@ -394,7 +520,11 @@ class SARTExperiment(BaseExperiment):
             "response_window_ms": 900,
             "vary_font_size": True,
             "font_sizes": [48, 72, 94, 100, 120],
-            "feedback_on_errors": False
+            "feedback_on_errors": False,
+            "pacing_procedure": "none",
+            "pacing_min_ms": 400,
+            "pacing_target": 0.8,
+            "block_size": 25
         }
     
     def get_configuration_schema(self) -> Dict[str, Any]:
@@ -467,6 +597,45 @@ class SARTExperiment(BaseExperiment):
                     "label": "Vary Font Size",
                     "default": True,
                     "description": "Randomize digit size to prevent habituation"
+                },
+                "pacing_procedure": {
+                    "type": "select",
+                    "label": "Adaptive Pacing",
+                    "options": [
+                        {"value": "none", "label": "Off (fixed pace)"},
+                        {"value": "quest_plus", "label": "QUEST+ (Bayesian)"},
+                        {"value": "weighted_up_down", "label": "Weighted Up-Down"},
+                        {"value": "pest", "label": "PEST"}
+                    ],
+                    "default": "none",
+                    "description": "Shorten the mask/response window as performance allows"
+                },
+                "pacing_min_ms": {
+                    "type": "number",
+                    "label": "Fastest Pace (ms)",
+                    "default": 400,
+                    "min": 200,
+                    "max": 900,
+                    "step": 50,
+                    "description": "Shortest mask/response window adaptive pacing may use"
+                },
+                "pacing_target": {
+                    "type": "number",
+                    "label": "Pacing Target Accuracy",
+                    "default": 0.8,
+                    "min": 0.5,
+                    "max": 0.95,
+                    "step": 0.05,
+                    "description": "Accuracy that Weighted Up-Down / PEST pacing converges on"
+                },
+                "block_size": {
+                    "type": "number",
+                    "label": "Trials per Block",
+                    "default": 25,
+                    "min": 5,
+                    "max": 225,
+                    "step": 5,
+                    "description": "Trials delivered at once when the client runs blocks (fixed pacing only)"
                 }
             }
         }
@@ -1,12 +1,12 @@
 
-from .base_experiment import BaseExperiment, ExperimentType
+from .base_experiment import BaseExperiment, ExperimentType, ResponseData
+from .adaptive import AdaptiveProcedure, create_procedure
 from typing import Dict, Any, Optional, List
 import random
 
 class StroopExperiment(BaseExperiment):
-    """Stroop: report INK color via r/g/b/y."""
-    def __init__(self):
-        super().__init__()
+    """Stroop: report INK color via r/g/b/y. Optional adaptive response deadline (deadline_procedure)."""
+    def __init__(self, experiment_id: str, configuration: Dict[str, Any]):
         self.colors = ["RED","GREEN","BLUE","YELLOW"]
         self.ink_colors = ["red","green","blue","yellow"]
         self.keymap = {"red":"r","green":"g","blue":"b","yellow":"y"}
@@ -16,6 +16,8 @@ class StroopExperiment(BaseExperiment):
         self.trials: List[Dict[str,Any]] = []
         self.correct_count = 0
         self.rt_sum = 0.0
+        self.deadline: Optional[AdaptiveProcedure] = None
+        super().__init__(experiment_id, configuration)
 
     def get_experiment_type(self):
         return ExperimentType("stroop") if not hasattr(ExperimentType,"STROOP") else ExperimentType.STROOP
@@ -26,6 +28,13 @@ class StroopExperiment(BaseExperiment):
         km = config.get("keymap")
         if isinstance(km, dict):
             self.keymap = {k.lower(): str(v) for k,v in km.items()}
+        # Adaptive deadline: a trial succeeds if correct within the deadline
+        name = config.get("deadline_procedure")
+        if name and name != "none":
+            lo = int(config.get("deadline_min_ms", 300)); hi = int(config.get("deadline_max_ms", 2000))
+            options = {"guess_rate": 1.0/len(self.ink_colors)} if name == "quest_plus" else {"target": float(config.get("deadline_target", 0.75))}
+            self.deadline = create_procedure(name, levels=range(lo, hi+1, 50), higher_is_harder=False,
+                                             max_trials=self.total_trials, start=hi, **options)
         self._generate_trials()
 
     def _generate_trials(self):
@@ -56,29 +65,42 @@ class StroopExperiment(BaseExperiment):
         t["trial_number"] = self.trial_index + 1
         expected = self.keymap.get(t["ink_color"], None)
         self.trial_index += 1
-        return {
+        trial = {
             "trial_number": t["trial_number"],
             "trial_type": "test",
             "stimulus_data": {"word": t["word"], "ink_color": t["ink_color"]},
             "correct_response": expected,
             "metadata": {"congruent": t["congruent"]}
         }
+        if self.deadline is not None:
+            deadline = int(self.deadline.next_level())
+            trial["stimulus_data"]["response_deadline_ms"] = deadline
+            trial["metadata"]["response_deadline_ms"] = deadline
+        return trial
 
-    def record_response(self, response_data: Dict[str,Any]):
-        key = str(response_data.get("response_value",""))
-        rt = float(response_data.get("response_time_ms",0))
-        expected = str(response_data.get("correct_response",""))
+    def record_response(self, response_data: ResponseData):
+        self.trial_history.append(response_data)
+        key = str(response_data.response or "")
+        rt = float(response_data.response_time_ms or 0)
+        expected = str((response_data.metadata or {}).get("correct_response",""))
         correct = (key.lower() == expected.lower())
         if correct: self.correct_count += 1
         if rt>0: self.rt_sum += rt
+        deadline = (response_data.metadata or {}).get("response_deadline_ms")
+        if self.deadline is not None and deadline:
+            self.deadline.update(float(deadline), correct and 0 < rt <= float(deadline))
         return {"correct": correct, "feedback_message": "Correct" if correct else "Incorrect"}
 
     def is_complete(self) -> bool:
         return self.trial_index >= len(self.trials)
 
     def get_results(self) -> Dict[str,Any]:
-        n = max(1, self.trial_index)
-        return {"accuracy": self.correct_count/float(n), "mean_rt_ms": (self.rt_sum/float(n))}
+        n = max(1, len(self.trial_history))
+        results = {"accuracy": self.correct_count/float(n), "mean_rt_ms": (self.rt_sum/float(n))}
+        if self.deadline is not None:
+            results["deadline_estimate_ms"] = round(self.deadline.estimate(), 1)
+            results["adaptive"] = self.deadline.summary()
+        return results
 
     def get_configuration_schema(self) -> Dict[str,Any]:
         return {
@@ -87,6 +109,12 @@ class StroopExperiment(BaseExperiment):
                 "congruent_ratio": {"type":"number","label":"Congruent Ratio (0-1)","default":0.5,"min":0.0,"max":1.0,"step":0.1}
             },
             "advanced": {
-                "keymap": {"type":"string","label":"Keymap JSON (color->key)","default":"{\"red\":\"r\",\"green\":\"g\",\"blue\":\"b\",\"yellow\":\"y\"}"}
+                "keymap": {"type":"string","label":"Keymap JSON (color->key)","default":"{\"red\":\"r\",\"green\":\"g\",\"blue\":\"b\",\"yellow\":\"y\"}"},
+                "deadline_procedure": {"type":"select","label":"Adaptive Response Deadline","default":"none",
+                                       "options":[{"value":"none","label":"Off"},{"value":"quest_plus","label":"QUEST+"},
+                                                  {"value":"weighted_up_down","label":"Weighted Up-Down"},{"value":"pest","label":"PEST"}]},
+                "deadline_min_ms": {"type":"number","label":"Shortest Deadline (ms)","default":300,"min":100,"max":1000,"step":50},
+                "deadline_max_ms": {"type":"number","label":"Longest Deadline (ms)","default":2000,"min":500,"max":5000,"step":50},
+                "deadline_target": {"type":"number","label":"Target Accuracy (Up-Down / PEST)","default":0.75,"min":0.5,"max":0.95,"step":0.05}
             }
         }
@@ -0,0 +1,165 @@
+"""
+FILE: backend/experiments/table_cache.py
+DIRECTORY: /backend/experiments/
+
+FUNCTIONAL ROLE: Process-wide cache of the precomputed prior / likelihood
+                  grids used by adaptive procedures. Every participant of a
+                  study uses the same grids, so they are built once, written
+                  to disk and memory-mapped read-only by every process.
+
+METHOD: Content-keyed .npy files + np.load(mmap_mode="r")
+    - Key = SHA-256 of (procedure, parameter grid, config) serialised as
+      canonical JSON, plus FORMAT_VERSION
+    - Each entry is a directory <key>/ holding one .npy per table. It is
+      written to a temporary directory and renamed into place, so readers
+      never see a partial entry and concurrent builders cannot corrupt it
+      (the loser of the rename race discards its copy)
+    - Loaded tables are read-only memory maps: pages live once in the OS
+      page cache and are shared by every worker process; within a process
+      the mapping is reused (no allocation per session)
+    - If the directory is not writable the tables are kept in memory for
+      this process only
+
+CONFIGURATION:
+    Directory: set_directory(path), else $ADAPTIVE_TABLE_CACHE, else
+    <tempdir>/experiment_maker_tables.
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, Callable, Optional
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout or meaning of stored tables changes
+FORMAT_VERSION = 1
+
+Tables = Dict[str, np.ndarray]
+
+_lock = threading.Lock()
+_tables: Dict[str, Tables] = {}
+_directory: Optional[Path] = None
+_stats = {"hits": 0, "loads": 0, "builds": 0}
+
+
+def set_directory(path: os.PathLike) -> None:
+    """Use `path` for cache files (call before the first procedure is built)."""
+    global _directory
+    _directory = Path(path)
+
+
+def cache_directory() -> Path:
+    if _directory is not None:
+        return _directory
+    env = os.environ.get("ADAPTIVE_TABLE_CACHE")
+    return Path(env) if env else Path(tempfile.gettempdir()) / "experiment_maker_tables"
+
+
+def _canonical(value: Any) -> Any:
+    """JSON-safe, order-stable form of a key component (arrays rounded to 1e-9)."""
+    if isinstance(value, np.ndarray):
+        return np.round(value.astype(np.float64), 9).tolist()
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items())}
+    if isinstance(value, (np.floating, float)):
+        return round(float(value), 9)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def cache_key(procedure: str, spec: Dict[str, Any]) -> str:
+    """Content key of a (procedure, parameter grid, config) combination."""
+    payload = json.dumps({"format": FORMAT_VERSION, "procedure": procedure, "spec": _canonical(spec)},
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _read_only(tables: Tables) -> Tables:
+    for array in tables.values():
+        array.flags.writeable = False
+    return tables
+
+
+def _load(entry: Path) -> Optional[Tables]:
+    if not entry.is_dir():
+        return None
+    tables = {
+        path.stem: np.load(path, mmap_mode="r").view(np.ndarray)
+        for path in entry.glob("*.npy")
+    }
+    return tables or None
+
+
+def _store(entry: Path, tables: Tables) -> None:
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{entry.name[:16]}-", dir=entry.parent))
+    try:
+        for name, array in tables.items():
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(array))
+        os.rename(staging, entry)
+    except OSError:
+        # Another process published the entry first (or the rename failed); keep theirs
+        shutil.rmtree(staging, ignore_errors=True)
+        if not entry.is_dir():
+            raise
+
+
+def get_tables(procedure: str, spec: Dict[str, Any], builder: Callable[[], Tables]) -> Tables:
+    """
+    Read-only tables for `spec`: from this process, else the disk cache,
+    else built with `builder()` and published to the disk cache.
+    """
+    key = cache_key(procedure, spec)
+    tables = _tables.get(key)
+    if tables is not None:
+        _stats["hits"] += 1
+        return tables
+
+    with _lock:
+        tables = _tables.get(key)
+        if tables is not None:
+            _stats["hits"] += 1
+            return tables
+
+        entry = cache_directory() / key
+        tables = _load(entry)
+        if tables is not None:
+            _stats["loads"] += 1
+        else:
+            built = builder()
+            _stats["builds"] += 1
+            try:
+                _store(entry, built)
+                tables = _load(entry)
+            except OSError as e:
+                logger.warning(f"Adaptive table cache not writable ({entry.parent}): {e}; keeping tables in memory")
+            if tables is None:
+                tables = built
+        tables = _read_only(tables)
+        _tables[key] = tables
+        return tables
+
+
+def stats() -> Dict[str, int]:
+    """Counters since start: in-process hits, disk loads (mmap), builds."""
+    return {**_stats, "entries": len(_tables)}
+
+
+def clear() -> None:
+    """Drop this process's mappings (files on disk are kept)."""
+    with _lock:
+        _tables.clear()
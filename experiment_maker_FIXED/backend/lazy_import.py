@@ -0,0 +1,45 @@
+"""
+FILE: backend/lazy_import.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Deferred imports for modules that are expensive to load
+                  (numpy-backed scoring, engines) but not needed to boot a
+                  worker. Keeps them off the import path of app_FIXED.
+
+METHOD: Module proxy
+    - LazyModule("backend.analytics") behaves like the module for attribute
+      access; the real import happens on the first attribute lookup and is
+      cached. importlib's per-module import lock makes the first access
+      safe from concurrent request threads
+    - Only attribute access is proxied: use `module.name`, not
+      `from module import name`, for lazily imported modules
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from types import ModuleType
+from typing import Any, Optional
+import importlib
+
+
+class LazyModule:
+    """Stand-in for a module, imported on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        # Only reached for attributes the proxy itself does not have
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
@@ -0,0 +1,286 @@
+"""
+FILE: backend/presets.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Named experiment configuration presets. A preset is
+                  validated against the engine's configuration schema once,
+                  when it is loaded, then normalized and content-hashed;
+                  sessions started from a preset store its hash instead of
+                  a private copy of the config.
+
+METHOD: Content-addressed versions, hot reload from a directory
+    - One JSON file per preset in Config.PRESET_DIR:
+        {"name": ..., "experiment_type": ..., "config": {...}}
+      (name defaults to the file stem)
+    - validate(): schema fields are type / range / option checked and
+      coerced ("25" -> 25, "true" -> True), keymap JSON strings are parsed;
+      other keys must be engine defaults with a value of the same type.
+      The engine is then configured once with the result
+    - Preset.hash: SHA-256 of the canonical JSON of type + config (16 hex
+      chars, like battery keys). Every edit gets a new hash; old versions
+      stay resolvable so stored sessions keep their exact config
+    - PresetRegistry.get() re-stats the directory at most once per check
+      interval and reloads only changed files. A file that fails
+      validation is reported in errors and its previous version stays
+      active - no restart needed
+    - Sessions: sessions.preset_hash -> config_presets.hash;
+      sessions.config_json holds only per-session overrides (e.g. a
+      counterbalancing condition), usually "{}". session_config() rebuilds
+      the full config
+
+TABLES (created in app_FIXED.init_db):
+    config_presets(hash, name, experiment_type, config_json, created_at)
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass
+from pathlib import Path
+import datetime
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from .engines import EXPERIMENT_ENGINES, create_experiment
+
+logger = logging.getLogger(__name__)
+
+
+# Config keys every engine accepts on top of its own options
+GENERIC_KEYS = ("counterbalance",)
+
+HASH_LENGTH = 16
+
+
+@dataclass(frozen=True)
+class Preset:
+    """One immutable version of a named config."""
+    name: str
+    experiment_type: str
+    config_json: str  # canonical: sorted keys, compact separators
+    hash: str
+
+    def config(self) -> Dict[str, Any]:
+        """Fresh copy of the normalized config (engines may modify theirs)."""
+        return json.loads(self.config_json)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "experiment_type": self.experiment_type,
+                "hash": self.hash, "config": self.config()}
+
+
+def _schema_fields(schema: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    return {
+        name: spec
+        for group in schema.values() if isinstance(group, dict)
+        for name, spec in group.items() if isinstance(spec, dict)
+    }
+
+
+def _number(name: str, value: Any, spec: Dict[str, Any]) -> Any:
+    default = spec.get("default")
+    if value is None and default is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        raise ValueError(f"{name} must be a number")
+    if ("min" in spec and value < spec["min"]) or ("max" in spec and value > spec["max"]):
+        raise ValueError(f"{name} must be between {spec.get('min')} and {spec.get('max')}")
+    if isinstance(value, float) and value.is_integer() and type(default) is int:
+        value = int(value)
+    return value
+
+
+def _field(name: str, value: Any, spec: Dict[str, Any]) -> Any:
+    kind = spec.get("type")
+    if kind == "number":
+        return _number(name, value, spec)
+    if kind == "boolean":
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        if value in (0, 1) and not isinstance(value, float):
+            return bool(value)
+        raise ValueError(f"{name} must be true or false")
+    if kind == "select":
+        allowed = [option.get("value") for option in spec.get("options", [])]
+        if value not in allowed:
+            raise ValueError(f"{name} must be one of {', '.join(map(str, allowed))}")
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be a string")
+    return value
+
+
+def validate(experiment_type: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Checked and normalized copy of `config`; raises ValueError."""
+    if experiment_type not in EXPERIMENT_ENGINES:
+        raise ValueError(f"Unknown experiment type: {experiment_type}")
+    if not isinstance(config, dict):
+        raise ValueError("Preset config must be an object")
+
+    probe = create_experiment(experiment_type, "preset", {})
+    fields = _schema_fields(probe.get_configuration_schema())
+    defaults = probe.get_default_configuration()
+
+    normalized = {}
+    for name, value in config.items():
+        if name == "keymap":
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except json.JSONDecodeError:
+                    raise ValueError("keymap must be a JSON object")
+            if not isinstance(value, dict):
+                raise ValueError("keymap must be a JSON object")
+            normalized[name] = value
+        elif name in fields:
+            normalized[name] = _field(name, value, fields[name])
+        elif name in defaults:
+            default = defaults[name]
+            numeric = (int, float)
+            same_type = (default is None or type(value) is type(default)
+                         or (isinstance(default, numeric) and isinstance(value, numeric)
+                             and not isinstance(value, bool)))
+            if not same_type:
+                raise ValueError(f"{name} must be a {type(default).__name__}")
+            normalized[name] = value
+        elif name in GENERIC_KEYS:
+            normalized[name] = value
+        else:
+            raise ValueError(f"Unknown {experiment_type} option: {name}")
+
+    # The engine has the last word (cross-field checks in configure())
+    try:
+        create_experiment(experiment_type, "preset", json.loads(json.dumps(normalized)))
+    except (TypeError, KeyError) as e:
+        raise ValueError(f"Engine rejected config: {e}")
+    return normalized
+
+
+def make_preset(name: str, experiment_type: str, config: Dict[str, Any]) -> Preset:
+    """Validate and hash a config; raises ValueError."""
+    if not name or len(name) > 100:
+        raise ValueError("Preset name is missing or too long")
+    canonical = json.dumps(validate(experiment_type, config), sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(f"{experiment_type}\n{canonical}".encode("utf-8")).hexdigest()
+    return Preset(name=name, experiment_type=experiment_type, config_json=canonical,
+                  hash=digest[:HASH_LENGTH])
+
+
+def load_file(path: Path) -> Preset:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError("Preset file must hold a JSON object")
+    return make_preset(str(data.get("name") or Path(path).stem), data.get("experiment_type"),
+                       data.get("config", {}))
+
+
+class PresetRegistry:
+    """Presets of one directory, reloaded when files change."""
+
+    def __init__(self, directory: Optional[Path] = None, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self.set_directory(directory)
+
+    def set_directory(self, directory: Optional[Path]) -> None:
+        with self._lock:
+            self.directory = Path(directory) if directory else None
+            self._stamps: Dict[Path, Tuple[int, int]] = {}
+            self._names: Dict[Path, str] = {}
+            self._by_name: Dict[str, Preset] = {}
+            self._by_hash: Dict[str, Preset] = {}
+            self.errors: Dict[str, str] = {}
+            self._checked = float("-inf")
+
+    def refresh(self, force: bool = False) -> None:
+        """Reload changed preset files (at most once per check interval)."""
+        if not force and time.monotonic() - self._checked < self.check_interval:
+            return
+        with self._lock:
+            if not force and time.monotonic() - self._checked < self.check_interval:
+                return
+            self._checked = time.monotonic()
+            stamps = {}
+            if self.directory is not None and self.directory.is_dir():
+                for path in sorted(self.directory.glob("*.json")):
+                    stat = path.stat()
+                    stamps[path] = (stat.st_mtime_ns, stat.st_size)
+
+            for path in set(self._stamps) - set(stamps):
+                self._by_name.pop(self._names.pop(path, None), None)
+                self.errors.pop(path.name, None)
+            for path, stamp in stamps.items():
+                if self._stamps.get(path) == stamp:
+                    continue
+                self._stamps[path] = stamp
+                try:
+                    preset = load_file(path)
+                except (OSError, ValueError) as e:
+                    self.errors[path.name] = str(e)
+                    logger.warning(f"Preset {path.name} not loaded: {e}")
+                    continue
+                self.errors.pop(path.name, None)
+                previous = self._names.get(path)
+                if previous and previous != preset.name:
+                    self._by_name.pop(previous, None)
+                self._names[path] = preset.name
+                self._by_name[preset.name] = preset
+                self._by_hash[preset.hash] = preset
+
+    def remember(self, preset: Preset) -> None:
+        """Make a stored version resolvable by hash."""
+        with self._lock:
+            self._by_hash.setdefault(preset.hash, preset)
+
+    def get(self, ref: str, experiment_type: Optional[str] = None) -> Preset:
+        """Current version of a named preset, or any version by hash; raises KeyError / ValueError."""
+        self.refresh()
+        preset = self._by_name.get(ref) or self._by_hash.get(ref)
+        if preset is None:
+            raise KeyError(ref)
+        if experiment_type and preset.experiment_type != experiment_type:
+            raise ValueError(f"Preset {ref} is for {preset.experiment_type}, not {experiment_type}")
+        return preset
+
+    def presets(self) -> List[Preset]:
+        self.refresh()
+        return sorted(self._by_name.values(), key=lambda p: p.name)
+
+
+def store(conn: sqlite3.Connection, preset: Preset) -> None:
+    """Record a preset version (no-op when the hash is already stored)."""
+    conn.execute('''
+        INSERT OR IGNORE INTO config_presets (hash, name, experiment_type, config_json, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (preset.hash, preset.name, preset.experiment_type, preset.config_json,
+          datetime.datetime.utcnow().isoformat()))
+
+
+def load_stored(conn: sqlite3.Connection, preset_hash: str) -> Optional[Preset]:
+    row = conn.execute(
+        'SELECT name, experiment_type, config_json FROM config_presets WHERE hash = ?', (preset_hash,)
+    ).fetchone()
+    return Preset(row[0], row[1], row[2], preset_hash) if row else None
+
+
+def overrides(preset: Preset, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Keys of a session config that differ from its preset."""
+    base = preset.config()
+    return {k: v for k, v in config.items() if k not in base or base[k] != v}
+
+
+def session_config(preset_config_json: Optional[str], config_json: Optional[str]) -> Dict[str, Any]:
+    """Full config of a stored session: its preset plus its own overrides."""
+    config = json.loads(preset_config_json or "{}")
+    config.update(json.loads(config_json or "{}"))
+    return config
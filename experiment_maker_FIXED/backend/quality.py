@@ -0,0 +1,246 @@
+"""
+FILE: backend/quality.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Trial-level data-quality screening. Flags anticipations,
+                  lapses, RT outliers, runs of identical keys and trials run
+                  in a hidden browser tab as responses arrive, and flags
+                  sessions dominated by no-responses or bad trials.
+
+METHOD: Streaming screen per session
+    - SessionMonitor.observe() flags each response as it is recorded,
+      keeping the session's RTs sorted: the running median is a lookup
+      and the running MAD a selection over the two sorted halves, both
+      O(log n) per response
+    - RT window: rt < rt_min_ms -> anticipation, rt > rt_max_ms -> lapse
+    - MAD trimming: |rt - median| > mad_k * 1.4826 * MAD, against the
+      distribution so far once mad_min_trials RTs exist; finalize()
+      re-evaluates every trial against the full session distribution
+    - Identical keys: every trial of a run of >= max_identical_run equal
+      responses
+    - Tab hidden: the client reports metadata.hidden_ms (time the page was
+      hidden during the trial) or metadata.tab_hidden
+    - Flags are bit masks stored in responses.qc_flags / sessions.qc_flags
+      (indexed); analytics excludes flagged trials from RT metrics
+
+CONFIGURATION:
+    Defaults per experiment type in QC_PROFILES; any field can be
+    overridden per session with config["quality_control"] = {...}.
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+
+REFERENCES:
+    Leys, C., Ley, C., Klein, O., Bernard, P., & Licata, L. (2013). Detecting
+        outliers: Do not use standard deviation around the mean, use absolute
+        deviation around the median. Journal of Experimental Social
+        Psychology, 49(4), 764-766.
+"""
+
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from dataclasses import dataclass, fields, replace
+import bisect
+import numpy as np
+
+
+# Trial flags (responses.qc_flags)
+FLAG_ANTICIPATION = 1
+FLAG_LAPSE = 2
+FLAG_RT_OUTLIER = 4
+FLAG_IDENTICAL_RUN = 8
+FLAG_TAB_HIDDEN = 16
+
+# Session flags (sessions.qc_flags)
+SESSION_FLAG_NO_RESPONSE = 1
+SESSION_FLAG_LOW_QUALITY = 2
+
+TRIAL_FLAG_NAMES = {
+    FLAG_ANTICIPATION: "anticipation",
+    FLAG_LAPSE: "lapse",
+    FLAG_RT_OUTLIER: "rt_outlier",
+    FLAG_IDENTICAL_RUN: "identical_run",
+    FLAG_TAB_HIDDEN: "tab_hidden",
+}
+
+SESSION_FLAG_NAMES = {
+    SESSION_FLAG_NO_RESPONSE: "mostly_no_response",
+    SESSION_FLAG_LOW_QUALITY: "mostly_flagged_trials",
+}
+
+# Trials with any of these flags are left out of RT metrics
+RT_EXCLUDE_FLAGS = FLAG_ANTICIPATION | FLAG_LAPSE | FLAG_RT_OUTLIER | FLAG_TAB_HIDDEN
+
+# Consistency constant that makes MAD estimate the SD of a normal distribution
+MAD_SCALE = 1.4826
+
+NO_RESPONSE_VALUES = (None, "", "None", "no_response")
+
+
+@dataclass(frozen=True)
+class QCProfile:
+    """Screening thresholds for one experiment type (None disables a check)."""
+    rt_min_ms: Optional[float] = 150.0
+    rt_max_ms: Optional[float] = 3000.0
+    mad_k: Optional[float] = 3.0
+    mad_min_trials: int = 10
+    max_identical_run: Optional[int] = None
+    max_no_response_rate: float = 0.5
+    max_flagged_rate: float = 0.3
+
+
+QC_PROFILES = {
+    "stroop": QCProfile(rt_max_ms=3000.0, max_identical_run=10),
+    # Go responses are fast and always the same key; withheld trials have no RT
+    "sart": QCProfile(rt_min_ms=100.0, rt_max_ms=None, max_no_response_rate=0.5),
+    # Span tasks time whole recall sequences, so RT screens do not apply
+    "digit_span": QCProfile(rt_min_ms=None, rt_max_ms=None, mad_k=None),
+    "corsi": QCProfile(rt_min_ms=None, rt_max_ms=None, mad_k=None),
+    "bart": QCProfile(rt_min_ms=None, rt_max_ms=None, mad_k=None),
+    "antisaccade": QCProfile(rt_min_ms=100.0, rt_max_ms=1500.0, max_identical_run=12),
+    "butterfly_simon": QCProfile(rt_min_ms=150.0, rt_max_ms=2000.0, max_identical_run=12),
+}
+
+
+def profile_for(experiment_type: str, config: Optional[Dict[str, Any]] = None) -> QCProfile:
+    """Profile of an experiment type with per-session overrides applied."""
+    profile = QC_PROFILES.get(experiment_type, QCProfile())
+    overrides = (config or {}).get("quality_control") or {}
+    known = {f.name for f in fields(QCProfile)}
+    return replace(profile, **{k: v for k, v in overrides.items() if k in known})
+
+
+def flag_names(flags: int, names: Dict[int, str] = TRIAL_FLAG_NAMES) -> List[str]:
+    """Decode a flag mask into names."""
+    return [name for bit, name in names.items() if flags & bit]
+
+
+def _kth_of_two(a, len_a: int, b, len_b: int, k: int) -> float:
+    """k-th smallest (0-based) of two ascending sequences given as index -> value functions."""
+    lo, hi = max(0, k + 1 - len_b), min(k + 1, len_a)
+    while True:
+        i = (lo + hi) // 2
+        j = k + 1 - i
+        if i > 0 and j < len_b and a(i - 1) > b(j):
+            hi = i - 1
+        elif j > 0 and i < len_a and b(j - 1) > a(i):
+            lo = i + 1
+        else:
+            return max(a(i - 1) if i > 0 else -np.inf, b(j - 1) if j > 0 else -np.inf)
+
+
+def sorted_median_mad(values: List[float]) -> Tuple[float, float]:
+    """(median, unscaled MAD) of an ascending list in O(log n)."""
+    n = len(values)
+    mid = n // 2
+    median = values[mid] if n % 2 else (values[mid - 1] + values[mid]) / 2
+    # Distances below the median ascend walking left, above it walking right
+    split = bisect.bisect_left(values, median)
+    below = lambda i: median - values[split - 1 - i]
+    above = lambda j: values[split + j] - median
+    mad = _kth_of_two(below, split, above, n - split, mid)
+    if n % 2 == 0:
+        mad = (mad + _kth_of_two(below, split, above, n - split, mid - 1)) / 2
+    return median, mad
+
+
+def mad_outliers(rts: np.ndarray, k: float) -> np.ndarray:
+    """Boolean mask of RTs more than k scaled MADs from the median."""
+    median = np.median(rts)
+    mad = MAD_SCALE * np.median(np.abs(rts - median))
+    if mad == 0:
+        return np.zeros(rts.shape, dtype=bool)
+    return np.abs(rts - median) > k * mad
+
+
+class SessionMonitor:
+    """Incremental quality screen of one session."""
+
+    def __init__(self, profile: QCProfile):
+        self.profile = profile
+        self.flags: Dict[int, int] = {}
+        self.rts: Dict[int, float] = {}
+        self._sorted_rts: List[float] = []
+        self._run_value: Any = None
+        self._run_trials: List[int] = []
+        self.n_trials = 0
+        self.n_no_response = 0
+
+    def _running_outlier(self, rt: float) -> bool:
+        values = self._sorted_rts
+        if self.profile.mad_k is None or len(values) < self.profile.mad_min_trials:
+            return False
+        median, mad = sorted_median_mad(values)
+        mad *= MAD_SCALE
+        return mad > 0 and abs(rt - median) > self.profile.mad_k * mad
+
+    def observe(self, trial_number: int, response: Any, rt_ms: float,
+                metadata: Optional[Dict[str, Any]] = None) -> int:
+        """Screen one response; returns its flag mask. Practice trials are never flagged."""
+        metadata = metadata or {}
+        if metadata.get("phase") == "practice":
+            return 0
+
+        profile = self.profile
+        flags = 0
+        self.n_trials += 1
+        responded = response not in NO_RESPONSE_VALUES
+        rt = float(rt_ms or 0)
+
+        if not responded:
+            self.n_no_response += 1
+        elif rt > 0:
+            if profile.rt_min_ms is not None and rt < profile.rt_min_ms:
+                flags |= FLAG_ANTICIPATION
+            elif profile.rt_max_ms is not None and rt > profile.rt_max_ms:
+                flags |= FLAG_LAPSE
+            else:
+                if self._running_outlier(rt):
+                    flags |= FLAG_RT_OUTLIER
+                self.rts[trial_number] = rt
+                bisect.insort(self._sorted_rts, rt)
+
+        if metadata.get("tab_hidden") or float(metadata.get("hidden_ms") or 0) > 0:
+            flags |= FLAG_TAB_HIDDEN
+
+        # Runs of identical keys
+        if profile.max_identical_run:
+            value = str(response) if responded else None
+            if value is not None and value == self._run_value:
+                self._run_trials.append(trial_number)
+            else:
+                self._run_value, self._run_trials = value, [trial_number]
+            if value is not None and len(self._run_trials) >= profile.max_identical_run:
+                flags |= FLAG_IDENTICAL_RUN
+                for earlier in self._run_trials[:-1]:
+                    self.flags[earlier] = self.flags.get(earlier, 0) | FLAG_IDENTICAL_RUN
+
+        self.flags[trial_number] = flags
+        return flags
+
+    def observe_many(self, records: Iterable[Tuple[int, Any, float, Optional[Dict[str, Any]]]]) -> List[int]:
+        """Screen (trial_number, response, rt_ms, metadata) records in order."""
+        return [self.observe(*record) for record in records]
+
+    def finalize(self) -> Tuple[Dict[int, int], int]:
+        """
+        Re-evaluate MAD outliers against the full session and compute the
+        session flags. Returns ({trial_number: flags} for every trial whose
+        mask is now final, session_flags).
+        """
+        profile = self.profile
+        if profile.mad_k is not None and len(self.rts) >= profile.mad_min_trials:
+            trial_numbers = np.fromiter(self.rts.keys(), dtype=np.int64, count=len(self.rts))
+            rts = np.fromiter(self.rts.values(), dtype=np.float64, count=len(self.rts))
+            outliers = mad_outliers(rts, profile.mad_k)
+            for trial_number, outlier in zip(trial_numbers.tolist(), outliers.tolist()):
+                current = self.flags.get(trial_number, 0) & ~FLAG_RT_OUTLIER
+                self.flags[trial_number] = current | (FLAG_RT_OUTLIER if outlier else 0)
+
+        session_flags = 0
+        if self.n_trials:
+            if self.n_no_response / self.n_trials > profile.max_no_response_rate:
+                session_flags |= SESSION_FLAG_NO_RESPONSE
+            flagged = sum(1 for f in self.flags.values() if f)
+            if flagged / self.n_trials > profile.max_flagged_rate:
+                session_flags |= SESSION_FLAG_LOW_QUALITY
+        return dict(self.flags), session_flags
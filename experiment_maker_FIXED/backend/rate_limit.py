@@ -0,0 +1,186 @@
+"""
+FILE: backend/rate_limit.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Rate limiting and admission control for the unauthenticated
+                  subject API. Keeps one misbehaving client (or a reload
+                  loop) from exhausting memory and DB write capacity, and
+                  sheds new sessions under load so participants already
+                  running keep their latency.
+
+METHOD: Token buckets + load thresholds
+    - Limit "N/S": a bucket of N tokens refilled at N/S tokens per second
+      (bursts of up to N, N per S seconds sustained). "" or "0" disables
+    - RateLimiter.check(name, key) takes a token from the bucket of
+      (limit name, key) -> 0 when allowed, else seconds until a token is
+      available (the Retry-After value)
+    - Stores: MemoryBuckets (per process; LRU-bounded so spoofed keys
+      cannot grow it without limit) or SQLiteBuckets (one small WAL
+      database shared by every worker on the host; one short BEGIN
+      IMMEDIATE per check, synchronous=OFF since bucket state need not
+      survive a crash)
+    - AdmissionController: counts in-flight API requests and refuses new
+      sessions while live sessions, in-flight requests or the write
+      backlog (rows waiting for a group commit) are over their
+      thresholds. Requests of running sessions are never refused by it
+
+USAGE:
+    limiter = RateLimiter(MemoryBuckets(), {"ip": parse_limit("3000/10")})
+    retry_after = limiter.check("ip", remote_addr)
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+import time
+
+STORES = ("memory", "sqlite", "off")
+
+
+class Limit(NamedTuple):
+    capacity: float
+    per_second: float
+
+
+def parse_limit(spec: str) -> Optional[Limit]:
+    """Parse "N/S" -> Limit (None when disabled); raises ValueError."""
+    spec = (spec or "").strip()
+    if spec in ("", "0"):
+        return None
+    count, _, seconds = spec.partition("/")
+    capacity, period = float(count), float(seconds or 1)
+    if capacity <= 0 or period <= 0:
+        raise ValueError(f"Rate limit must look like N/S with N, S > 0: {spec}")
+    return Limit(capacity, capacity / period)
+
+
+def _take(tokens: float, updated: float, limit: Limit, now: float, cost: float) -> Tuple[float, float]:
+    """Refill then take -> (tokens left, seconds to wait; 0 when taken)."""
+    tokens = min(limit.capacity, tokens + max(0.0, now - updated) * limit.per_second)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / limit.per_second
+
+
+class MemoryBuckets:
+    """Buckets of this process, least recently used dropped past max_keys."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.capacity, now))
+            tokens, wait = _take(tokens, updated, limit, now, cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBuckets:
+    """Buckets shared by every process using the same database file."""
+
+    PURGE_EVERY = 10_000  # checks between deletions of idle buckets
+
+    def __init__(self, path: os.PathLike, idle_s: float = 3600.0):
+        self.path = path
+        self.idle_s = idle_s
+        self._local = threading.local()
+        self._checks = 0
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, wait = _take(*(row or (limit.capacity, now)), limit, now, cost)
+            conn.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            self._checks += 1
+            if self._checks % self.PURGE_EVERY == 0:
+                conn.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - self.idle_s,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+
+class RateLimiter:
+    """Named limits over one bucket store."""
+
+    def __init__(self, store, limits: Dict[str, Optional[Limit]]):
+        self.store = store
+        self.limits = {name: limit for name, limit in limits.items() if limit is not None}
+        self.rejected: Dict[str, int] = {name: 0 for name in self.limits}
+
+    def check(self, name: str, key: Optional[str], cost: float = 1.0) -> float:
+        """Take a token for `key` under limit `name` -> 0 if allowed, else seconds to wait."""
+        limit = self.limits.get(name)
+        if limit is None or not key:
+            return 0.0
+        wait = self.store.take(f"{name}:{key}", limit, cost)
+        if wait:
+            self.rejected[name] += 1
+        return wait
+
+
+class AdmissionController:
+    """Load thresholds for admitting new sessions (0 disables a threshold)."""
+
+    def __init__(self, max_live_sessions: int = 0, max_inflight: int = 0, max_write_backlog: int = 0):
+        self.max_live_sessions = max_live_sessions
+        self.max_inflight = max_inflight
+        self.max_write_backlog = max_write_backlog
+        self.inflight = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    def enter(self) -> None:
+        with self._lock:
+            self.inflight += 1
+
+    def exit(self) -> None:
+        with self._lock:
+            self.inflight -= 1
+
+    def refuse_new_session(self, live_sessions: int, write_backlog: int) -> Optional[str]:
+        """Reason a new session cannot start now, or None."""
+        reason = None
+        if self.max_live_sessions and live_sessions >= self.max_live_sessions:
+            reason = f"{live_sessions} live sessions"
+        elif self.max_inflight and self.inflight > self.max_inflight:
+            reason = f"{self.inflight} requests in flight"
+        elif self.max_write_backlog and write_backlog >= self.max_write_backlog:
+            reason = f"{write_backlog} rows waiting to be written"
+        if reason:
+            with self._lock:
+                self.refused += 1
+        return reason
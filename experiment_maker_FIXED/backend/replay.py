@@ -0,0 +1,234 @@
+"""
+FILE: backend/replay.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Rescore stored sessions. Rebuilds experiment instances from
+                  sessions.config_json (merged over the session's config
+                  preset, if any) and replays the stored trials and
+                  responses through record_response(), so a fix to an
+                  engine's scoring can be applied to every past session.
+
+METHOD: Streaming + process pool
+    - Sessions are read with keyset pagination (rowid > last LIMIT n); the
+      trials/responses of a page come from one JOIN, so memory is bounded
+      by the page size, not by the database
+    - Pages go to a ProcessPoolExecutor; at most `max_in_flight` pages are
+      outstanding, which keeps the reader from running ahead of the workers
+    - Workers are pure (no DB access); the parent is the only writer and
+      stores results per page in one transaction via session_results
+      (source = "replay")
+    - Engines are built from backend.engines, never from the Flask app
+
+LIMITS:
+    Replay feeds record_response() the stored trial stimulus/metadata, not
+    regenerated trials. Engines that score against server-side randomness
+    must read it from that stimulus (BART judges each balloon against its
+    stored explosion point) or reproduce exactly only when config_json
+    carries the seed that was used.
+
+USAGE:
+    python -m backend.replay --db database/app.db --type sart --workers 8
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from concurrent.futures import ProcessPoolExecutor, Future
+from dataclasses import dataclass, field
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from . import session_results
+from .presets import session_config
+from .engines import create_experiment
+from .experiments.base_experiment import ResponseData
+
+
+logger = logging.getLogger(__name__)
+
+# Sessions per page (one DB read, one worker task, one write transaction)
+DEFAULT_PAGE_SIZE = 200
+
+# Stored response values that mean the participant did not respond
+EMPTY_RESPONSES = ("", "None")
+
+# (session_id, experiment_type, config_json, rows)
+SessionPayload = Tuple[str, str, str, List[tuple]]
+
+
+@dataclass
+class ReplayReport:
+    """Outcome of a replay run."""
+    sessions: int = 0
+    rescored: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    elapsed_s: float = 0.0
+
+    @property
+    def sessions_per_second(self) -> float:
+        return self.sessions / self.elapsed_s if self.elapsed_s else 0.0
+
+
+def iter_pages(conn: sqlite3.Connection, experiment_type: Optional[str] = None,
+               page_size: int = DEFAULT_PAGE_SIZE,
+               completed_only: bool = True) -> Iterator[List[SessionPayload]]:
+    """Yield pages of sessions with their trial/response rows, streaming over the DB."""
+    filters = ""
+    params: Tuple[Any, ...] = ()
+    if completed_only:
+        filters += " AND s.completed_at IS NOT NULL"
+    if experiment_type:
+        filters += " AND s.experiment_type = ?"
+        params += (experiment_type,)
+
+    last_rowid = 0
+    while True:
+        sessions = conn.execute(f'''
+            SELECT s.rowid, s.id, s.experiment_type, s.config_json, p.config_json
+            FROM sessions s LEFT JOIN config_presets p ON p.hash = s.preset_hash
+            WHERE s.rowid > ? {filters}
+            ORDER BY s.rowid LIMIT ?
+        ''', (last_rowid, *params, page_size)).fetchall()
+        if not sessions:
+            return
+        last_rowid = sessions[-1][0]
+
+        rows: Dict[str, List[tuple]] = {row[1]: [] for row in sessions}
+        for row in conn.execute('''
+            SELECT r.session_id, r.trial_number, r.response_value, r.response_time_ms, r.correct,
+                   t.is_practice, t.stimulus_json, t.correct_response, t.metadata_json
+            FROM responses r
+            LEFT JOIN trials t ON t.session_id = r.session_id AND t.trial_number = r.trial_number
+            WHERE r.session_id IN (SELECT value FROM json_each(?))
+            ORDER BY r.session_id, r.id
+        ''', (json.dumps(list(rows)),)):
+            rows[row[0]].append(tuple(row[1:]))
+
+        # Preset sessions store only their overrides; replay needs the full config
+        yield [
+            (sid, exp_type, config_json if preset_json is None
+             else json.dumps(session_config(preset_json, config_json)), rows[sid])
+            for _, sid, exp_type, config_json, preset_json in sessions
+        ]
+
+
+def _response_data(row: tuple) -> ResponseData:
+    """Rebuild the payload record_response() originally received."""
+    trial_number, value, rt, correct, is_practice, stimulus_json, expected, metadata_json = row
+    metadata = dict(json.loads(stimulus_json or "null") or {})
+    metadata.update(json.loads(metadata_json or "null") or {})
+    if is_practice:
+        metadata.setdefault("phase", "practice")
+
+    data = {
+        "trial_number": trial_number,
+        "response_value": None if value in EMPTY_RESPONSES else value,
+        "response_time_ms": rt,
+        "metadata": metadata
+    }
+    if expected:
+        data["correct_response"] = expected
+    elif correct is not None:
+        # Client-scored trial with no stored answer key
+        data["correct"] = bool(correct)
+    return ResponseData.from_dict(data)
+
+
+def replay_session(payload: SessionPayload) -> Dict[str, Any]:
+    """Rebuild one engine instance, replay its responses and return get_results()."""
+    session_id, experiment_type, config_json, rows = payload
+    inst = create_experiment(experiment_type, session_id, json.loads(config_json or "{}"))
+    for row in rows:
+        inst.record_response(_response_data(row))
+    return inst.get_results()
+
+
+def replay_page(page: List[SessionPayload]) -> List[Tuple[str, str, Optional[Dict[str, Any]], Optional[str]]]:
+    """Worker entry point: (session_id, experiment_type, results, error) per session."""
+    out = []
+    for payload in page:
+        try:
+            out.append((payload[0], payload[1], replay_session(payload), None))
+        except Exception as e:
+            out.append((payload[0], payload[1], None, f"{type(e).__name__}: {e}"))
+    return out
+
+
+def _store(conn: sqlite3.Connection, outcome: List[tuple], report: ReplayReport, dry_run: bool) -> None:
+    by_type: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for session_id, experiment_type, results, error in outcome:
+        report.sessions += 1
+        if error is not None:
+            report.failed[session_id] = error
+            continue
+        by_type.setdefault(experiment_type, {})[session_id] = results
+
+    if not dry_run:
+        with conn:
+            for experiment_type, results in by_type.items():
+                session_results.store_batch(conn, experiment_type, results, source="replay")
+    report.rescored += sum(len(r) for r in by_type.values())
+
+
+def replay(db_path: str, experiment_type: Optional[str] = None, workers: Optional[int] = None,
+           page_size: int = DEFAULT_PAGE_SIZE, max_in_flight: Optional[int] = None,
+           dry_run: bool = False) -> ReplayReport:
+    """
+    Rescore every completed session (optionally of one type) and store the
+    new results. workers=0 replays in-process (useful for debugging).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    max_in_flight = max_in_flight or max(2, 2 * workers)
+    report = ReplayReport()
+    started = time.perf_counter()
+
+    reader = sqlite3.connect(db_path, timeout=10.0)
+    writer = sqlite3.connect(db_path, timeout=10.0)
+    try:
+        pages = iter_pages(reader, experiment_type, page_size)
+        if workers == 0:
+            for page in pages:
+                _store(writer, replay_page(page), report, dry_run)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending: List[Future] = []
+                for page in pages:
+                    pending.append(pool.submit(replay_page, page))
+                    if len(pending) >= max_in_flight:
+                        _store(writer, pending.pop(0).result(), report, dry_run)
+                for future in pending:
+                    _store(writer, future.result(), report, dry_run)
+    finally:
+        reader.close()
+        writer.close()
+
+    report.elapsed_s = time.perf_counter() - started
+    for session_id, error in report.failed.items():
+        logger.warning(f"Replay failed for session {session_id}: {error}")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rescore stored sessions with the current engines")
+    parser.add_argument("--db", default=os.path.join("database", "app.db"), help="Path to app.db")
+    parser.add_argument("--type", dest="experiment_type", help="Only replay this experiment type")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (0 = in-process)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Sessions per task")
+    parser.add_argument("--dry-run", action="store_true", help="Replay without writing results")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = replay(args.db, args.experiment_type, args.workers, args.page_size, dry_run=args.dry_run)
+    print(f"Replayed {report.sessions} sessions in {report.elapsed_s:.1f}s "
+          f"({report.sessions_per_second:.0f}/s): {report.rescored} rescored, {len(report.failed)} failed")
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
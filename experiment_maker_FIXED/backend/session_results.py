@@ -0,0 +1,227 @@
+"""
+FILE: backend/session_results.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Materialized per-session results. Completed sessions get
+                  one session_results row (the engine's get_results() plus
+                  bookkeeping) and typed session_metrics rows, written in
+                  the same transaction that stamps completed_at.
+
+METHOD: Write at completion, rebuild offline
+    - store_results(): called inside the completion / ingest transaction;
+      typed metrics come from the vectorized scorers in backend.analytics,
+      so every source produces the same metric names per experiment
+    - Each row remembers the response count and last response id it was
+      computed from; refresh() rescores only sessions whose raw responses
+      changed since (or that were never materialized), in batches. Finding
+      them scans every response, so it runs from the command line (e.g.
+      after editing raw data by hand or restoring a backup), never per
+      request
+    - store_batch(): many sessions of one type at once (used by replay)
+    - Dashboards and exports read session_results / session_metrics only
+
+USAGE:
+    python -m backend.session_results --dry-run
+    python -m backend.session_results --type stroop
+
+TABLES (created in app_FIXED.init_db):
+    session_results(session_id, experiment_type, source, results_json,
+                    response_count, last_response_id, scored_at)
+    session_metrics(session_id, experiment_type, metric, value)
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import numpy as np
+
+from . import analytics
+
+
+# Sessions rescored per analytics query during refresh()
+REFRESH_BATCH_SIZE = 500
+
+
+def _write(conn: sqlite3.Connection, experiment_type: str, scores: analytics.StudyScores,
+           source: str, results: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    """Upsert result + metric rows for every session in `scores` (results keyed by session id)."""
+    session_ids = scores.session_ids.tolist()
+    if not session_ids:
+        return
+    results = results or {}
+    ids_json = json.dumps(session_ids)
+    now = datetime.datetime.utcnow().isoformat()
+
+    counts = conn.execute('''
+        SELECT s.id, COUNT(r.id), COALESCE(MAX(r.id), 0)
+        FROM sessions s LEFT JOIN responses r ON r.session_id = s.id
+        WHERE s.id IN (SELECT value FROM json_each(?))
+        GROUP BY s.id
+    ''', (ids_json,)).fetchall()
+
+    conn.executemany('''
+        INSERT OR REPLACE INTO session_results
+        (session_id, experiment_type, source, results_json,
+         response_count, last_response_id, scored_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (sid, experiment_type, source,
+         json.dumps(results[sid], default=str) if sid in results else None,
+         n, last_id, now)
+        for sid, n, last_id in counts
+    ])
+
+    conn.execute(
+        'DELETE FROM session_metrics WHERE session_id IN (SELECT value FROM json_each(?))',
+        (ids_json,)
+    )
+    conn.executemany('''
+        INSERT INTO session_metrics (session_id, experiment_type, metric, value)
+        VALUES (?, ?, ?, ?)
+    ''', [
+        (sid, experiment_type, name, float(values[i]))
+        for name, values in scores.metrics.items()
+        for i, sid in enumerate(session_ids)
+        if not np.isnan(values[i])
+    ])
+
+
+def store_results(conn: sqlite3.Connection, session_id: str, experiment_type: str,
+                  results: Dict[str, Any], source: str = "engine") -> None:
+    """
+    Materialize one finished session. Call inside the transaction that marks
+    the session complete so the two can never disagree.
+    """
+    store_batch(conn, experiment_type, {session_id: results}, source)
+
+
+def store_batch(conn: sqlite3.Connection, experiment_type: str,
+                results: Dict[str, Dict[str, Any]], source: str) -> None:
+    """Materialize many sessions of one type with one scoring query."""
+    scores = analytics.score_sessions(conn, experiment_type, session_ids=list(results))
+    _write(conn, experiment_type, scores, source, results)
+
+
+def stale_sessions(conn: sqlite3.Connection, experiment_type: Optional[str] = None) -> List[Tuple[str, str]]:
+    """Completed sessions with no result row, or whose responses changed since scoring."""
+    filters = "AND s.experiment_type = ?" if experiment_type else ""
+    rows = conn.execute(f'''
+        SELECT s.id, s.experiment_type
+        FROM sessions s
+        LEFT JOIN session_results sr ON sr.session_id = s.id
+        LEFT JOIN (
+            SELECT session_id, COUNT(*) AS n, MAX(id) AS last_id
+            FROM responses GROUP BY session_id
+        ) r ON r.session_id = s.id
+        WHERE s.completed_at IS NOT NULL {filters}
+          AND (sr.session_id IS NULL
+               OR sr.response_count != COALESCE(r.n, 0)
+               OR sr.last_response_id != COALESCE(r.last_id, 0))
+    ''', (experiment_type,) if experiment_type else ()).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+
+def refresh(conn: sqlite3.Connection, experiment_type: Optional[str] = None,
+            batch_size: int = REFRESH_BATCH_SIZE) -> int:
+    """
+    Rescore stale sessions from raw data. The engine's full results are no
+    longer valid for them, so results_json is cleared (source = "rebuild").
+    Returns the number of sessions rebuilt.
+    """
+    by_type: Dict[str, List[str]] = {}
+    for session_id, exp_type in stale_sessions(conn, experiment_type):
+        by_type.setdefault(exp_type, []).append(session_id)
+
+    for exp_type, session_ids in by_type.items():
+        for start in range(0, len(session_ids), batch_size):
+            batch = session_ids[start:start + batch_size]
+            scores = analytics.score_sessions(conn, exp_type, session_ids=batch)
+            _write(conn, exp_type, scores, source="rebuild")
+
+    return sum(len(ids) for ids in by_type.values())
+
+
+def load_metrics(conn: sqlite3.Connection, experiment_type: str,
+                 session_ids: Optional[Sequence[str]] = None,
+                 archived: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, np.ndarray]]:
+    """
+    Materialized metrics of an experiment type.
+
+    Returns (sessions, columns): one dict per session (session/subject ids,
+    source, scored_at) and one float array per metric aligned with it
+    (NaN where a session lacks the metric). archived=True reads the
+    all_* views of archive.attach() so archived sessions are included.
+    """
+    prefix = "all_" if archived else ""
+    filters = ""
+    params: Tuple[Any, ...] = (experiment_type,)
+    if session_ids is not None:
+        filters = "AND sr.session_id IN (SELECT value FROM json_each(?))"
+        params += (json.dumps(list(session_ids)),)
+
+    sessions = [
+        dict(zip(("session_id", "subject_id", "source", "scored_at"), row))
+        for row in conn.execute(f'''
+            SELECT sr.session_id, s.subject_id, sr.source, sr.scored_at
+            FROM {prefix}session_results sr JOIN {prefix}sessions s ON s.id = sr.session_id
+            WHERE sr.experiment_type = ? {filters}
+            ORDER BY sr.session_id
+        ''', params)
+    ]
+    position = {row["session_id"]: i for i, row in enumerate(sessions)}
+
+    columns: Dict[str, np.ndarray] = {}
+    for session_id, metric, value in conn.execute(f'''
+        SELECT sm.session_id, sm.metric, sm.value FROM {prefix}session_metrics sm
+        JOIN {prefix}session_results sr ON sr.session_id = sm.session_id
+        WHERE sm.experiment_type = ? {filters}
+    ''', params):
+        if metric not in columns:
+            columns[metric] = np.full(len(sessions), np.nan)
+        columns[metric][position[session_id]] = value
+
+    return sessions, columns
+
+
+def load_results(conn: sqlite3.Connection, session_id: str) -> Optional[Dict[str, Any]]:
+    """Stored engine results of one session (None if not materialized or rebuilt)."""
+    row = conn.execute(
+        'SELECT results_json FROM session_results WHERE session_id = ?', (session_id,)
+    ).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return json.loads(row[0])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rescore completed sessions whose raw responses changed")
+    parser.add_argument("--db", default=os.path.join("database", "app.db"), help="Path to app.db")
+    parser.add_argument("--type", dest="experiment_type", help="Only this experiment type")
+    parser.add_argument("--batch", type=int, default=REFRESH_BATCH_SIZE, help="Sessions per scoring query")
+    parser.add_argument("--dry-run", action="store_true", help="Only list stale sessions")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db, timeout=30.0)
+    try:
+        if args.dry_run:
+            stale = stale_sessions(conn, args.experiment_type)
+            for session_id, exp_type in stale:
+                print(f"  {exp_type:<16} {session_id}")
+            print(f"{len(stale)} stale sessions")
+            return 0
+        with conn:
+            rebuilt = refresh(conn, args.experiment_type, args.batch)
+        print(f"Rebuilt {rebuilt} stale session results")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
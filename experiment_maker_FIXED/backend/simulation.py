@@ -0,0 +1,444 @@
+"""
+FILE: backend/simulation.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Simulated participants for power analysis and design
+                  validation. Runs virtual participants with parameterized
+                  response models through the real experiment engines and
+                  reports how reliable each metric is under each design.
+
+METHOD: Fast path + engine path, fanned out over a process pool
+    - Response models: ex-Gaussian RTs, lapse rates, accuracy and (for
+      Digit Span) a logistic span-ability curve; every parameter that
+      carries individual differences is drawn per participant
+    - Fast path (Stroop, SART): trial sequences come from the engines'
+      own generators, responses for a whole batch are drawn with NumPy
+      and scored with the vectorized scorers of backend.analytics
+    - Engine path (Digit Span, or --engine): get_next_trial() /
+      record_response() per trial, so adaptive rules drive the sequence
+    - Reliability: split-half (odd vs even trials, Spearman-Brown) and
+      percentile bootstrap CIs over participants, vectorized over resamples
+
+USAGE:
+    python -m backend.simulation --task stroop --participants 10000 \\
+        --set total_trials=40,80,120 --set congruent_ratio=0.5 --workers 8
+    python -m backend.simulation --task digit_span --model ability=6.5
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+
+REFERENCES:
+    Ratcliff, R. (1979). Group reaction time distributions and an analysis of
+        distribution statistics. Psychological Bulletin, 86(3), 446-461.
+    Hedge, C., Powell, G., & Sumner, P. (2018). The reliability paradox: Why
+        robust cognitive tasks do not produce reliable individual differences.
+        Behavior Research Methods, 50(3), 1166-1186.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields, replace, is_dataclass
+import argparse
+import itertools
+import json
+import random
+import time
+import numpy as np
+
+from . import analytics
+from .engines import create_experiment
+from .experiments.base_experiment import ResponseData
+
+
+# Participants per worker task
+DEFAULT_CHUNK_SIZE = 500
+
+# Metrics that describe data quality rather than performance
+SKIP_METRICS = ("qc_flagged_trials", "qc_session_flags")
+
+
+def ex_gaussian(rng: np.random.Generator, mu, sigma: float, tau: float, size=None) -> np.ndarray:
+    """Normal(mu, sigma) + Exponential(tau) reaction times, floored at 1 ms."""
+    if size is None:
+        size = np.shape(mu) or None
+    return np.maximum(rng.normal(mu, sigma, size) + rng.exponential(tau, size), 1.0)
+
+
+# ============================================
+# RESPONSE MODELS
+# ============================================
+
+@dataclass(frozen=True)
+class StroopModel:
+    """Ex-Gaussian RTs with a per-participant interference effect."""
+    mu: float = 600.0
+    mu_sd: float = 80.0
+    sigma: float = 60.0
+    tau: float = 120.0
+    interference_ms: float = 70.0
+    interference_sd: float = 30.0
+    accuracy: float = 0.97
+    incongruent_accuracy: float = 0.92
+    lapse_rate: float = 0.01
+
+    def draw(self, rng: np.random.Generator, n: int) -> Dict[str, np.ndarray]:
+        return {
+            "mu": rng.normal(self.mu, self.mu_sd, n),
+            "interference": rng.normal(self.interference_ms, self.interference_sd, n),
+        }
+
+    def respond_batch(self, params: Dict[str, np.ndarray], congruent: np.ndarray,
+                      rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(rt, correct, responded) for an (n, trials) condition matrix."""
+        mu = params["mu"][:, None] + np.where(congruent, 0.0, params["interference"][:, None])
+        rt = ex_gaussian(rng, mu, self.sigma, self.tau)
+        p_correct = np.where(congruent, self.accuracy, self.incongruent_accuracy)
+        correct = rng.random(congruent.shape) < p_correct
+        responded = rng.random(congruent.shape) >= self.lapse_rate
+        return np.where(responded, rt, 0.0), correct & responded, responded
+
+    def respond(self, params: Dict[str, float], trial: Dict[str, Any],
+                rng: np.random.Generator) -> Tuple[Any, float]:
+        if rng.random() < self.lapse_rate:
+            return None, 0.0
+        congruent = bool((trial.get("metadata") or {}).get("congruent"))
+        mu = params["mu"] + (0.0 if congruent else params["interference"])
+        expected = str(trial.get("correct_response") or "")
+        if rng.random() < (self.accuracy if congruent else self.incongruent_accuracy):
+            key = expected
+        else:
+            key = str(rng.choice([k for k in "rgby" if k != expected]))
+        return key, float(ex_gaussian(rng, mu, self.sigma, self.tau))
+
+
+@dataclass(frozen=True)
+class SARTModel:
+    """Go RTs are ex-Gaussian; commission/omission propensities vary by participant."""
+    mu: float = 350.0
+    mu_sd: float = 50.0
+    sigma: float = 50.0
+    tau: float = 80.0
+    commission_rate: float = 0.35
+    commission_sd: float = 0.15
+    omission_rate: float = 0.03
+    omission_sd: float = 0.02
+
+    def draw(self, rng: np.random.Generator, n: int) -> Dict[str, np.ndarray]:
+        return {
+            "mu": rng.normal(self.mu, self.mu_sd, n),
+            "commission": np.clip(rng.normal(self.commission_rate, self.commission_sd, n), 0.0, 1.0),
+            "omission": np.clip(rng.normal(self.omission_rate, self.omission_sd, n), 0.0, 1.0),
+        }
+
+    def respond_batch(self, params: Dict[str, np.ndarray], is_target: np.ndarray,
+                      rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        p_respond = np.where(is_target, params["commission"][:, None], 1.0 - params["omission"][:, None])
+        responded = rng.random(is_target.shape) < p_respond
+        rt = ex_gaussian(rng, params["mu"][:, None], self.sigma, self.tau, is_target.shape)
+        return np.where(responded, rt, 0.0), responded != is_target, responded
+
+    def respond(self, params: Dict[str, float], trial: Dict[str, Any],
+                rng: np.random.Generator) -> Tuple[Any, float]:
+        is_target = bool((trial.get("stimulus_data") or {}).get("is_target"))
+        p_respond = params["commission"] if is_target else 1.0 - params["omission"]
+        if rng.random() >= p_respond:
+            return None, 0.0
+        return "space", float(ex_gaussian(rng, params["mu"], self.sigma, self.tau))
+
+
+@dataclass(frozen=True)
+class DigitSpanModel:
+    """P(correct | length) = 1 / (1 + exp((length - ability) / slope)), plus lapses."""
+    ability: float = 6.0
+    ability_sd: float = 1.2
+    slope: float = 0.5
+    backward_cost: float = 1.0
+    lapse_rate: float = 0.02
+    rt_per_digit_ms: float = 700.0
+
+    def draw(self, rng: np.random.Generator, n: int) -> Dict[str, np.ndarray]:
+        return {"ability": rng.normal(self.ability, self.ability_sd, n)}
+
+    def respond(self, params: Dict[str, float], trial: Dict[str, Any],
+                rng: np.random.Generator) -> Tuple[Any, float]:
+        stimulus = trial.get("stimulus_data") or {}
+        length = int(stimulus.get("length") or len(stimulus.get("digits") or []))
+        ability = params["ability"] - (self.backward_cost if stimulus.get("direction") == "backward" else 0.0)
+        p_correct = (1.0 - self.lapse_rate) / (1.0 + np.exp((length - ability) / self.slope))
+        expected = str(trial.get("correct_response") or "")
+        rt = float(rng.normal(self.rt_per_digit_ms * max(length, 1), 300.0))
+        if rng.random() < p_correct or len(expected) < 2:
+            return expected, max(rt, 1.0)
+        # Transpose two neighbouring digits: the most common recall error
+        i = int(rng.integers(0, len(expected) - 1))
+        wrong = expected[:i] + expected[i + 1] + expected[i] + expected[i + 2:]
+        return wrong, max(rt, 1.0)
+
+
+MODELS = {
+    "stroop": StroopModel,
+    "sart": SARTModel,
+    "digit_span": DigitSpanModel,
+}
+
+# Condition field the fast path reads from the engine's pre-generated trials
+FAST_PATHS = {
+    "stroop": ("trials", "congruent"),
+    "sart": ("trial_sequence", "is_target"),
+}
+
+
+# ============================================
+# SIMULATION
+# ============================================
+
+def _frame(task: str, n: int, session_index: np.ndarray, trial_number: np.ndarray, rt: np.ndarray,
+           correct: np.ndarray, responded: np.ndarray, fields_: Dict[str, np.ndarray]) -> analytics.ResponseFrame:
+    ids = np.array([f"sim-{i}" for i in range(n)], dtype=object)
+    return analytics.ResponseFrame(
+        experiment_type=task,
+        session_ids=ids,
+        subject_ids=ids,
+        session_index=session_index,
+        trial_number=trial_number,
+        rt=rt.astype(np.float64),
+        correct=correct.astype(np.float64),
+        responded=responded.astype(bool),
+        qc_flags=np.zeros(session_index.size, dtype=np.int64),
+        session_qc_flags=np.zeros(n, dtype=np.int64),
+        fields=fields_
+    )
+
+
+def simulate_fast(task: str, config: Dict[str, Any], model, params: Dict[str, np.ndarray],
+                  rng: np.random.Generator) -> analytics.ResponseFrame:
+    """Whole-batch simulation for engines whose trial sequence is fixed at configure()."""
+    n = next(iter(params.values())).size
+    attribute, field_name = FAST_PATHS[task]
+    conditions = np.array([
+        [bool(t[field_name]) for t in getattr(create_experiment(task, f"sim-{i}", config), attribute)]
+        for i in range(n)
+    ], dtype=bool)
+    n_trials = conditions.shape[1]
+
+    rt, correct, responded = model.respond_batch(params, conditions, rng)
+    return _frame(
+        task, n,
+        session_index=np.repeat(np.arange(n), n_trials),
+        trial_number=np.tile(np.arange(1, n_trials + 1), n),
+        rt=rt.ravel(), correct=correct.ravel(), responded=responded.ravel(),
+        fields_={field_name: conditions.ravel().astype(np.float64)}
+    )
+
+
+def simulate_engine(task: str, config: Dict[str, Any], model, params: Dict[str, np.ndarray],
+                    rng: np.random.Generator) -> analytics.ResponseFrame:
+    """Trial-by-trial simulation through get_next_trial() / record_response()."""
+    n = next(iter(params.values())).size
+    rows = []
+    for i in range(n):
+        inst = create_experiment(task, f"sim-{i}", config)
+        params_i = {name: float(values[i]) for name, values in params.items()}
+        while not inst.is_complete():
+            trial = inst.get_next_trial()
+            if trial is None:
+                break
+            trial = trial.to_dict() if is_dataclass(trial) else trial
+            stimulus = trial.get("stimulus_data") or {}
+            metadata = dict(trial.get("metadata") or {})
+            response, rt = model.respond(params_i, trial, rng)
+            feedback = inst.record_response(ResponseData.from_dict({
+                "trial_number": trial["trial_number"],
+                "response_value": response,
+                "response_time_ms": rt,
+                "correct_response": trial.get("correct_response"),
+                "metadata": {**stimulus, **metadata}
+            }))
+            rows.append((
+                i, trial["trial_number"], rt, bool(feedback.get("correct")), response is not None,
+                float(bool(stimulus.get("is_target", metadata.get("is_target")))),
+                float(bool(metadata.get("congruent"))),
+                float(metadata.get("span_length") or stimulus.get("length") or 0),
+                float(stimulus.get("direction") == "backward"),
+            ))
+
+    columns = np.array(rows, dtype=np.float64).reshape(len(rows), 9)
+    return _frame(
+        task, n,
+        session_index=columns[:, 0].astype(np.int64),
+        trial_number=columns[:, 1].astype(np.int64),
+        rt=columns[:, 2], correct=columns[:, 3], responded=columns[:, 4] == 1,
+        fields_={"is_target": columns[:, 5], "congruent": columns[:, 6],
+                 "span_length": columns[:, 7], "backward": columns[:, 8]}
+    )
+
+
+def score_halves(frame: analytics.ResponseFrame) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """metric -> (all trials, odd trials, even trials), one value per participant."""
+    scorer = analytics.SCORERS.get(frame.experiment_type, analytics.score_accuracy_rt)
+    odd = frame.trial_number % 2 == 1
+    full, odd_scores, even_scores = scorer(frame), scorer(frame.select(odd)), scorer(frame.select(~odd))
+    return {
+        name: (full[name].astype(np.float64), odd_scores[name].astype(np.float64),
+               even_scores[name].astype(np.float64))
+        for name in full if name not in SKIP_METRICS
+    }
+
+
+def simulate_chunk(task: str, config: Dict[str, Any], model, n: int, seed: int,
+                   use_engine: bool = False) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Worker entry point: simulate and score n participants."""
+    # Engines draw their sequences from the `random` module
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    params = model.draw(rng, n)
+    if use_engine or task not in FAST_PATHS:
+        frame = simulate_engine(task, config, model, params, rng)
+    else:
+        frame = simulate_fast(task, config, model, params, rng)
+    return score_halves(frame)
+
+
+# ============================================
+# RELIABILITY
+# ============================================
+
+def _rowwise_corr(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Pearson r of each row pair of two (B, n) matrices."""
+    x = x - x.mean(axis=-1, keepdims=True)
+    y = y - y.mean(axis=-1, keepdims=True)
+    denominator = np.sqrt((x * x).sum(axis=-1) * (y * y).sum(axis=-1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (x * y).sum(axis=-1) / denominator
+
+
+def spearman_brown(r):
+    """Full-length reliability from a split-half correlation."""
+    return 2 * r / (1 + r)
+
+
+def reliability_report(full: np.ndarray, odd: np.ndarray, even: np.ndarray,
+                       n_boot: int, rng: np.random.Generator, ci: float = 0.95) -> Dict[str, Any]:
+    """Group mean and split-half reliability, each with a percentile bootstrap CI."""
+    keep = ~(np.isnan(full) | np.isnan(odd) | np.isnan(even))
+    full, odd, even = full[keep], odd[keep], even[keep]
+    n = full.size
+    if n < 3:
+        return {"n": int(n)}
+
+    tail = (1 - ci) / 2 * 100
+
+    def interval(values: np.ndarray) -> Optional[List[float]]:
+        values = values[np.isfinite(values)]
+        return [float(v) for v in np.percentile(values, [tail, 100 - tail])] if values.size else None
+
+    idx = rng.integers(0, n, size=(n_boot, n))
+    boot_means = full[idx].mean(axis=1)
+    boot_rel = spearman_brown(_rowwise_corr(odd[idx], even[idx]))
+    r = float(_rowwise_corr(odd[None, :], even[None, :])[0])
+    return {
+        "n": int(n),
+        "mean": float(full.mean()),
+        "sd": float(full.std(ddof=1)),
+        "mean_ci": interval(boot_means),
+        "split_half_r": r,
+        "reliability": float(spearman_brown(r)),
+        "reliability_ci": interval(boot_rel),
+    }
+
+
+# ============================================
+# DESIGN SWEEP
+# ============================================
+
+def run_design(task: str, config: Dict[str, Any], model, participants: int,
+               workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               use_engine: bool = False, n_boot: int = 1000, seed: int = 0) -> Dict[str, Any]:
+    """Simulate one design and report every metric's reliability."""
+    seeds = np.random.SeedSequence(seed)
+    chunks = [min(chunk_size, participants - start) for start in range(0, participants, chunk_size)]
+    chunk_seeds = [int(s.generate_state(1)[0]) for s in seeds.spawn(len(chunks))]
+    args = [(task, config, model, n, s, use_engine) for n, s in zip(chunks, chunk_seeds)]
+
+    if workers == 0:
+        parts = [simulate_chunk(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(simulate_chunk, *zip(*args)))
+
+    rng = np.random.default_rng(seeds.generate_state(1)[0])
+    report = {}
+    for name in parts[0]:
+        full, odd, even = (np.concatenate([p[name][k] for p in parts]) for k in range(3))
+        report[name] = reliability_report(full, odd, even, n_boot, rng)
+    return report
+
+
+def _parse_value(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def _parse_assignments(items: List[str]) -> Dict[str, List[Any]]:
+    """["a=1,2", "b=x"] -> {"a": [1, 2], "b": ["x"]}"""
+    parsed = {}
+    for item in items or []:
+        key, _, values = item.partition("=")
+        parsed[key.strip()] = [_parse_value(v.strip()) for v in values.split(",")]
+    return parsed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Simulate virtual participants across experiment designs")
+    parser.add_argument("--task", choices=sorted(MODELS), required=True)
+    parser.add_argument("--participants", type=int, default=1000)
+    parser.add_argument("--set", dest="design", action="append",
+                        help="Design factor, e.g. total_trials=40,80 (repeatable; crossed)")
+    parser.add_argument("--model", action="append", help="Response model parameter, e.g. lapse_rate=0.05")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (0 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--bootstrap", type=int, default=1000, help="Bootstrap resamples")
+    parser.add_argument("--engine", action="store_true", help="Force the trial-by-trial engine path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args(argv)
+
+    model_cls = MODELS[args.task]
+    known = {f.name for f in fields(model_cls)}
+    model_args = {k: v[0] for k, v in _parse_assignments(args.model).items()}
+    unknown = set(model_args) - known
+    if unknown:
+        parser.error(f"Unknown {args.task} model parameters: {', '.join(sorted(unknown))}")
+    model = replace(model_cls(), **model_args)
+
+    design = _parse_assignments(args.design)
+    designs = [dict(zip(design, values)) for values in itertools.product(*design.values())] or [{}]
+
+    results = []
+    for config in designs:
+        started = time.perf_counter()
+        report = run_design(args.task, config, model, args.participants, args.workers,
+                            args.chunk_size, args.engine, args.bootstrap, args.seed)
+        elapsed = time.perf_counter() - started
+        results.append({"config": config, "elapsed_s": elapsed, "metrics": report})
+
+        print(f"\n{args.task} {json.dumps(config)}  ({args.participants} participants, {elapsed:.1f}s)")
+        for name, stats in report.items():
+            if "mean" not in stats:
+                continue
+            line = f"  {name:28s} mean {stats['mean']:10.3f} [{stats['mean_ci'][0]:.3f}, {stats['mean_ci'][1]:.3f}]"
+            if stats["reliability_ci"] is not None:
+                line += (f"  reliability {stats['reliability']:6.3f} "
+                         f"[{stats['reliability_ci'][0]:.3f}, {stats['reliability_ci'][1]:.3f}]")
+            print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"task": args.task, "model": model.__dict__, "designs": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,170 @@
+"""
+FILE: backend/startup_report.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Worker boot-time report. Starts a fresh interpreter the way
+                  a worker does (import app_FIXED, create_app()), times each
+                  startup phase and lists the heaviest imports, so
+                  regressions in cold start show up in review and CI.
+
+METHOD: `python -X importtime` in a child process
+    - The child imports app_FIXED, calls create_app() (logging, CSRF,
+      routes, schema creation), then times a schema version check of the
+      existing database and the first request. The database and log file
+      live in a temporary directory, so the checkout is never modified
+    - Its importtime trace (stderr) is parsed: direct imports of app_FIXED
+      by cumulative time, and the modules with the most self time overall
+    - Deferred modules (numpy, engines, Pillow) are reported as loaded or
+      not loaded at boot; anything heavy that appears at boot is a
+      regression
+    - --budget-ms makes the command exit with status 1 when importing
+      app_FIXED plus create_app() exceeds the budget (for CI)
+
+USAGE:
+    python -m backend.startup_report
+    python -m backend.startup_report --top 15 --budget-ms 600
+    python -m backend.startup_report --json
+    python -m backend.startup_report --app-dir /path/to/other/checkout
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# Modules that should not be imported by a worker before its first request
+DEFERRED = ("numpy", "PIL", "backend.analytics", "backend.quality", "backend.session_results",
+            "backend.experiments.stroop", "backend.experiments.adaptive")
+
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app_FIXED
+imported = time.perf_counter()
+app = app_FIXED.create_app(%r)
+created = time.perf_counter()
+app_FIXED.init_db()
+checked = time.perf_counter()
+app.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'schema_check_ms': (checked - created) * 1000,
+    'first_request_ms': (served - checked) * 1000,
+    'deferred': {name: name in sys.modules for name in %r},
+}))
+"""
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+@dataclass(frozen=True)
+class ImportTiming:
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+def parse_importtime(trace: str) -> List[ImportTiming]:
+    timings = []
+    for line in trace.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            timings.append(ImportTiming(module, int(self_us) / 1000, int(cumulative_us) / 1000,
+                                        (len(indent) - 1) // 2))
+    return timings
+
+
+def children_of(timings: List[ImportTiming], module: str) -> List[ImportTiming]:
+    """Direct imports of a top-level module (importtime prints children before their parent)."""
+    children: List[ImportTiming] = []
+    for timing in timings:
+        if timing.depth == 0:
+            if timing.module == module:
+                return children
+            children = []
+        elif timing.depth == 1:
+            children.append(timing)
+    return []
+
+
+def measure(app_dir: Path = APP_DIR) -> Dict[str, Any]:
+    """Boot app_FIXED in a fresh interpreter -> timings."""
+    with tempfile.TemporaryDirectory(prefix="startup-report-") as tmp:
+        overrides = {"DB_PATH": os.path.join(tmp, "app.db"), "LOG_FILE": os.path.join(tmp, "app.log")}
+        started = time.perf_counter()
+        child = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD % (overrides, DEFERRED)],
+                               cwd=app_dir, capture_output=True, text=True,
+                               env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+        wall_ms = (time.perf_counter() - started) * 1000
+    if child.returncode != 0:
+        raise RuntimeError(f"Starting app_FIXED failed:\n{child.stderr[-2000:]}")
+
+    timings = parse_importtime(child.stderr)
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    result["wall_ms"] = wall_ms
+    result["boot_ms"] = result["import_ms"] + result["create_app_ms"]
+    result["app_imports"] = sorted(children_of(timings, "app_FIXED"), key=lambda t: -t.cumulative_ms)
+    result["self_time"] = sorted(timings, key=lambda t: -t.self_ms)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time a cold start of app_FIXED")
+    parser.add_argument("--top", type=int, default=10, help="Imports to list")
+    parser.add_argument("--budget-ms", type=float, help="Fail when import + create_app() take longer")
+    parser.add_argument("--json", action="store_true", help="Machine-readable output")
+    parser.add_argument("--app-dir", type=Path, default=APP_DIR,
+                        help="Directory holding app_FIXED.py (e.g. another checkout to compare)")
+    args = parser.parse_args(argv)
+
+    result = measure(args.app_dir)
+    over_budget = args.budget_ms is not None and result["boot_ms"] > args.budget_ms
+
+    if args.json:
+        print(json.dumps({
+            **{k: result[k] for k in ("wall_ms", "boot_ms", "import_ms", "create_app_ms", "schema_check_ms",
+                                      "first_request_ms", "deferred")},
+            "app_imports": [t.__dict__ for t in result["app_imports"][:args.top]],
+            "self_time": [t.__dict__ for t in result["self_time"][:args.top]],
+            "over_budget": over_budget,
+        }, indent=2))
+        return 1 if over_budget else 0
+
+    print(f"Interpreter start to first response: {result['wall_ms']:8.1f} ms")
+    print(f"  import app_FIXED                  {result['import_ms']:8.1f} ms")
+    print(f"  create_app()                      {result['create_app_ms']:8.1f} ms")
+    print(f"  schema version check              {result['schema_check_ms']:8.1f} ms")
+    print(f"  first request (GET /)             {result['first_request_ms']:8.1f} ms")
+    print(f"\nHeaviest imports of app_FIXED (cumulative / self ms):")
+    for t in result["app_imports"][:args.top]:
+        print(f"  {t.cumulative_ms:8.1f} {t.self_ms:8.1f}  {t.module}")
+    print(f"\nMost self time (ms):")
+    for t in result["self_time"][:args.top]:
+        print(f"  {t.self_ms:8.1f}  {t.module}")
+    print(f"\nDeferred until first use:")
+    for name, loaded in result["deferred"].items():
+        print(f"  {name:<32} {'LOADED AT BOOT' if loaded else 'deferred'}")
+    if over_budget:
+        print(f"\nBoot took {result['boot_ms']:.1f} ms, over the {args.budget_ms:g} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,217 @@
+"""
+FILE: backend/structured_logging.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Non-blocking, structured logging for the web app. Request
+                  threads only put records on a queue; a listener thread
+                  formats them as JSON lines and writes them to a rotating
+                  file (and the console), so logging never adds disk I/O or
+                  traceback formatting to a request's latency.
+
+METHOD: QueueHandler -> QueueListener
+    - NonBlockingQueueHandler (request thread): stamps correlation IDs,
+      applies sampling, merges the message, then put_nowait() on a bounded
+      queue. When the queue is full the record is dropped and counted
+      rather than blocking the request; the count is logged once the
+      queue drains. Tracebacks (exc_info) are formatted by the listener
+    - Correlation IDs: bind(session_id=..., request_id=...) sets context
+      variables for the current request; every record logged while they
+      are set carries them. extra={'session_id': ...} overrides
+    - Sampling: records with extra={'event': name} are kept at the rate
+      configured for that event. The decision hashes the session ID, so a
+      kept session keeps all of its sampled events (start and complete).
+      WARNING and above are never sampled
+    - Rotation: "size" (RotatingFileHandler, max_bytes x backup_count) or
+      "time" (TimedRotatingFileHandler, e.g. at midnight)
+    - File lines are JSON: ts, level, logger, msg, request_id, session_id,
+      event, any other extra fields, exc (formatted traceback)
+
+USAGE:
+    listener = setup('app.log', rotate='size', sample_rates={'session_start': 0.1})
+    with bind(session_id=sid):
+        logger.info("...")
+    grep '"session_id": "stroop-...' app.log
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Any, Dict, Iterator, Optional
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+import contextvars
+import datetime
+import json
+import logging
+import queue
+import threading
+import zlib
+
+ROTATIONS = ("size", "time")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_session_id = contextvars.ContextVar("session_id", default=None)
+
+# Attributes every LogRecord has; anything else came from `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+@contextmanager
+def bind(**ids: Optional[str]) -> Iterator[None]:
+    """Correlation IDs (request_id, session_id) for records logged in this block."""
+    tokens = set_context(**ids)
+    try:
+        yield
+    finally:
+        reset_context(tokens)
+
+
+def set_context(request_id: Optional[str] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Set the correlation IDs of the current context -> tokens for reset_context()."""
+    return {"request_id": _request_id.set(request_id), "session_id": _session_id.set(session_id)}
+
+
+def reset_context(tokens: Dict[str, Any]) -> None:
+    _request_id.reset(tokens["request_id"])
+    _session_id.reset(tokens["session_id"])
+
+
+def current_ids() -> Dict[str, Optional[str]]:
+    return {"request_id": _request_id.get(), "session_id": _session_id.get()}
+
+
+def parse_rates(spec: str) -> Dict[str, float]:
+    """Parse "event=rate,..." (e.g. "session_start=0.1") -> {event: rate}; raises ValueError."""
+    rates = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        event, _, rate = part.partition("=")
+        value = float(rate)
+        if not 0.0 <= value <= 1.0:
+            raise ValueError(f"Sample rate for {event} must be between 0 and 1")
+        rates[event.strip()] = value
+    return rates
+
+
+def sampled(event: str, key: Optional[str], rate: float) -> bool:
+    """Keep this record? Deterministic per key, so a session is kept or dropped as a whole."""
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    return zlib.crc32(f"{key}".encode("utf-8")) % 10000 < rate * 10000
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Enqueues on the caller's thread without formatting, sampling on the way in."""
+
+    def __init__(self, log_queue: queue.Queue, sample_rates: Optional[Dict[str, float]] = None):
+        super().__init__(log_queue)
+        self.sample_rates = dict(sample_rates or {})
+        self.dropped = 0
+        self.sampled_out = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not super().filter(record):
+            return False
+        ids = current_ids()
+        for key, value in ids.items():
+            if getattr(record, key, None) is None:
+                setattr(record, key, value)
+        event = getattr(record, "event", None)
+        if event in self.sample_rates and record.levelno < logging.WARNING:
+            if not sampled(event, record.session_id or record.request_id, self.sample_rates[event]):
+                self.sampled_out += 1
+                return False
+        return True
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may change after the call), but leave
+        # exc_info for the listener: formatting tracebacks is the slow part
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        if self.dropped:
+            with self._lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                note = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                         f"Log queue was full: dropped {dropped} records", None, None)
+                note.dropped_records = dropped
+                try:
+                    self.queue.put_nowait(note)
+                except queue.Full:
+                    with self._lock:
+                        self.dropped += dropped + 1
+
+
+def file_handler(path: str, rotate: str = "size", max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5, when: str = "midnight") -> logging.Handler:
+    if rotate not in ROTATIONS:
+        raise ValueError(f"Log rotation must be one of {', '.join(ROTATIONS)}")
+    if rotate == "size":
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    else:
+        handler = TimedRotatingFileHandler(path, when=when, backupCount=backup_count, encoding="utf-8", utc=True)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def setup(path: str, level: int = logging.INFO, rotate: str = "size", max_bytes: int = 10 * 1024 * 1024,
+          backup_count: int = 5, when: str = "midnight", sample_rates: Optional[Dict[str, float]] = None,
+          console_json: bool = False, queue_size: int = 10000) -> QueueListener:
+    """Route the root logger through a queue to a rotating JSON file and the console -> started listener."""
+    console = logging.StreamHandler()
+    console.setFormatter(JsonFormatter() if console_json else logging.Formatter(TEXT_FORMAT))
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    listener = QueueListener(log_queue, file_handler(path, rotate, max_bytes, backup_count, when), console,
+                             respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(NonBlockingQueueHandler(log_queue, sample_rates))
+    root.setLevel(level)
+    listener.start()
+    return listener
+
+
+def queue_handler() -> Optional[NonBlockingQueueHandler]:
+    """The installed queue handler (for its dropped / sampled counters)."""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            return handler
+    return None
@@ -0,0 +1,110 @@
+"""
+FILE: backend/trial_channel.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Message protocol of the per-session trial channel. Trials,
+                  responses and feedback travel as small messages on one
+                  persistent channel instead of a /next and a /record HTTP
+                  POST per trial.
+
+METHOD: Transport-independent message handling
+    - Transports: WebSocket /ws/<type>?session_id=... (ASGI mode,
+      asgi_app.py), or POST /api/<type>/channel (HTTP fallback: each
+      request carries a batch of client messages and returns the server
+      messages they produced)
+    - Client -> server: {"op": "next"}, {"op": "record", "response": {...}},
+      {"op": "ping"}; an optional "id" is echoed on the direct reply
+    - Server -> client: {"op": "trial", "trial": ...}, {"op": "feedback",
+      "feedback": ...}, {"op": "complete", "results": ..., ...},
+      {"op": "error", "error": ...}, {"op": "pong"}
+    - Push after record: the server computes the next trial as soon as the
+      response is scored and sends it straight after the feedback, so one
+      trial costs one client message and no extra round trip; adaptive
+      procedures see the response before the next level is chosen
+    - Battery hand-off: a complete message carrying next_task rebinds the
+      channel to the next task's session (rebind())
+    - handle() works on the app's (payload, status) results, so the HTTP
+      routes, the fallback and the WebSocket share one code path
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
+import json
+
+
+CLIENT_OPS = ("next", "record", "ping")
+
+# Largest accepted client message (bytes) and messages per fallback request
+MAX_MESSAGE_BYTES = 64 * 1024
+MAX_BATCH = 50
+
+Payload = Tuple[Dict[str, Any], int]
+
+
+def decode(raw: Union[str, bytes, None]) -> Dict[str, Any]:
+    """Parse one WebSocket frame; raises ValueError."""
+    if not raw:
+        raise ValueError("empty message")
+    if len(raw) > MAX_MESSAGE_BYTES:
+        raise ValueError("message too large")
+    return validate(json.loads(raw))
+
+
+def validate(message: Any) -> Dict[str, Any]:
+    """Check the shape of a client message; raises ValueError."""
+    if not isinstance(message, dict) or message.get("op") not in CLIENT_OPS:
+        raise ValueError(f"op must be one of {', '.join(CLIENT_OPS)}")
+    if message["op"] == "record" and not isinstance(message.get("response"), dict):
+        raise ValueError("record needs a response object")
+    return message
+
+
+def _reply(message: Dict[str, Any], request: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if request and "id" in request:
+        message["id"] = request["id"]
+    return message
+
+
+def error(text: str, request: Any = None) -> Dict[str, Any]:
+    return _reply({"op": "error", "error": text}, request if isinstance(request, dict) else None)
+
+
+def from_payload(payload: Dict[str, Any], status: int,
+                 request: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Turn an API (payload, status) result into a server message."""
+    if status != 200 or "error" in payload:
+        return error(payload.get("error", "Request failed"), request)
+    if "feedback" in payload:
+        return _reply({"op": "feedback", "feedback": payload["feedback"]}, request)
+    if payload.get("complete"):
+        rest = {k: v for k, v in payload.items() if k not in ("trial", "complete")}
+        return _reply({"op": "complete", **rest}, request)
+    return _reply({"op": "trial", "trial": payload.get("trial")}, request)
+
+
+def handle(message: Dict[str, Any], next_trial: Callable[[], Payload],
+           record: Callable[[Dict[str, Any]], Payload]) -> List[Dict[str, Any]]:
+    """
+    Server messages for one validated client message. next_trial() and
+    record(response) are the app's payload functions for the bound session.
+    """
+    op = message["op"]
+    if op == "ping":
+        return [_reply({"op": "pong"}, message)]
+    if op == "next":
+        return [from_payload(*next_trial(), message)]
+
+    feedback = from_payload(*record(message["response"]), message)
+    if feedback["op"] == "error":
+        return [feedback]
+    return [feedback, from_payload(*next_trial())]
+
+
+def rebind(replies: List[Dict[str, Any]], session_id: str) -> str:
+    """Session the channel is bound to after sending `replies` (battery hand-off)."""
+    for message in replies:
+        if message["op"] == "complete" and message.get("next_task"):
+            session_id = message["next_task"]["session_id"]
+    return session_id
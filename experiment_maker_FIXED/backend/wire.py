@@ -0,0 +1,254 @@
+"""
+FILE: backend/wire.py
+DIRECTORY: /backend/
+
+FUNCTIONAL ROLE: Compact binary encoding of trial blocks and response
+                  batches, as an optional alternative to JSON on
+                  /api/<type>/block and /api/<type>/record_block.
+
+METHOD: Block header plus struct-packed columns (standard library only)
+    - Works on the columnar block shape engines already return from
+      get_trial_block(): values shared by every trial live once in the
+      block header, per-trial values are parallel columns
+    - Each column is packed with the narrowest lossless type: bool / int8 /
+      int16 / int32 (little-endian), float32 when every value survives the
+      round trip, float64 otherwise (null = NaN), dictionary-coded strings
+      (category table + u8/u16 codes; fewer than 65536 categories of under
+      64 KiB each); anything else falls back to a JSON array. Key names
+      appear once per block instead of once per trial
+    - Size: a block is well under half its JSON size uncompressed. Under
+      gzip (e.g. at a reverse proxy) the gap mostly closes, and
+      response batches come out slightly larger than gzipped JSON while
+      encoding about 1.5-2x slower (decode is on par). The format only
+      pays off on uncompressed transports
+    - Decoding returns plain Python lists, so engines see the same block
+      whichever encoding the client chose
+    - frontend/static/js/wire.js implements the same layout for the browser
+
+LAYOUT (little-endian):
+    magic "EMWB" | version u8 | n_columns u16 | n_rows u32 | meta_len u32
+    meta: UTF-8 JSON object (every block field except "columns")
+    per column: name_len u8 | type u8 | name UTF-8 | payload
+        BOOL/INT8 n bytes, INT16 2n, INT32 4n, FLOAT32 4n, FLOAT64 8n
+        STRINGS   n_categories u16, (len u16 + UTF-8) each, codes u8
+                  (u16 when more than 256 categories)
+        JSON      len u32 + UTF-8 JSON array
+
+USAGE:
+    python -m backend.wire     # size and timing comparison against JSON
+
+VERSION: 3.1.0
+LAST MODIFIED: 2026-10-19
+"""
+
+from typing import Dict, Any, List, Tuple
+import json
+import struct
+
+
+CONTENT_TYPE = "application/x-experiment-block"
+MAGIC = b"EMWB"
+VERSION = 1
+
+BOOL, INT8, INT16, INT32, FLOAT32, FLOAT64, STRINGS, JSON = range(1, 9)
+
+_PREAMBLE = struct.Struct("<4sBHII")
+_COLUMN = struct.Struct("<BB")
+_FORMATS = {BOOL: "?", INT8: "b", INT16: "h", INT32: "i", FLOAT32: "f", FLOAT64: "d"}
+_SIZES = {code: struct.calcsize(fmt) for code, fmt in _FORMATS.items()}
+_INT_TYPES = ((INT8, -2 ** 7, 2 ** 7), (INT16, -2 ** 15, 2 ** 15), (INT32, -2 ** 31, 2 ** 31))
+_NAN = float("nan")
+
+
+def _column_type(values: List[Any]) -> int:
+    """Narrowest lossless packing for one column."""
+    if not values:
+        return JSON
+    kinds = {type(v) for v in values}
+    if kinds == {bool}:
+        return BOOL
+    if kinds == {int}:
+        low, high = min(values), max(values)
+        for code, lower, upper in _INT_TYPES:
+            if lower <= low and high < upper:
+                return code
+        return JSON
+    if kinds <= {int, float, type(None)}:
+        numbers = [v for v in values if v is not None]
+        if any(v != v for v in numbers):
+            return JSON  # NaN is reserved for null
+        try:
+            single = struct.unpack(f"<{len(numbers)}f", struct.pack(f"<{len(numbers)}f", *numbers))
+        except OverflowError:
+            return FLOAT64
+        return FLOAT32 if list(single) == numbers else FLOAT64
+    if kinds == {str}:
+        categories = set(values)
+        # Category count and each category's byte length are packed as u16
+        if len(categories) < 2 ** 16 and all(len(v.encode("utf-8")) < 2 ** 16 for v in categories):
+            return STRINGS
+    return JSON
+
+
+def _pack_column(values: List[Any], code: int) -> bytes:
+    if code == JSON:
+        payload = json.dumps(values, separators=(",", ":")).encode("utf-8")
+        return struct.pack("<I", len(payload)) + payload
+    if code == STRINGS:
+        categories = list(dict.fromkeys(values))
+        index = {value: i for i, value in enumerate(categories)}
+        parts = [struct.pack("<H", len(categories))]
+        for value in categories:
+            raw = value.encode("utf-8")
+            parts.append(struct.pack("<H", len(raw)) + raw)
+        fmt = "B" if len(categories) <= 256 else "H"
+        parts.append(struct.pack(f"<{len(values)}{fmt}", *(index[v] for v in values)))
+        return b"".join(parts)
+    if code in (FLOAT32, FLOAT64):
+        values = [_NAN if v is None else v for v in values]
+    return struct.pack(f"<{len(values)}{_FORMATS[code]}", *values)
+
+
+def encode(block: Dict[str, Any]) -> bytes:
+    """Pack a columnar block ({"columns": {name: [...]}, ...meta}) into bytes."""
+    columns = block.get("columns") or {}
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("Block columns must all have the same length")
+    n_rows = lengths.pop() if lengths else 0
+
+    meta = json.dumps({k: v for k, v in block.items() if k != "columns"},
+                      separators=(",", ":")).encode("utf-8")
+    parts = [_PREAMBLE.pack(MAGIC, VERSION, len(columns), n_rows, len(meta)), meta]
+    for name, values in columns.items():
+        raw_name = name.encode("utf-8")
+        if len(raw_name) > 255:
+            raise ValueError(f"Column name too long: {name[:20]}...")
+        values = list(values)
+        code = _column_type(values)
+        parts.append(_COLUMN.pack(len(raw_name), code) + raw_name)
+        parts.append(_pack_column(values, code))
+    return b"".join(parts)
+
+
+def _unpack_column(data: bytes, offset: int, code: int, n_rows: int) -> Tuple[List[Any], int]:
+    if code == JSON:
+        (length,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        values = json.loads(data[offset:offset + length])
+        if not isinstance(values, list) or len(values) != n_rows:
+            raise ValueError("JSON column does not match the row count")
+        return values, offset + length
+    if code == STRINGS:
+        (n_categories,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        categories = []
+        for _ in range(n_categories):
+            (length,) = struct.unpack_from("<H", data, offset)
+            categories.append(data[offset + 2:offset + 2 + length].decode("utf-8"))
+            offset += 2 + length
+        fmt, size = ("B", 1) if n_categories <= 256 else ("H", 2)
+        codes = struct.unpack_from(f"<{n_rows}{fmt}", data, offset)
+        try:
+            return [categories[c] for c in codes], offset + n_rows * size
+        except IndexError:
+            raise ValueError("String code outside the category table")
+    if code not in _FORMATS:
+        raise ValueError(f"Unknown column type {code}")
+
+    values = list(struct.unpack_from(f"<{n_rows}{_FORMATS[code]}", data, offset))
+    if code in (FLOAT32, FLOAT64):
+        values = [None if v != v else v for v in values]
+    return values, offset + n_rows * _SIZES[code]
+
+
+def _unpack_meta(data: bytes) -> Tuple[Dict[str, Any], int, int, int]:
+    """Preamble and meta -> (meta, offset of the first column, n_columns, n_rows)."""
+    magic, version, n_columns, n_rows, meta_len = _PREAMBLE.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version 1 experiment block")
+    offset = _PREAMBLE.size
+    meta = json.loads(data[offset:offset + meta_len] or b"{}")
+    if not isinstance(meta, dict):
+        raise ValueError("Block meta must be a JSON object")
+    return meta, offset + meta_len, n_columns, n_rows
+
+
+def decode_meta(raw: bytes) -> Dict[str, Any]:
+    """Block fields other than the columns (e.g. session_id) without unpacking the columns."""
+    try:
+        return _unpack_meta(bytes(raw))[0]
+    except (struct.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Malformed binary block: {e}")
+
+
+def decode(raw: bytes) -> Dict[str, Any]:
+    """Inverse of encode(); raises ValueError on malformed input."""
+    data = bytes(raw)
+    try:
+        block, offset, n_columns, n_rows = _unpack_meta(data)
+        columns = {}
+        for _ in range(n_columns):
+            name_len, code = _COLUMN.unpack_from(data, offset)
+            offset += _COLUMN.size
+            name = data[offset:offset + name_len].decode("utf-8")
+            columns[name], offset = _unpack_column(data, offset + name_len, code, n_rows)
+    except (struct.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Malformed binary block: {e}")
+    if offset != len(data):
+        raise ValueError("Trailing bytes after binary block")
+    block["columns"] = columns
+    return block
+
+
+def _benchmark(repeat: int = 200) -> None:
+    """Payload sizes and encode/decode times of one SART session, JSON vs binary."""
+    import gzip
+    import random
+    import time
+    from .experiments.sart import SARTExperiment
+
+    def timed(fn, arg):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn(arg)
+        return (time.perf_counter() - started) / repeat * 1e6
+
+    sart = SARTExperiment("bench", {})
+    per_trial = [json.dumps({"trial": sart.get_next_trial().to_dict()}) for _ in range(sart.total_trials)]
+    sart = SARTExperiment("bench", {})
+    blocks = []
+    while (block := sart.get_trial_block()) is not None:
+        blocks.append(block)
+    rng = random.Random(1)
+    responses = [{
+        "columns": {
+            "trial_number": block["columns"]["trial_number"],
+            "response_value": ["" if target else "space" for target in block["columns"]["is_target"]],
+            "response_time_ms": [None if target else round(rng.uniform(250, 700), 3)
+                                 for target in block["columns"]["is_target"]],
+            "hidden_ms": [0] * len(block["columns"]["trial_number"])
+        }
+    } for block in blocks]
+
+    compact = lambda obj: json.dumps(obj, separators=(",", ":"))
+    print(f"SART, {sart.total_trials} trials in {len(blocks)} blocks (sizes summed over the session)")
+    print(f"{'payload':<34} {'bytes':>8} {'gzip':>8} {'encode us':>10} {'decode us':>10}")
+    rows = [("trial JSON, one /next per trial", [s.encode() for s in per_trial], None, None)]
+    for label, items in (("trial blocks", blocks), ("response batches", responses)):
+        json_payloads = [compact(b).encode() for b in items]
+        binary_payloads = [encode(b) for b in items]
+        rows.append((f"{label}, JSON", json_payloads,
+                     sum(timed(compact, b) for b in items), sum(timed(json.loads, p) for p in json_payloads)))
+        rows.append((f"{label}, binary", binary_payloads,
+                     sum(timed(encode, b) for b in items), sum(timed(decode, p) for p in binary_payloads)))
+        assert all(decode(p)["columns"] == b["columns"] for p, b in zip(binary_payloads, items))
+    for label, payloads, encode_us, decode_us in rows:
+        size = sum(len(p) for p in payloads)
+        zipped = sum(len(gzip.compress(p)) for p in payloads)
+        timing = f"{encode_us:>10.1f} {decode_us:>10.1f}" if encode_us is not None else f"{'-':>10} {'-':>10}"
+        print(f"{label:<34} {size:>8} {zipped:>8} {timing}")
+
+
+if __name__ == "__main__":
+    _benchmark()
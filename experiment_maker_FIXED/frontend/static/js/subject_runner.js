@@ -1,31 +1,125 @@
 
 let SESSION=null, CURRENT_TRIAL=null, START_TIME=0;
+let CHANNEL=null; // WebSocket trial channel; null -> HTTP fallback (POST /api/<type>/channel)
+let BLOCK=null; // block delivery: {block, i, out} while a served block is running (binary, see wire.js)
+let DEADLINE_TIMER=null; // adaptive response deadline (stimulus_data.response_deadline_ms)
+let HIDDEN_MS=0, HIDDEN_AT=null; // time the tab was hidden during the current trial (server QC)
 function nowMs(){ return performance.now(); }
+function hiddenMs(){ return HIDDEN_MS + (HIDDEN_AT!==null ? nowMs()-HIDDEN_AT : 0); }
+document.addEventListener('visibilitychange', ()=>{
+  if (document.hidden){ HIDDEN_AT=nowMs(); }
+  else if (HIDDEN_AT!==null){ HIDDEN_MS+=nowMs()-HIDDEN_AT; HIDDEN_AT=null; }
+});
 function renderStim(stim){
-  const screen=document.getElementById('screen');
+  const screen=document.getElementById('screen'); screen.style.textAlign='';
   if (stim.sequence){ screen.textContent='Memorize:\n'+stim.sequence.join(' '); }
   else if (typeof stim.digit!=='undefined'){ screen.textContent=String(stim.digit); }
   else if (stim.word && stim.ink_color){
     const span=document.createElement('span'); span.textContent=stim.word; span.style.fontSize='64px'; span.style.fontWeight='bold'; span.style.color=stim.ink_color;
     screen.innerHTML=''; screen.appendChild(span);
+  } else if (stim.side){
+    const dot=document.createElement('span'); dot.textContent='\u25CF'; dot.style.fontSize='64px';
+    dot.style.color=stim.color||(stim.cue_colors||{})[stim.condition]||'black';
+    screen.innerHTML=''; screen.style.textAlign=stim.side; screen.appendChild(dot);
   } else { screen.textContent=JSON.stringify(stim,null,2); }
 }
+function openChannel(){
+  // ASGI mode serves /ws/<type>; under plain WSGI the handshake fails and messages go over HTTP
+  return new Promise(resolve=>{
+    if (!window.WebSocket){ resolve(null); return; }
+    const proto=location.protocol==='https:' ? 'wss' : 'ws';
+    const ws=new WebSocket(`${proto}://${location.host}/ws/${window.EXP_TYPE}?session_id=${encodeURIComponent(SESSION)}`);
+    const timer=setTimeout(()=>{ ws.close(); resolve(null); }, 3000);
+    ws.onopen=()=>{ clearTimeout(timer); ws.onmessage=e=>onChannelMessage(JSON.parse(e.data)); ws.onclose=()=>{ if (CHANNEL===ws) CHANNEL=null; }; resolve(ws); };
+    ws.onerror=()=>{ clearTimeout(timer); resolve(null); };
+  });
+}
+async function channelSend(message){
+  if (CHANNEL && CHANNEL.readyState===WebSocket.OPEN){ CHANNEL.send(JSON.stringify(message)); return; }
+  const r=await fetch(`/api/${window.EXP_TYPE}/channel`, {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({session_id: SESSION, messages:[message]})});
+  const data=await r.json(); (data.messages||[]).forEach(onChannelMessage);
+}
+function onChannelMessage(msg){
+  const screen=document.getElementById('screen');
+  if (msg.op==='trial'){ showTrial(msg.trial); return; }
+  if (msg.op==='error'){ screen.textContent='Error: '+msg.error; return; }
+  if (msg.op!=='complete') return; // feedback / pong
+  if (msg.next_task){ handOff(msg.next_task); return; }
+  screen.textContent='Complete.\n'+JSON.stringify(msg.results||{},null,2); window.removeEventListener('keydown', onKey);
+  if (CHANNEL){ CHANNEL.close(); }
+}
+async function handOff(task){
+  // Battery hand-off: the next task's first block or trial came along
+  SESSION=task.session_id; window.EXP_TYPE=task.experiment_type;
+  if (CHANNEL){ CHANNEL.close(); }
+  CHANNEL=await openChannel();
+  if (task.block){ runBlock(task.block); } else if (task.trial){ showTrial(task.trial); } else { channelSend({op:'next'}); }
+}
+async function fetchBlock(){
+  // Engines with block delivery answer in the binary encoding; the rest run trial by trial on the channel
+  const r=await fetch(`/api/${window.EXP_TYPE}/block`, {method:'POST', headers:{'Content-Type':'application/json', 'Accept': WIRE.CONTENT_TYPE}, body: JSON.stringify({session_id: SESSION})});
+  if ((r.headers.get('Content-Type')||'').startsWith(WIRE.CONTENT_TYPE)){ runBlock(WIRE.decode(await r.arrayBuffer())); return; }
+  const data=await r.json();
+  if (r.ok){ onChannelMessage(Object.assign({}, data, {op:'complete'})); } else { channelSend({op:'next'}); }
+}
+function runBlock(block){
+  BLOCK={block, i:0, out:{trial_number:[], response_value:[], response_time_ms:[], hidden_ms:[]}}; nextBlockTrial();
+}
+function nextBlockTrial(){
+  const {block, i}=BLOCK, cols=block.columns;
+  if (i>=cols.trial_number.length){ finishBlock(); return; }
+  const stim=Object.assign({}, block.header||{});
+  for (const k of Object.keys(cols)){ if (k!=='trial_number' && k!=='correct_response') stim[k]=cols[k][i]; }
+  showTrial({trial_number: cols.trial_number[i], stimulus_data: stim, correct_response: (cols.correct_response||[])[i]});
+  const windowMs=stim.response_window_ms||stim.response_timeout_ms;
+  if (windowMs && DEADLINE_TIMER===null){ DEADLINE_TIMER=setTimeout(()=>sendResponse(''), windowMs); }
+}
+async function finishBlock(){
+  const body=WIRE.encode({session_id: SESSION, block_number: BLOCK.block.block_number, columns: BLOCK.out}); BLOCK=null;
+  for (;;){
+    const r=await fetch(`/api/${window.EXP_TYPE}/record_block`, {method:'POST', headers:{'Content-Type': WIRE.CONTENT_TYPE}, body});
+    if (r.ok) break;
+    // Rate limited: send the same block again once the server allows it; any other failure stops the run
+    if (r.status===429){ await new Promise(done=>setTimeout(done, 1000*(Number(r.headers.get('Retry-After'))||1))); continue; }
+    const data=await r.json().catch(()=>({}));
+    document.getElementById('screen').textContent='Error: '+(data.error||`block not saved (HTTP ${r.status})`); window.removeEventListener('keydown', onKey);
+    return;
+  }
+  fetchBlock();
+}
 async function start(){
-  const r=await fetch(`/api/${window.EXP_TYPE}/start`, {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({config:{}})});
-  const data=await r.json(); SESSION=data.session_id; nextTrial();
+  if (window.BATTERY){
+    // Battery: the server plans every task; completions hand over to the next one
+    const r=await fetch('/api/battery/start', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({battery: window.BATTERY, subject_id: window.SUBJECT_ID||'', blocks: true})});
+    const data=await r.json(); SESSION=data.session_id; window.EXP_TYPE=data.experiment_type;
+  } else {
+    const r=await fetch(`/api/${window.EXP_TYPE}/start`, {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({config:{}})});
+    const data=await r.json(); SESSION=data.session_id;
+  }
+  CHANNEL=await openChannel(); fetchBlock();
 }
-async function nextTrial(){
-  const r=await fetch(`/api/${window.EXP_TYPE}/next`, {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({session_id: SESSION})});
-  const data=await r.json(); const screen=document.getElementById('screen');
-  if (data.complete || !data.trial){ screen.textContent='Complete.\n'+JSON.stringify(data.results||{},null,2); window.removeEventListener('keydown', onKey); return; }
-  CURRENT_TRIAL=data.trial; renderStim(CURRENT_TRIAL.stimulus_data||{}); START_TIME=nowMs();
+function showTrial(trial){
+  CURRENT_TRIAL=trial; renderStim(CURRENT_TRIAL.stimulus_data||{}); START_TIME=nowMs();
+  HIDDEN_MS=0; HIDDEN_AT=document.hidden ? START_TIME : null;
+  const deadline=(CURRENT_TRIAL.stimulus_data||{}).response_deadline_ms;
+  if (deadline){ DEADLINE_TIMER=setTimeout(()=>sendResponse(''), deadline); }
 }
-async function sendResponse(val){
+function sendResponse(val){
   if (!CURRENT_TRIAL) return;
+  if (DEADLINE_TIMER!==null){ clearTimeout(DEADLINE_TIMER); DEADLINE_TIMER=null; }
   const rt=Math.max(0, nowMs()-START_TIME);
-  const payload={ session_id: SESSION, response: { trial_number: CURRENT_TRIAL.trial_number||0, response_value: String(val), response_time_ms: rt, correct_response: CURRENT_TRIAL.correct_response, metadata: CURRENT_TRIAL.metadata||{} } };
-  await fetch(`/api/${window.EXP_TYPE}/record`, {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload)});
-  CURRENT_TRIAL=null; nextTrial();
+  if (BLOCK){
+    // Block mode: collect columns locally, keep the trial's pace, send the block when it is done
+    const stim=CURRENT_TRIAL.stimulus_data||{}, out=BLOCK.out;
+    out.trial_number.push(CURRENT_TRIAL.trial_number); out.response_value.push(String(val));
+    out.response_time_ms.push(val==='' ? null : rt); out.hidden_ms.push(Math.round(hiddenMs()));
+    CURRENT_TRIAL=null; BLOCK.i++;
+    setTimeout(nextBlockTrial, Math.max(0, (stim.digit_display_ms||0)+(stim.mask_duration_ms||0)-rt));
+    return;
+  }
+  const response={ trial_number: CURRENT_TRIAL.trial_number||0, response_value: String(val), response_time_ms: rt, correct_response: CURRENT_TRIAL.correct_response, metadata: Object.assign({}, CURRENT_TRIAL.metadata||{}, {hidden_ms: Math.round(hiddenMs())}) };
+  // The server answers with feedback and pushes the next trial right behind it
+  CURRENT_TRIAL=null; channelSend({op:'record', response});
 }
 function onKey(e){
   const stim=(CURRENT_TRIAL && CURRENT_TRIAL.stimulus_data)||{};
@@ -38,6 +132,7 @@ function onKey(e){
     return;
   }
   if (typeof stim.digit!=='undefined'){ if (e.code==='Space'){ sendResponse('space'); } return; }
+  if (stim.side){ if (e.key==='ArrowLeft'){ sendResponse('left'); } if (e.key==='ArrowRight'){ sendResponse('right'); } return; }
   if (stim.word && stim.ink_color){ if (['r','g','b','y'].includes(e.key.toLowerCase())){ sendResponse(e.key.toLowerCase()); } return; }
 }
 async function openHelp(){
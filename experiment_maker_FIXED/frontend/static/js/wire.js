@@ -0,0 +1,99 @@
+
+// Binary block encoding shared with backend/wire.py (layout documented there)
+const WIRE=(()=>{
+  const CONTENT_TYPE='application/x-experiment-block', MAGIC='EMWB', VERSION=1;
+  const BOOL=1, INT8=2, INT16=3, INT32=4, FLOAT32=5, FLOAT64=6, STRINGS=7, JSON_=8;
+  const SIZE={[BOOL]:1,[INT8]:1,[INT16]:2,[INT32]:4,[FLOAT32]:4,[FLOAT64]:8};
+  const enc=new TextEncoder(), dec=new TextDecoder();
+  function columnType(values){
+    if (!values.length) return JSON_;
+    if (values.every(v=>typeof v==='boolean')) return BOOL;
+    if (values.every(v=>Number.isInteger(v))){
+      const lo=Math.min(...values), hi=Math.max(...values);
+      if (lo>=-128 && hi<128) return INT8;
+      if (lo>=-32768 && hi<32768) return INT16;
+      if (lo>=-2147483648 && hi<2147483648) return INT32;
+    }
+    if (values.every(v=>v===null || (typeof v==='number' && !Number.isNaN(v)))){
+      return values.every(v=>v===null || Math.fround(v)===v) ? FLOAT32 : FLOAT64;
+    }
+    if (values.every(v=>typeof v==='string')){
+      // Category count and each category's byte length are packed as u16
+      const cats=[...new Set(values)];
+      if (cats.length<65536 && cats.every(c=>enc.encode(c).length<65536)) return STRINGS;
+    }
+    return JSON_;
+  }
+  function encode(block){
+    const columns=block.columns||{}, names=Object.keys(columns);
+    const nRows=names.length ? columns[names[0]].length : 0;
+    const meta=Object.assign({}, block); delete meta.columns;
+    const parts=[], metaBytes=enc.encode(JSON.stringify(meta));
+    const pre=new DataView(new ArrayBuffer(15));
+    for (let i=0;i<4;i++) pre.setUint8(i, MAGIC.charCodeAt(i));
+    pre.setUint8(4, VERSION); pre.setUint16(5, names.length, true); pre.setUint32(7, nRows, true); pre.setUint32(11, metaBytes.length, true);
+    parts.push(pre.buffer, metaBytes);
+    for (const name of names){
+      const values=columns[name], code=columnType(values), nameBytes=enc.encode(name);
+      if (values.length!==nRows) throw new Error('Block columns must all have the same length');
+      parts.push(new Uint8Array([nameBytes.length, code]), nameBytes);
+      if (code===JSON_){
+        const body=enc.encode(JSON.stringify(values)), len=new DataView(new ArrayBuffer(4)); len.setUint32(0, body.length, true);
+        parts.push(len.buffer, body);
+      } else if (code===STRINGS){
+        const cats=[...new Set(values)], index=new Map(cats.map((c,i)=>[c,i]));
+        const head=new DataView(new ArrayBuffer(2)); head.setUint16(0, cats.length, true); parts.push(head.buffer);
+        for (const c of cats){ const b=enc.encode(c), l=new DataView(new ArrayBuffer(2)); l.setUint16(0, b.length, true); parts.push(l.buffer, b); }
+        const wide=cats.length>256, codes=new DataView(new ArrayBuffer(nRows*(wide?2:1)));
+        values.forEach((v,i)=>wide ? codes.setUint16(i*2, index.get(v), true) : codes.setUint8(i, index.get(v)));
+        parts.push(codes.buffer);
+      } else {
+        const view=new DataView(new ArrayBuffer(nRows*SIZE[code]));
+        values.forEach((v,i)=>{
+          if (code===BOOL) view.setUint8(i, v?1:0);
+          else if (code===INT8) view.setInt8(i, v);
+          else if (code===INT16) view.setInt16(i*2, v, true);
+          else if (code===INT32) view.setInt32(i*4, v, true);
+          else if (code===FLOAT32) view.setFloat32(i*4, v===null?NaN:v, true);
+          else view.setFloat64(i*8, v===null?NaN:v, true);
+        });
+        parts.push(view.buffer);
+      }
+    }
+    return new Blob(parts, {type: CONTENT_TYPE});
+  }
+  function decode(buffer){
+    const view=new DataView(buffer), bytes=new Uint8Array(buffer);
+    if (dec.decode(bytes.subarray(0,4))!==MAGIC || view.getUint8(4)!==VERSION) throw new Error('Not a version 1 experiment block');
+    const nCols=view.getUint16(5, true), nRows=view.getUint32(7, true), metaLen=view.getUint32(11, true);
+    let off=15; const block=metaLen ? JSON.parse(dec.decode(bytes.subarray(off, off+metaLen))) : {}; off+=metaLen;
+    block.columns={};
+    for (let c=0;c<nCols;c++){
+      const nameLen=view.getUint8(off), code=view.getUint8(off+1); off+=2;
+      const name=dec.decode(bytes.subarray(off, off+nameLen)); off+=nameLen;
+      const values=new Array(nRows);
+      if (code===JSON_){
+        const len=view.getUint32(off, true); off+=4;
+        block.columns[name]=JSON.parse(dec.decode(bytes.subarray(off, off+len))); off+=len; continue;
+      }
+      if (code===STRINGS){
+        const n=view.getUint16(off, true); off+=2; const cats=[];
+        for (let i=0;i<n;i++){ const l=view.getUint16(off, true); cats.push(dec.decode(bytes.subarray(off+2, off+2+l))); off+=2+l; }
+        const wide=n>256;
+        for (let i=0;i<nRows;i++) values[i]=cats[wide ? view.getUint16(off+i*2, true) : view.getUint8(off+i)];
+        off+=nRows*(wide?2:1); block.columns[name]=values; continue;
+      }
+      if (!SIZE[code]) throw new Error('Unknown column type '+code);
+      for (let i=0;i<nRows;i++){
+        if (code===BOOL) values[i]=view.getUint8(off+i)!==0;
+        else if (code===INT8) values[i]=view.getInt8(off+i);
+        else if (code===INT16) values[i]=view.getInt16(off+i*2, true);
+        else if (code===INT32) values[i]=view.getInt32(off+i*4, true);
+        else { const v=code===FLOAT32 ? view.getFloat32(off+i*4, true) : view.getFloat64(off+i*8, true); values[i]=Number.isNaN(v)?null:v; }
+      }
+      off+=nRows*SIZE[code]; block.columns[name]=values;
+    }
+    return block;
+  }
+  return {CONTENT_TYPE, encode, decode};
+})();
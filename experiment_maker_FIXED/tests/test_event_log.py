@@ -0,0 +1,83 @@
+"""
+Event log with several writers on one directory (one per gunicorn worker).
+
+Run:    python -m pytest tests   (from experiment_maker_FIXED/)
+"""
+
+import sqlite3
+
+import pytest
+
+from backend import event_log
+
+
+def _db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        CREATE TABLE responses ({', '.join(event_log.TABLE_COLUMNS['responses'])});
+        CREATE TABLE event_log_checkpoint (
+            log_dir TEXT PRIMARY KEY,
+            segment TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            frames INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        );
+    """)
+    conn.close()
+    return str(path)
+
+
+def _respond(log, session_id, trial_number):
+    log.append("responses", [(session_id, trial_number, "space", 400.0, 1, "{}", "2026-10-19T00:00:00", 0)])
+
+
+def _loaded(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return sorted(conn.execute("SELECT session_id, trial_number FROM responses").fetchall())
+    finally:
+        conn.close()
+
+
+def test_two_writers_lose_no_frames(tmp_path):
+    db_path = _db(tmp_path / "app.db")
+    directory = tmp_path / "event_log"
+    a = event_log.Compactor(event_log.EventLog(directory, writer="a"), db_path, interval_s=3600)
+    b = event_log.Compactor(event_log.EventLog(directory, writer="b"), db_path, interval_s=3600)
+
+    _respond(a.log, "a", 1)
+    _respond(b.log, "b", 1)
+    b.compact()
+    a.compact()
+    _respond(a.log, "a", 2)
+    _respond(b.log, "b", 2)
+    a.compact()
+    b.compact()
+
+    assert _loaded(db_path) == [("a", 1), ("a", 2), ("b", 1), ("b", 2)]
+    assert set(event_log.series(directory)) == {"a", "b"}
+    a.log.close()
+    b.log.close()
+
+
+def test_series_of_exited_writer_is_loaded_by_another(tmp_path):
+    db_path = _db(tmp_path / "app.db")
+    directory = tmp_path / "event_log"
+    a = event_log.Compactor(event_log.EventLog(directory, writer="a"), db_path, interval_s=3600)
+    b = event_log.Compactor(event_log.EventLog(directory, writer="b"), db_path, interval_s=3600)
+
+    _respond(b.log, "b", 1)
+    assert a.compact_exited() == 0          # b is running: its series is left to it
+    b.log.close()
+    assert a.compact_exited() == 1
+    assert a.compact_exited() == 0          # checkpointed exactly once
+    assert _loaded(db_path) == [("b", 1)]
+    a.log.close()
+
+
+def test_writer_series_is_exclusive(tmp_path):
+    first = event_log.EventLog(tmp_path, writer="a")
+    with pytest.raises(RuntimeError):
+        event_log.EventLog(tmp_path, writer="a", lock_wait_s=0)
+    first.close()
+    event_log.EventLog(tmp_path, writer="a").close()
@@ -0,0 +1,11 @@
+"""
+Experiment Maker - WSGI entry point
+Builds the Flask app once per worker process. Importing app_FIXED by itself
+configures nothing and touches no database; create_app() does both.
+
+Run:        gunicorn wsgi:app
+"""
+
+from app_FIXED import create_app
+
+app = create_app()